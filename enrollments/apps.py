@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class EnrollmentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'enrollments'
+
+    def ready(self):
+        #registra los signals de invalidacion de cache y el wrapper que cuenta
+        #las consultas de cada request
+        from . import instrumentation, signals  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
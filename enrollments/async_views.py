@@ -0,0 +1,363 @@
+#VISTAS ASYNC (ASGI)
+#variantes async de las lecturas mas pedidas (/auth/me, listados, detalle,
+#nominas) y de los reportes, bajo /api/async/. Usan la misma configuracion
+#que los viewsets (filtros, orden, plan de lectura liviana, paginacion por
+#cursor) pero leen con el ORM async, asi un worker de uvicorn atiende otras
+#requests mientras espera a la base. Lo que no tiene camino async (?page=N,
+#?export=, LEAN_READS=False) se contesta con la accion sync del viewset.
+#Antes de cada vista se corren la autenticacion, los permisos y los throttles
+#de la accion sync (_read), asi las dos rutas aceptan y rechazan lo mismo.
+#Ojo: bajo ASGI django junta en memoria las respuestas en streaming sync
+#(exportaciones), esas conviene servirlas desde los workers WSGI.
+#
+#En los reportes primero se lee la huella y se busca en el cache; solo si no
+#esta se leen las filas, cada queryset del contexto a la vez en un pool de
+#threads acotado (ASYNC_DB_WORKERS), y el pdf se renderiza en el pool de procesos de
+#render_pool.py o, con un solo worker, en un pool de threads propio
+#(ASYNC_RENDER_WORKERS): un pdf lento nunca bloquea el event loop
+import asyncio
+import contextvars
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, QuerySet
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+
+from . import profiles, report_cache, terms
+from .auth_serializers import PROFILE_CLAIMS
+from .instrumentation import query_budget, timed
+from .lean import get_plan
+from .models import Enrollment
+from .pagination import KeysetPagination
+from .render_pool import discard, get_pool
+from .reports import ReportError, build_report, can_stream, render_html, render_pdf, render_report, stream_report
+from .response_cache import async_cached_response
+from .views import CourseViewSet, EnrollmentViewSet, StudentViewSet, _final_filename, _query_flag
+
+_db_executor = None
+_render_executor = None
+
+
+def _closing(func, *args):
+    #los threads del pool se reusan: cada tarea respeta CONN_MAX_AGE (o
+    #devuelve la conexion al pool) igual que una request
+    close_old_connections()
+    try:
+        return func(*args)
+    finally:
+        close_old_connections()
+
+async def _db(func, *args):
+    #func corre en un thread del pool de consultas, con el contexto de la
+    #request (la replica elegida por routers.py)
+    global _db_executor  # pylint: disable=global-statement
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(settings.ASYNC_DB_WORKERS, thread_name_prefix="async-db")
+    ctx = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, ctx.run, _closing, func, *args)
+
+async def _render(html: str, engine: str) -> bytes:
+    global _render_executor  # pylint: disable=global-statement
+    loop = asyncio.get_running_loop()
+    if settings.REPORT_RENDER_WORKERS > 1:
+        #pisa es puro python: en procesos aparte no compite por el GIL
+        pool = get_pool()
+        try:
+            return await loop.run_in_executor(pool, render_pdf, html, engine)
+        except BrokenProcessPool:
+            discard(pool)
+            return await loop.run_in_executor(get_pool(), render_pdf, html, engine)
+    if _render_executor is None:
+        _render_executor = ThreadPoolExecutor(settings.ASYNC_RENDER_WORKERS, thread_name_prefix="async-render")
+    return await loop.run_in_executor(_render_executor, render_pdf, html, engine)
+
+def _json(data, status: int = 200) -> HttpResponse:
+    #mismo json que el JSONRenderer de DRF en las vistas sync
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type="application/json")
+
+def _error(exc: APIException) -> HttpResponse:
+    detail = exc.detail if isinstance(exc.detail, (dict, list)) else {"detail": exc.detail}
+    response = _json(detail, exc.status_code)
+    if isinstance(exc, NotAuthenticated) or exc.status_code == 401:
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+    return response
+
+def _viewset(viewset_class, request, action: str, **kwargs):
+    #instancia del viewset sin pasar por dispatch: solo para leer su
+    #configuracion (queryset, filtros, serializer, paginador)
+    return viewset_class(request=Request(request), format_kwarg=None, action=action, args=(), kwargs=kwargs)
+
+def _queryset(view):
+    #get_queryset puede leer la tabla de periodos (terms.py, cuando vence su
+    #cache), eso no puede correr en el loop
+    return view.filter_queryset(view.get_queryset())
+
+async def _term_scope(request, queryset):
+    #None si ?term= es invalido: el 400 lo arma la vista sync, con el mismo formato
+    try:
+        return await _db(terms.scope, queryset, request.GET.get("term"))
+    except ValueError:
+        return None
+
+@cache
+def _sync(viewset_class, action: str):
+    return sync_to_async(viewset_class.as_view({"get": action}))
+
+def _check_access(viewset_class, request, action: str, kwargs: dict):
+    #lo que hace dispatch antes de la accion sync: autenticacion
+    #(JWTAuthentication lee el usuario de la base), permisos y throttles
+    view = _viewset(viewset_class, request, action, **kwargs)
+    #el Request de _viewset no trae los autenticadores del viewset
+    view.request = Request(request, authenticators=view.get_authenticators(),
+                           negotiator=view.get_content_negotiator(),
+                           parser_context=view.get_parser_context(request))
+    view.initial(view.request)
+
+def _read(viewset_class, action: str):
+    #solo GET/HEAD, con los mismos controles de acceso que la accion sync;
+    #routers.ReplicaMiddleware manda estas lecturas a una replica
+    def decorator(func):
+        @wraps(func)
+        async def view(request, **kwargs):
+            try:
+                await _db(_check_access, viewset_class, request, action, kwargs)
+            except APIException as exc:
+                return _error(exc)
+            return await func(request, **kwargs)
+        view = require_safe(view)
+        view.read_action = action
+        return view
+    return decorator
+
+
+# --- Listados y detalle ---
+async def _list(viewset_class, request):
+    view = _viewset(viewset_class, request, "list")
+    if not settings.LEAN_READS or "page" in request.GET or not isinstance(view.paginator, KeysetPagination):
+        #la paginacion por numero necesita COUNT(*) y el serializer es sync
+        return await _sync(viewset_class, "list")(request)
+    try:
+        plan = get_plan(view.get_serializer_class())
+        embed = view.get_embed()
+        queryset = await _db(_queryset, view)
+        paginator = view.paginator
+        extra = [o.lstrip("-") for o in paginator.get_ordering(queryset, view)]
+        page = paginator.page_queryset(plan.values(queryset, embed, extra), view.request, view)
+        rows = paginator.set_page([row async for row in page])
+    except APIException as exc:
+        return _error(exc)
+    with timed("serialize"):
+        data = plan.rows(rows, embed)
+    return _json({"next": paginator.get_next_link(), "previous": paginator.get_previous_link(), "results": data})
+
+async def _retrieve(viewset_class, request, pk):
+    view = _viewset(viewset_class, request, "retrieve", pk=pk)
+    if not settings.LEAN_READS:
+        return await _sync(viewset_class, "retrieve")(request, pk=pk)
+    try:
+        plan = get_plan(view.get_serializer_class())
+        embed = view.get_embed()
+        queryset = await _db(view.get_queryset)
+    except APIException as exc:
+        return _error(exc)
+    row = await plan.values(queryset, embed).filter(pk=pk).afirst()
+    if row is None:
+        #mismo mensaje que get_object_or_404
+        return _json({"detail": f"No {queryset.model._meta.object_name} matches the given query."}, 404)  # pylint: disable=protected-access
+    return _json(plan.row(row, embed))
+
+@_read(StudentViewSet, "list")
+@async_cached_response("student")
+@query_budget(3)
+async def student_list(request):
+    return await _list(StudentViewSet, request)
+
+@_read(StudentViewSet, "retrieve")
+@async_cached_response("student")
+@query_budget(2)
+async def student_detail(request, pk):
+    return await _retrieve(StudentViewSet, request, pk)
+
+@_read(CourseViewSet, "list")
+@async_cached_response("course")
+@query_budget(3)
+async def course_list(request):
+    return await _list(CourseViewSet, request)
+
+@_read(CourseViewSet, "retrieve")
+@async_cached_response("course")
+@query_budget(2)
+async def course_detail(request, pk):
+    return await _retrieve(CourseViewSet, request, pk)
+
+@_read(EnrollmentViewSet, "list")
+@query_budget(3)
+async def enrollment_list(request):
+    return await _list(EnrollmentViewSet, request)
+
+
+# --- Nominas ---
+@_read(StudentViewSet, "courses")
+@async_cached_response("enrollment", "course")
+@query_budget(2)
+async def student_courses(request, pk):
+    if "export" in request.GET:
+        return await _sync(StudentViewSet, "courses")(request, pk=pk)
+    enrollments = await _term_scope(request, Enrollment.objects.filter(student_id=pk))  # pylint: disable=no-member
+    if enrollments is None:
+        return await _sync(StudentViewSet, "courses")(request, pk=pk)
+    data = enrollments.values(
+        "course_id", "enrolled_at", code=F("course__code"), title=F("course__title"))
+    return _json([row async for row in data])
+
+@_read(CourseViewSet, "students")
+@async_cached_response("enrollment", "student")
+@query_budget(2)
+async def course_students(request, pk):
+    if "export" in request.GET:
+        return await _sync(CourseViewSet, "students")(request, pk=pk)
+    enrollments = await _term_scope(request, Enrollment.objects.filter(course_id=pk))  # pylint: disable=no-member
+    if enrollments is None:
+        return await _sync(CourseViewSet, "students")(request, pk=pk)
+    data = enrollments.values(
+        "student_id", "enrolled_at", first_name=F("student__first_name"), last_name=F("student__last_name"),
+        email=F("student__email"), id_number=F("student__id_number"))
+    return _json([row async for row in data])
+
+
+# --- /auth/me ---
+@require_safe
+@query_budget(3)
+async def me(request):
+    #igual que MeView: los datos salen del token (sin consultar la base)
+    try:
+        auth = JWTStatelessUserAuthentication().authenticate(request)
+        if auth is None:
+            raise NotAuthenticated()
+    except APIException as exc:
+        return _error(exc)
+    user, token = auth
+    if _query_flag(request, "fresh", "0") or "student_id" not in token:
+        profile = await sync_to_async(profiles.get_profile)(user.id, fresh=True)
+        if profile is None:
+            return _json({"detail": "Usuario no encontrado."}, 401)
+        return _json(profile)
+    data = {"id": user.id}
+    data.update({claim: token.get(claim) for claim in PROFILE_CLAIMS})
+    return _json(data)
+
+
+# --- Reportes ---
+async def _gather_context(report: dict) -> dict:
+    #los querysets del contexto no dependen entre si: se leen todos a la
+    #vez, cada uno en su thread y su conexion
+    context = report["context"]
+    names = [name for name, value in context.items() if isinstance(value, QuerySet)]
+    results = await asyncio.gather(*(_db(list, context[name].all()) for name in names))
+    return context | dict(zip(names, results))
+
+async def _render_report(report: dict) -> bytes:
+    if "render" in report:
+        #los reportes por fragmentos ya reparten el render en render_pool
+        return await _db(render_report, report)
+    #como render_report: la huella primero, con un acierto no se leen las filas
+    cache = report_cache.get_report_cache()
+    key = None
+    if cache is not None and "scope" in report:
+        fingerprint = await _db(report["fingerprint"])
+        key = report_cache.cache_key(report["template"], [report["engine"], fingerprint])
+        pdf = await asyncio.to_thread(cache.get, report["scope"], key)
+        if pdf is not None:
+            return pdf
+    context = await _gather_context(report)
+    html = await _db(render_html, report["template"], context)
+    pdf = await _render(html, report["engine"])
+    if key is not None:
+        await asyncio.to_thread(cache.set, report["scope"], key, pdf)
+    return pdf
+
+async def _file_chunks(tmp, size: int = 64 * 1024):
+    try:
+        while chunk := await asyncio.to_thread(tmp.read, size):
+            yield chunk
+    finally:
+        tmp.close()
+
+async def _stream(request, report: dict):
+    tmp = tempfile.TemporaryFile()
+    try:
+        with timed("pdf"):
+            await _db(stream_report, report, tmp)
+    except ReportError:
+        tmp.close()
+        return HttpResponse("Error al generar PDF", status=500)
+    tmp.seek(0)
+    disposition = "attachment" if _query_flag(request, "download", "1") else "inline"
+    response = StreamingHttpResponse(_file_chunks(tmp), content_type="application/pdf")
+    response["Content-Disposition"] = f'{disposition}; filename="{_final_filename(report["filename"])}"'
+    return response
+
+async def _report_response(request, report_type: str, params: dict | None = None):
+    #mismas respuestas que views._report_response
+    params = dict(params or {}, engine=request.GET.get("engine"), term=request.GET.get("term"))
+    try:
+        report = await _db(build_report, report_type, params)
+    except ValueError as exc:
+        return _json({"detail": str(exc)}, 400)
+    except Http404 as exc:
+        return _json({"detail": str(exc)}, 404)
+    if can_stream(report) and _query_flag(request, "stream", "0"):
+        return await _stream(request, report)
+    try:
+        with timed("pdf"):
+            pdf = await _render_report(report)
+    except ReportError:
+        return HttpResponse("Error al generar PDF", status=500)
+    disposition = "attachment" if _query_flag(request, "download", "1") else "inline"
+    response = HttpResponse(pdf, content_type=report["content_type"])
+    response["Content-Disposition"] = f'{disposition}; filename="{_final_filename(report["filename"])}"'
+    return response
+
+@_read(StudentViewSet, "report_pdf")
+@query_budget(4)
+async def student_report(request, pk):
+    return await _report_response(request, "student", {"student_id": pk})
+
+@_read(StudentViewSet, "report_all_students")
+@query_budget(3)
+async def students_report_all(request):
+    return await _report_response(request, "students_all")
+
+@_read(CourseViewSet, "report_pdf")
+@query_budget(4)
+async def course_report(request, pk):
+    return await _report_response(request, "course", {"course_id": pk})
+
+@_read(CourseViewSet, "report_pdf_all")
+@query_budget(3)
+async def courses_report_all(request):
+    return await _report_response(request, "courses_all")
+
+@_read(EnrollmentViewSet, "report_student")
+@query_budget(4)
+async def enrollments_report_student(request, student_id):
+    return await _report_response(request, "student_enrollments", {"student_id": student_id})
+
+@_read(EnrollmentViewSet, "report_course")
+@query_budget(4)
+async def enrollments_report_course(request, course_id):
+    return await _report_response(request, "course_enrollments", {"course_id": course_id})
+
+@_read(EnrollmentViewSet, "report_all_enrollments")
+async def enrollments_report_all(request):
+    return await _report_response(request, "enrollments_all")
@@ -1,28 +1,44 @@
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
-from .models import Student
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from . import profiles
 
-class LoginSerializer[TokenObtainPairSerializer]:
+#datos del perfil que viajan como claims en el token; /auth/me/ los lee de
+#ahi sin ir a la base (ver MeView). Pueden quedar viejos como mucho
+#ACCESS_TOKEN_LIFETIME: cada renovacion los vuelve a leer del perfil
+#(RefreshSerializer). Los permisos no se deciden con estos claims sino con
+#el usuario que JWTAuthentication lee de la base en cada request
+PROFILE_CLAIMS = ["username", "email", "first_name", "last_name", "groups", "student_id"]
+
+def _add_claims(token, profile: dict):
+    for claim in PROFILE_CLAIMS:
+        token[claim] = profile[claim]
+
+class LoginSerializer(TokenObtainPairSerializer):
     @classmethod
     def get_token(cls, user):
-        token = super().get_token(user) # pylint: disable=no-member
-        token["username"] = user.username
-        token["groups"] = list(user.groups.values_list("name", flat=True))
+        token = super().get_token(user)
+        #el perfil sale del cache (profiles.py), validate ya lo cargo
+        _add_claims(token, profiles.get_profile(user.pk))
         return token
-    
-    def validate(self,attrs):
-        data = super().validate(attrs) # pylint: disable=no-member
-        user = self.user # pylint: disable=no-member
-        groups = list(user.groups.values_list("name", flat=True))
-        student = Student.objects.filter(user=user).first() # pylint: disable=no-member
 
+    def validate(self, attrs):
+        #super().validate autentica y llama a get_token, que deja el perfil en cache
+        data = super().validate(attrs)
+        data["user"] = profiles.get_profile(self.user.pk)
+        return data
 
-        data["user"] = {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "groups": groups,
-            "student_id": student.id if student else None,
-        }
-        return data        
\ No newline at end of file
+class RefreshSerializer(TokenRefreshSerializer):
+    #el access nuevo copiaria los claims del refresh, que son los del login
+    #(y el refresh vive REFRESH_TOKEN_LIFETIME): se reemplazan por el perfil
+    #actual, del cache que invalidan los signals
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        access = AccessToken(data["access"], verify=False)
+        profile = profiles.get_profile(access[api_settings.USER_ID_CLAIM])
+        if profile is None:
+            raise InvalidToken("Usuario no encontrado.")
+        _add_claims(access, profile)
+        data["access"] = str(access)
+        return data
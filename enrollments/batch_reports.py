@@ -0,0 +1,223 @@
+#REPORTES EN LOTE (ZIP)
+#al cierre del periodo se baja el reporte de matriculas de cada curso (o de
+#cada alumno). En vez de una request por reporte: una sola que devuelve un
+#zip. Las consultas y el html se arman en este proceso, los pdf se renderizan
+#en un pool de procesos propio (render_pool.get_pool(name="batch"), aparte del
+#de las requests comunes) y cada uno se escribe en el zip apenas termina.
+#Si se muere un proceso del pool, los que estaban en vuelo se reintentan una
+#vez en un pool nuevo. En vuelo hay como mucho dos pdf por
+#worker, asi la memoria no depende de la cantidad de reportes. Los que estan
+#en el cache de reportes no se vuelven a renderizar.
+#El avance queda en el cache de django (GET .../report-batch/<id>/; con
+#varios procesos hace falta un CACHE_URL compartido) y al final del zip va
+#indice.csv con el resultado de cada reporte
+import csv
+import io
+import logging
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import Http404
+from django.utils import timezone
+
+from . import render_pool, report_cache, terms
+from .models import Enrollment
+from .pdf_engines import get_engine
+from .reports import ReportError, build_report, render_html, render_pdf
+
+logger = logging.getLogger(__name__)
+
+#kind -> (tipo de reporte, parametro con el id, columna de Enrollment)
+KINDS = {
+    "course": ("course_enrollments", "course_id", "course_id"),
+    "student": ("student_enrollments", "student_id", "student_id"),
+}
+ALL = "all"
+
+
+def _progress_key(batch_id: str) -> str:
+    return f"report-batch:{batch_id}"
+
+def progress(batch_id: str) -> dict | None:
+    return caches["default"].get(_progress_key(batch_id))
+
+
+class Batch:
+    def __init__(self, kind: str, ids, term: str | None = None, engine: str | None = None):
+        #ValueError con los parametros invalidos (la vista lo devuelve como 400)
+        if kind not in KINDS:
+            raise ValueError(f"kind debe ser uno de: {', '.join(KINDS)}.")
+        self.kind = kind
+        self.report_type, self.param, self.column = KINDS[kind]
+        self.engine = get_engine(engine, self.report_type).name
+        self.term = term
+        enrollments = terms.scope(Enrollment.objects.all(), term)  # pylint: disable=no-member
+        if ids == ALL:
+            #todos los que tienen matriculas en el periodo
+            self.ids = list(enrollments.order_by(self.column).values_list(self.column, flat=True).distinct())
+        else:
+            if not isinstance(ids, list) or not ids:
+                raise ValueError('ids debe ser una lista de ids o "all".')
+            try:
+                self.ids = list(dict.fromkeys(int(pk) for pk in ids))
+            except (TypeError, ValueError):
+                raise ValueError("ids debe ser una lista de numeros.")
+            if len(self.ids) > settings.REPORT_BATCH_MAX:
+                raise ValueError(f"Maximo {settings.REPORT_BATCH_MAX} reportes por lote.")
+        self.id = uuid.uuid4().hex
+        self.state = {
+            "id": self.id, "kind": kind, "term": term, "status": "running", "total": len(self.ids),
+            "done": 0, "cached": 0, "failed": 0, "started_at": timezone.now().isoformat(), "finished_at": None,
+        }
+
+    @property
+    def filename(self) -> str:
+        return f"reportes_{self.kind}_{self.term or 'actual'}_{timezone.localtime():%Y%m%d_%H%M}.zip"
+
+    def _save(self):
+        caches["default"].set(_progress_key(self.id), self.state, settings.REPORT_BATCH_PROGRESS_TIMEOUT)
+
+    def _prepare(self, pk: int, cache):
+        #(nombre en el zip, pdf ya listo o None, html a renderizar, reporte, clave del cache)
+        report = build_report(self.report_type, {self.param: pk, "engine": self.engine, "term": self.term})
+        name = f"{pk}_{report['filename']}"
+        key = None
+        if cache is not None:
+            key = report_cache.cache_key(report["template"], [self.engine, report["fingerprint"]()])
+            pdf = cache.get(report["scope"], key)
+            if pdf is not None:
+                return name, pdf, None, report, key
+        return name, None, render_html(report["template"], report["context"]), report, key
+
+    def iter_zip(self, on_progress=None, workers: int | None = None):
+        #genera el zip de a pedazos: un yield por cada reporte escrito.
+        #on_progress(state, pk, result) se llama despues de cada uno
+        workers = workers or settings.REPORT_BATCH_WORKERS
+        #un pool por cantidad de workers: dos lotes iguales a la vez se
+        #reparten los mismos procesos
+        pool = render_pool.get_pool(workers, name="batch") if workers > 1 else None
+        retried = set()
+        cache = report_cache.get_report_cache()
+        sink = _Sink()
+        index = []
+        pending = {}
+        started = time.perf_counter()
+        self._save()
+
+        def finish(pk, name, result, pdf=None, detail=""):
+            if pdf is not None:
+                archive.writestr(name, pdf)
+            index.append([pk, name if pdf is not None else "", result, detail])
+            self.state["done"] += 1
+            if result == "cache":
+                self.state["cached"] += 1
+            elif result != "ok":
+                self.state["failed"] += 1
+            self._save()
+            if on_progress is not None:
+                on_progress(self.state, pk, result)
+
+        def submit(pk, name, html, report, key):
+            nonlocal pool
+            try:
+                future = pool.submit(render_pdf, html, self.engine)
+            except BrokenProcessPool:
+                render_pool.discard(pool)
+                pool = render_pool.get_pool(workers, name="batch")
+                future = pool.submit(render_pdf, html, self.engine)
+            pending[future] = (pool, pk, name, html, report, key)
+
+        def collect(block: bool):
+            nonlocal pool
+            #con block espera al menos uno; sin block solo junta los que ya terminaron
+            done = wait(pending, return_when=FIRST_COMPLETED).done if block else [f for f in pending if f.done()]
+            for future in done:
+                used, pk, name, html, report, key = pending.pop(future)
+                try:
+                    pdf = future.result()
+                except BrokenProcessPool:
+                    #se murio un proceso: todo lo que estaba en ese pool falla
+                    #igual, cada uno se reintenta una vez en un pool nuevo
+                    if pk in retried:
+                        finish(pk, name, "error", detail="Se interrumpio el proceso que lo renderizaba.")
+                        continue
+                    retried.add(pk)
+                    if used is pool:
+                        render_pool.discard(pool)
+                        pool = render_pool.get_pool(workers, name="batch")
+                    submit(pk, name, html, report, key)
+                    continue
+                except ReportError as exc:
+                    finish(pk, name, "error", detail=str(exc))
+                    continue
+                if key is not None:
+                    cache.set(report["scope"], key, pdf)
+                finish(pk, name, "ok", pdf)
+
+        try:
+            #los pdf ya vienen comprimidos: se guardan sin comprimir otra vez
+            with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+                for pk in self.ids:
+                    try:
+                        name, pdf, html, report, key = self._prepare(pk, cache)
+                    except Http404 as exc:
+                        finish(pk, "", "not_found", detail=str(exc))
+                        continue
+                    if pdf is not None:
+                        finish(pk, name, "cache", pdf)
+                    elif pool is None:
+                        try:
+                            pdf = render_pdf(html, self.engine)
+                        except ReportError as exc:
+                            finish(pk, name, "error", detail=str(exc))
+                        else:
+                            if key is not None:
+                                cache.set(report["scope"], key, pdf)
+                            finish(pk, name, "ok", pdf)
+                    else:
+                        submit(pk, name, html, report, key)
+                        collect(block=len(pending) >= workers * 2)
+                    yield sink.take()
+                while pending:
+                    collect(block=True)
+                    yield sink.take()
+                out = io.StringIO()
+                writer = csv.writer(out)
+                writer.writerow(["id", "archivo", "resultado", "detalle"])
+                writer.writerows(index)
+                archive.writestr("indice.csv", out.getvalue().encode("utf-8"))
+            yield sink.take()
+        finally:
+            #si el cliente corta la descarga no se siguen renderizando los que faltan
+            for future in pending:
+                future.cancel()
+            self.state["status"] = "done" if self.state["done"] == self.state["total"] else "cancelled"
+            self.state["finished_at"] = timezone.now().isoformat()
+            self._save()
+            logger.info("lote %s (%s): %s/%s reportes, %s del cache, %s con error en %.1fs",
+                        self.id, self.kind, self.state["done"], self.state["total"], self.state["cached"],
+                        self.state["failed"], time.perf_counter() - started)
+
+
+class _Sink:
+    #destino del zip: sin seek ni tell zipfile escribe cada archivo con su
+    #data descriptor y no vuelve atras, asi se puede mandar a medida que crece
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
@@ -0,0 +1,55 @@
+#POOL DE CONEXIONES
+#metricas del pool de psycopg (settings DB_POOL) y utilidades para procesos
+#hijos. Las metricas son del proceso que contesta: con varios workers de
+#gunicorn cada uno tiene su propio pool. Las replicas (routers.py) suman su
+#atraso
+from django.db import connections
+
+from .routers import replica_aliases, replica_lag
+
+
+def _pool(alias: str):
+    #solo el backend de postgres tiene .pool (None si no esta configurado)
+    return getattr(connections[alias], "pool", None)
+
+def pool_stats() -> dict:
+    data = {}
+    for alias in connections:
+        conn = connections[alias]
+        entry = {"vendor": conn.vendor, "conn_max_age": conn.settings_dict.get("CONN_MAX_AGE")}
+        pool = _pool(alias)
+        if pool is None:
+            entry["pool"] = None
+        else:
+            stats = pool.get_stats()
+            requests = stats.get("requests_num", 0)
+            entry["pool"] = {
+                "min_size": pool.min_size,
+                "max_size": pool.max_size,
+                "size": stats.get("pool_size", 0),
+                "available": stats.get("pool_available", 0),
+                "waiting": stats.get("requests_waiting", 0),
+                "requests": requests,
+                #cuanto espero una request para obtener una conexion (checkout)
+                "avg_wait_ms": round(stats.get("requests_wait_ms", 0) / requests, 2) if requests else None,
+                #cuanto tiempo tuvo cada request la conexion antes de devolverla
+                "avg_usage_ms": round(stats.get("usage_ms", 0) / requests, 2) if requests else None,
+                "timeouts": stats.get("requests_errors", 0),
+                "connections_opened": stats.get("connections_num", 0),
+                "connection_errors": stats.get("connections_errors", 0),
+                "connections_lost": stats.get("connections_lost", 0),
+            }
+        if alias in replica_aliases():
+            #None = no se pudo medir (la replica no se usa)
+            entry["lag_seconds"] = replica_lag(alias)
+        data[alias] = entry
+    return data
+
+def forget_pools():
+    #en un proceso hijo (fork) el pool heredado no sirve: sus threads no se
+    #copian y los sockets son del padre. Se descarta sin cerrarlo, el hijo
+    #arma el suyo en la primera consulta
+    for alias in connections:
+        pools = getattr(type(connections[alias]), "_connection_pools", None)
+        if pools:
+            pools.clear()
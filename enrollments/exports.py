@@ -0,0 +1,97 @@
+#EXPORTACIONES CSV / NDJSON
+#para la sincronizacion nocturna del data warehouse. Las filas salen de
+#values_list().iterator(), sin armar instancias de modelo ni listas en
+#memoria (en postgres es un cursor del lado del servidor), y se van
+#mandando de a bloques con un StreamingHttpResponse: la memoria no crece
+#con el tamaño de la tabla
+import csv
+import io
+import json
+import logging
+import time
+from datetime import date, datetime
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+from .models import Enrollment
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+#columnas de cada exportacion: (nombre en la salida, campo para values_list).
+#Los nombres son los mismos que las claves del json de cada accion
+STUDENT_COURSES = [
+    ("course_id", "course_id"), ("code", "course__code"), ("title", "course__title"),
+    ("enrolled_at", "enrolled_at"),
+]
+COURSE_STUDENTS = [
+    ("student_id", "student_id"), ("first_name", "student__first_name"), ("last_name", "student__last_name"),
+    ("email", "student__email"), ("id_number", "student__id_number"), ("enrolled_at", "enrolled_at"),
+]
+ENROLLMENTS = [
+    ("id", "id"), ("student", "student_id"), ("course", "course_id"), ("enrolled_at", "enrolled_at"),
+]
+#tabla completa: con la cedula y el codigo de curso para no tener que cruzar
+ENROLLMENTS_FULL = ENROLLMENTS[:3] + [
+    ("id_number", "student__id_number"), ("code", "course__code"), ("term", "term__code"),
+    ("enrolled_at", "enrolled_at"),
+]
+
+
+def export_format(request) -> str | None:
+    #?export=csv|ndjson (no ?format=, que DRF usa para elegir el renderer)
+    fmt = request.GET.get("export")
+    if fmt and fmt not in FORMATS:
+        raise ValueError(f"Formato de exportacion desconocido: {fmt}")
+    return fmt
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_rows(queryset, columns, chunk_size: int | None = None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK
+    fields = [field for _, field in columns]
+    for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+        yield [_value(v) for v in row]
+
+def iter_export(queryset, columns, fmt: str, label: str = "export"):
+    #genera la salida en bloques de EXPORT_CHUNK filas (un yield por bloque,
+    #no por fila) y al final deja en el log cuantas filas/s salieron
+    names = [name for name, _ in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == "csv" else None
+    if writer:
+        writer.writerow(names)
+    total = 0
+    started = time.perf_counter()
+    for row in iter_rows(queryset, columns):
+        if writer:
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(dict(zip(names, row)), ensure_ascii=False))
+            buffer.write("\n")
+        total += 1
+        if total % settings.EXPORT_CHUNK == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+    elapsed = time.perf_counter() - started
+    logger.info("%s (%s): %s filas en %.2fs (%.0f filas/s)", label, fmt, total, elapsed,
+                total / elapsed if elapsed else 0)
+
+def export_response(queryset, columns, fmt: str, filename: str) -> StreamingHttpResponse:
+    response = StreamingHttpResponse(iter_export(queryset, columns, fmt, filename), content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+def all_enrollments():
+    return Enrollment.objects.order_by("id")  # pylint: disable=no-member
@@ -0,0 +1,212 @@
+#IMPORTACION MASIVA DE ALUMNOS
+#lee filas de un csv o json de a lotes, valida cada fila sin ir a la base,
+#resuelve duplicados y usernames con consultas por lote, hashea las
+#contraseñas iniciales (la cedula) en un pool de procesos (el pool "import"
+#de render_pool.py, que vive con el proceso) y escribe User, Student y la
+#pertenencia al grupo de alumnos con bulk_create
+import csv
+import io
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from . import report_cache, response_cache
+from .models import Student
+from .render_pool import pool_map
+from .search import student_document
+from .usernames import allocate_usernames, base_username
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ["first_name", "last_name", "email", "id_number"]
+
+
+_SPACE = re.compile(r"\s*")
+
+
+def _json_array(text, size: int = 64 * 1024):
+    #elementos de una lista json cuyo "[" ya se leyo, leyendo de a size
+    #caracteres: raw_decode saca un elemento por vez y en memoria queda un
+    #pedazo del archivo, no el archivo entero. ValueError si esta mal formada
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    state = "first"  # first: elemento o "]", value: elemento, sep: "," o "]"
+    while True:
+        pos = _SPACE.match(buf, pos).end()
+        if pos == len(buf):
+            if eof:
+                raise ValueError("Lista json sin cerrar.")
+            buf, pos = text.read(size), 0
+            eof = not buf
+            continue
+        if state == "sep" or (state == "first" and buf[pos] == "]"):
+            char = buf[pos]
+            pos += 1
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"Se esperaba ',' o ']' y vino {char!r}.")
+            state = "value"
+            continue
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+            #un elemento pegado al final del pedazo puede seguir en el proximo
+            complete = end < len(buf) or eof
+        except ValueError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            chunk = text.read(size)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield item
+        pos, state = end, "sep"
+
+def read_rows(fh, fmt: str):
+    #fh es un archivo binario; devuelve un iterador de dicts sin cargar todo
+    #(en json acepta una lista o un objeto por linea)
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+    if fmt == "csv":
+        yield from csv.DictReader(text)
+        return
+    first = text.read(1)
+    while first.isspace():
+        first = text.read(1)
+    if first == "[":
+        yield from _json_array(text)
+        return
+    for line in (first + text.readline(), *text):
+        if line.strip():
+            yield json.loads(line)
+
+def _clean(row) -> tuple[dict, dict]:
+    #validacion de una fila con los validators de los campos del modelo
+    data, errors = {}, {}
+    if not isinstance(row, dict):
+        return data, {"row": ["Se esperaba un objeto."]}
+    for name in FIELDS:
+        field = Student._meta.get_field(name)  # pylint: disable=no-member,protected-access
+        value = str(row.get(name) or "").strip()
+        if not value:
+            errors[name] = ["Este campo es requerido."]
+            continue
+        try:
+            data[name] = field.clean(value, None)
+        except ValidationError as exc:
+            errors[name] = exc.messages
+    if "email" in data:
+        data["email"] = data["email"].lower()
+    return data, errors
+
+def _student(user, data: dict) -> Student:
+    #bulk_create no pasa por el pre_save que arma el documento de busqueda
+    student = Student(user=user, **data)
+    student.search_document = student_document(student)
+    return student
+
+def _hash_all(passwords: list[str], workers: int) -> list[str]:
+    if workers <= 1:
+        return [make_password(p) for p in passwords]
+    return pool_map(make_password, passwords, workers, name="import", chunksize=64)
+
+def _import_batch(batch: list, group: Group, workers: int, report: dict):
+    #batch: lista de (numero_de_fila, dict crudo)
+    rows = []
+    for number, raw in batch:
+        data, errors = _clean(raw)
+        if errors:
+            report["errors"].append({"row": number, "errors": errors})
+        else:
+            rows.append((number, data))
+
+    #duplicados contra la base y dentro del mismo lote, con dos consultas
+    emails = {d["email"] for _, d in rows}
+    id_numbers = {d["id_number"] for _, d in rows}
+    taken_emails = set(Student.objects.filter(email__in=emails).values_list("email", flat=True))  # pylint: disable=no-member
+    taken_ids = set(Student.objects.filter(id_number__in=id_numbers).values_list("id_number", flat=True))  # pylint: disable=no-member
+    valid = []
+    for number, data in rows:
+        errors = {}
+        if data["email"] in taken_emails:
+            errors["email"] = ["Ya existe un alumno con este email."]
+        if data["id_number"] in taken_ids:
+            errors["id_number"] = ["Ya existe un alumno con esta cédula."]
+        if errors:
+            report["errors"].append({"row": number, "errors": errors})
+            continue
+        taken_emails.add(data["email"])
+        taken_ids.add(data["id_number"])
+        valid.append((number, data))
+    if not valid:
+        return
+
+    passwords = _hash_all([d["id_number"] for _, d in valid], workers)
+    try:
+        with transaction.atomic():
+            usernames = allocate_usernames([base_username(d["first_name"], d["last_name"]) for _, d in valid])
+            users = User.objects.bulk_create([
+                User(username=username, email=d["email"], first_name=d["first_name"],
+                     last_name=d["last_name"], password=password)
+                for (_, d), username, password in zip(valid, usernames, passwords)
+            ])
+            Student.objects.bulk_create([  # pylint: disable=no-member
+                _student(user, d) for (_, d), user in zip(valid, users)
+            ])
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=user.pk, group_id=group.pk) for user in users
+            ])
+    except IntegrityError as exc:
+        #otra importacion/alta en paralelo tomo un email, cedula o username
+        for number, _ in valid:
+            report["errors"].append({"row": number, "errors": {"row": [f"Conflicto al guardar: {exc}"]}})
+        return
+    report["created"] += len(valid)
+
+def import_students(rows, batch_size: int | None = None, workers: int | None = None) -> dict:
+    batch_size = batch_size or settings.STUDENT_IMPORT_BATCH
+    workers = settings.STUDENT_IMPORT_WORKERS if workers is None else workers
+    group, _ = Group.objects.get_or_create(name=settings.STUDENT_GROUP)
+    report = {"rows": 0, "created": 0, "errors": []}
+    started = time.perf_counter()
+    try:
+        batch = []
+        number = 0
+        #los errores se reportan por numero de alumno (1 = el primero, sin
+        #contar el encabezado del csv)
+        try:
+            for number, raw in enumerate(rows, start=1):
+                batch.append((number, raw))
+                if len(batch) == batch_size:
+                    _import_batch(batch, group, workers, report)
+                    report["rows"] += len(batch)
+                    batch = []
+        except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+            #archivo mal formado a mitad de camino: los lotes anteriores ya
+            #estan guardados, asi que se importa lo leido hasta ahi y se corta.
+            #El reporte dice en que alumno (created = lo que quedo guardado)
+            report["invalid"] = {"row": number + 1, "detail": f"Archivo invalido: {exc}"}
+        if batch:
+            _import_batch(batch, group, workers, report)
+            report["rows"] += len(batch)
+    finally:
+        #bulk_create no manda signals; los alumnos nuevos no tienen matriculas
+        #asi que solo cambia el reporte general de alumnos
+        if report["created"]:
+            report_cache.invalidate("students")
+            response_cache.bump("student")
+    elapsed = time.perf_counter() - started
+    report["errors"].sort(key=lambda e: e["row"])
+    report["elapsed_ms"] = round(elapsed * 1000, 1)
+    report["rows_per_sec"] = round(report["rows"] / elapsed) if elapsed else None
+    logger.info("import_students: %s filas, %s creados en %.2fs%s", report["rows"], report["created"], elapsed,
+                " (archivo cortado)" if "invalid" in report else "")
+    return report
@@ -0,0 +1,204 @@
+#METRICAS POR REQUEST
+#cuantas consultas hace cada endpoint, cuanto tarda la base, el render del
+#pdf y la serializacion. Salen en el header Server-Timing (se ven en la
+#pestaña de red del navegador) y en un log json por request. Si la misma
+#consulta (con otros parametros) se repite QUERY_REPEAT_THRESHOLD veces se
+#avisa como posible N+1. Las vistas pueden declarar un maximo de consultas
+#con @query_budget(n): si se pasa se loguea y, con QUERY_BUDGET_STRICT=True
+#(tests), la request falla con QueryBudgetExceeded
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+_metrics = contextvars.ContextVar("request_metrics", default=None)
+
+#IN (%s, %s, ...) cuenta como la misma consulta sin importar cuantos ids lleve
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_NUMBER = re.compile(r"\b\d+\b")
+
+
+class QueryBudgetExceeded(Exception):
+    """Un endpoint hizo mas consultas que las declaradas con @query_budget."""
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_ms = 0.0
+        self.shapes = Counter()
+        self.phases = Counter()
+        #las vistas async consultan desde varios threads a la vez
+        self.lock = threading.Lock()
+
+    def add_query(self, sql: str, ms: float):
+        shape = _NUMBER.sub("?", _IN_LIST.sub("(...)", sql))
+        with self.lock:
+            self.queries += 1
+            self.db_ms += ms
+            self.shapes[shape] += 1
+
+    def add_phase(self, name: str, ms: float):
+        with self.lock:
+            self.phases[name] += ms
+
+    def repeated(self) -> list[tuple[str, int]]:
+        threshold = settings.QUERY_REPEAT_THRESHOLD
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+def _record(execute, sql, params, many, context):
+    metrics = _metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, (time.perf_counter() - started) * 1000)
+
+@receiver(connection_created)
+def _install(sender, connection, **kwargs):
+    #queda puesto en cada conexion (de cualquier thread) y solo mide si hay
+    #una request en curso en el contexto
+    if _record not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record)
+
+@contextmanager
+def timed(phase: str):
+    #with timed("pdf"): ... suma el tiempo a esa fase de la request actual
+    metrics = _metrics.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_phase(phase, (time.perf_counter() - started) * 1000)
+
+@contextmanager
+def measure():
+    #mide fuera de una request (comandos, benchmarks): with measure() as m: ...
+    #cuenta tambien lo que consulta un streaming al consumirse
+    metrics = RequestMetrics()
+    token = _metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _metrics.reset(token)
+
+def query_budget(limit: int):
+    #maximo de consultas de una vista o accion (incluida la autenticacion)
+    def decorator(func):
+        func.query_budget = limit
+        return func
+    return decorator
+
+def _budget(request, view_func):
+    #acciones de viewsets: el presupuesto esta en el metodo de la clase
+    cls = getattr(view_func, "cls", None)
+    if cls is not None:
+        actions = getattr(view_func, "actions", None)
+        name = actions.get(request.method.lower()) if actions else request.method.lower()
+        return getattr(getattr(cls, name or "", None), "query_budget", None)
+    return getattr(view_func, "query_budget", None)
+
+def _time_render(response):
+    #la Response de DRF se renderiza (json, etc) despues de process_template_response
+    metrics = _metrics.get()
+    if metrics is not None:
+        started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda r: metrics.add_phase("serialize", (time.perf_counter() - started) * 1000)
+        )
+    return response
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            #bajo ASGI los hooks sync costarian un salto a un thread por request
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.INSTRUMENTATION_ENABLED:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not settings.INSTRUMENTATION_ENABLED:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _metrics.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _metrics.reset(token)
+        return self._finish(request, response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = _budget(request, view_func)
+
+    def process_template_response(self, request, response):
+        return _time_render(response)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = _budget(request, view_func)
+
+    async def _aprocess_template_response(self, request, response):
+        return _time_render(response)
+
+    def _finish(self, request, response, metrics: RequestMetrics):
+        total = (time.perf_counter() - metrics.started) * 1000
+        timing = [f'db;dur={metrics.db_ms:.1f};desc="{metrics.queries} queries"']
+        timing += [f"{name};dur={ms:.1f}" for name, ms in metrics.phases.items()]
+        timing.append(f"total;dur={total:.1f}")
+        response["Server-Timing"] = ", ".join(timing)
+        response["X-Query-Count"] = str(metrics.queries)
+
+        repeated = metrics.repeated()
+        budget = getattr(request, "query_budget", None)
+        over = budget is not None and metrics.queries > budget
+        logger.log(logging.WARNING if repeated or over else logging.INFO, json.dumps({
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_ms, 1),
+            "total_ms": round(total, 1),
+            "phases": {name: round(ms, 1) for name, ms in metrics.phases.items()},
+            "budget": budget,
+            "repeated": [{"sql": shape[:300], "count": n} for shape, n in repeated],
+        }))
+        if over and settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(
+                f"{request.method} {request.path}: {metrics.queries} consultas, el maximo es {budget}"
+            )
+        return response
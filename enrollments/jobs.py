@@ -0,0 +1,180 @@
+#COLA DE REPORTES
+#la cola vive en la misma base (tabla ReportJob). Los workers toman el
+#siguiente job con SELECT ... FOR UPDATE SKIP LOCKED, asi varios procesos
+#pueden trabajar a la vez sin agarrar el mismo reporte
+import logging
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import ReportJob
+from .reports import build_report, can_stream, render_report, stream_report
+
+logger = logging.getLogger(__name__)
+
+#clave fija para el advisory lock de postgres que serializa el "claim"
+_QUEUE_LOCK_ID = 7301
+#cada cuantos segundos un worker borra los reportes vencidos
+_PURGE_INTERVAL = 300
+
+
+def type_limit(report_type: str) -> int:
+    return settings.REPORT_JOB_LIMITS.get(report_type, settings.REPORT_JOB_DEFAULT_LIMIT)
+
+def enqueue(report_type: str, params: dict | None = None) -> ReportJob:
+    #se arma el reporte una vez para validar el tipo y que existan
+    #el alumno/curso, asi el error sale en el POST y no en el worker
+    build_report(report_type, params)
+    return ReportJob.objects.create(report_type=report_type, params=params or {})  # pylint: disable=no-member
+
+def _lock_queue():
+    #con el advisory lock dos workers no pueden contar los "running" a la vez,
+    #si no ambos podrian pasar el limite por tipo. En sqlite (desarrollo local)
+    #las escrituras ya van serializadas asi que no hace falta
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [_QUEUE_LOCK_ID])
+
+def requeue_stale() -> int:
+    #jobs que quedaron "running" porque se murio el worker vuelven a la cola
+    limit = timezone.now() - timedelta(seconds=settings.REPORT_JOB_TIMEOUT)
+    return (
+        ReportJob.objects  # pylint: disable=no-member
+        .filter(status=ReportJob.RUNNING, started_at__lt=limit)
+        .update(status=ReportJob.QUEUED, started_at=None)
+    )
+
+def purge_expired(now=None) -> int:
+    #reportes terminados hace mas de REPORT_JOB_RETENTION_HOURS: se borra el
+    #archivo y el job (la descarga pasa a dar 404). Devuelve cuantos borro
+    limit = (now or timezone.now()) - timedelta(hours=settings.REPORT_JOB_RETENTION_HOURS)
+    expired = list(
+        ReportJob.objects  # pylint: disable=no-member
+        .filter(status__in=[ReportJob.DONE, ReportJob.FAILED], finished_at__lt=limit)
+        .values_list("id", "file_path")
+    )
+    for _, file_path in expired:
+        if file_path:
+            Path(file_path).unlink(missing_ok=True)
+    ReportJob.objects.filter(id__in=[pk for pk, _ in expired]).delete()  # pylint: disable=no-member
+    if expired:
+        logger.info("purge_expired: %s reportes vencidos borrados", len(expired))
+    return len(expired)
+
+def claim_next() -> ReportJob | None:
+    with transaction.atomic():
+        _lock_queue()
+        running = (
+            ReportJob.objects  # pylint: disable=no-member
+            .filter(status=ReportJob.RUNNING)
+            .values_list("report_type")
+            .annotate(total=Count("id"))
+        )
+        saturated = [rtype for rtype, total in running if total >= type_limit(rtype)]
+        job = (
+            ReportJob.objects  # pylint: disable=no-member
+            .select_for_update(skip_locked=True)
+            .filter(status=ReportJob.QUEUED)
+            .exclude(report_type__in=saturated)
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ReportJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=["status", "started_at"])
+        return job
+
+def run_job(job: ReportJob) -> ReportJob:
+    started = time.perf_counter()
+    try:
+        report = build_report(job.report_type, job.params)
+        out_dir = Path(settings.REPORTS_DIR)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        path = out_dir / f"{job.id}{Path(report['filename']).suffix}"
+        #con params {"stream": true} los reportes generales se escriben
+        #directo al archivo en modo streaming (memoria acotada)
+        if job.params.get("stream") and can_stream(report):
+            with path.open("wb") as dest:
+                stream_report(report, dest)
+        else:
+            path.write_bytes(render_report(report))
+    except Exception as exc:  # pylint: disable=broad-except
+        logger.exception("Fallo el reporte %s", job.id)
+        job.status = ReportJob.FAILED
+        job.error = str(exc)
+    else:
+        job.status = ReportJob.DONE
+        job.filename = report["filename"]
+        job.file_path = str(path)
+    job.render_ms = int((time.perf_counter() - started) * 1000)
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "error", "filename", "file_path", "render_ms", "finished_at"])
+    return job
+
+def work(poll_interval: float = 1.0, once: bool = False, stop=None) -> int:
+    #loop de un worker: toma jobs hasta que no quedan (once) o hasta que
+    #se setea el evento stop. Devuelve cuantos jobs proceso
+    done = 0
+    last_purge = None
+    while stop is None or not stop.is_set():
+        requeue_stale()
+        if last_purge is None or time.monotonic() - last_purge > _PURGE_INTERVAL:
+            purge_expired()
+            last_purge = time.monotonic()
+        job = claim_next()
+        if job is None:
+            if once:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        done += 1
+    return done
+
+def queue_stats(sample: int = 100) -> dict:
+    #profundidad de la cola y tiempos de render por tipo de reporte
+    counts = (
+        ReportJob.objects  # pylint: disable=no-member
+        .filter(status__in=[ReportJob.QUEUED, ReportJob.RUNNING])
+        .values_list("report_type", "status")
+        .annotate(total=Count("id"))
+    )
+    stats = {}
+    for rtype, job_status, total in counts:
+        entry = stats.setdefault(rtype, {"queued": 0, "running": 0})
+        entry[job_status] = total
+    for rtype in stats.keys() | set(settings.REPORT_JOB_LIMITS):
+        entry = stats.setdefault(rtype, {"queued": 0, "running": 0})
+        entry["limit"] = type_limit(rtype)
+        times = sorted(
+            ReportJob.objects  # pylint: disable=no-member
+            .filter(report_type=rtype, status=ReportJob.DONE)
+            .order_by("-finished_at")
+            .values_list("render_ms", flat=True)[:sample]
+        )
+        entry["render_ms"] = {
+            "samples": len(times),
+            "avg": int(sum(times) / len(times)) if times else None,
+            "p95": times[min(len(times) - 1, int(len(times) * 0.95))] if times else None,
+            "max": times[-1] if times else None,
+        }
+    oldest = (
+        ReportJob.objects  # pylint: disable=no-member
+        .filter(status=ReportJob.QUEUED)
+        .order_by("created_at")
+        .values_list("created_at", flat=True)
+        .first()
+    )
+    return {
+        "queued": sum(e["queued"] for e in stats.values()),
+        "running": sum(e["running"] for e in stats.values()),
+        "oldest_queued_seconds": int((timezone.now() - oldest).total_seconds()) if oldest else None,
+        "by_type": stats,
+    }
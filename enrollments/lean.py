@@ -0,0 +1,145 @@
+#LECTURA LIVIANA
+#los listados y el detalle de alumnos, cursos y matriculas no arman
+#instancias de modelo ni pasan cada fila por el ModelSerializer: piden solo
+#las columnas que el serializer va a mostrar con .values() y las convierten
+#con un "plan" que se calcula una sola vez por serializer. La salida es la
+#misma que la del serializer. Con ?embed=student,course se agrega un
+#resumen del alumno/curso en vez del id (con un join, solo si se pide)
+from django.conf import settings
+from django.http import Http404
+from rest_framework import serializers
+from rest_framework.permissions import BasePermission
+from rest_framework.response import Response
+
+from .instrumentation import timed
+from .pagination import KeysetPagination
+
+#campos que se devuelven tal cual salen de la base
+_PASSTHROUGH = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+    serializers.FloatField, serializers.ReadOnlyField,
+)
+
+#resumenes que se pueden embeber por cada FK: {campo: [columnas del modelo relacionado]}
+EMBEDS = {
+    "student": ["id", "first_name", "last_name", "id_number"],
+    "course": ["id", "code", "title"],
+}
+
+
+class FieldPlan:
+    def __init__(self, serializer_class):
+        #(clave de salida, columna de values(), conversion o None)
+        self.fields = []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.PrimaryKeyRelatedField):
+                self.fields.append((name, f"{field.source}_id", None))
+            elif isinstance(field, serializers.ModelField) or "." in field.source or field.source == "*":
+                raise ValueError(f"{serializer_class.__name__}.{name} no se puede leer con values()")
+            elif isinstance(field, _PASSTHROUGH):
+                self.fields.append((name, field.source, None))
+            else:
+                #fechas, decimales, etc: la misma conversion del serializer
+                self.fields.append((name, field.source, field.to_representation))
+        self.columns = [column for _, column, _ in self.fields]
+
+    def values(self, queryset, embed=(), extra=()):
+        columns = list(self.columns)
+        for relation in embed:
+            columns += [f"{relation}__{c}" for c in EMBEDS[relation]]
+        columns += [c for c in extra if c not in columns]
+        return queryset.values(*columns)
+
+    def row(self, values: dict, embed=()) -> dict:
+        out = {}
+        for name, column, convert in self.fields:
+            value = values[column]
+            out[name] = value if convert is None or value is None else convert(value)
+        for relation in embed:
+            if values[f"{relation}_id"] is None:
+                out[relation] = None
+            else:
+                out[relation] = {c: values[f"{relation}__{c}"] for c in EMBEDS[relation]}
+        return out
+
+    def rows(self, values, embed=()) -> list[dict]:
+        return [self.row(v, embed) for v in values]
+
+
+_plans = {}
+
+
+def get_plan(serializer_class) -> FieldPlan:
+    if serializer_class not in _plans:
+        _plans[serializer_class] = FieldPlan(serializer_class)
+    return _plans[serializer_class]
+
+
+class LeanReadMixin:
+    #para ModelViewSet: list y retrieve por el camino liviano. Con
+    #settings.LEAN_READS=False se vuelve al serializer de siempre
+
+    def get_embed(self) -> list[str]:
+        plan = get_plan(self.get_serializer_class())
+        allowed = [name for name, column, _ in plan.fields if name in EMBEDS and column == f"{name}_id"]
+        requested = [e.strip() for e in self.request.query_params.get("embed", "").split(",") if e.strip()]
+        unknown = [e for e in requested if e not in allowed]
+        if unknown:
+            raise serializers.ValidationError({"embed": [f"Opciones validas: {', '.join(allowed) or 'ninguna'}."]})
+        return requested
+
+    def lean_response(self, queryset, paginate: bool = True):
+        if not settings.LEAN_READS:
+            page = self.paginate_queryset(queryset) if paginate else None
+            if page is not None:
+                with timed("serialize"):
+                    data = self.get_serializer(page, many=True).data
+                return self.get_paginated_response(data)
+            with timed("serialize"):
+                data = self.get_serializer(queryset, many=True).data
+            return Response(data)
+        plan = get_plan(self.get_serializer_class())
+        embed = self.get_embed()
+        extra = []
+        if paginate and isinstance(self.paginator, KeysetPagination):
+            #la paginacion por cursor necesita los campos de orden en cada fila
+            extra = [o.lstrip("-") for o in self.paginator.get_ordering(queryset, self)]
+        values = plan.values(queryset, embed, extra)
+        page = self.paginate_queryset(values) if paginate else None
+        if page is not None:
+            with timed("serialize"):
+                data = plan.rows(page, embed)
+            return self.get_paginated_response(data)
+        #sin paginar la consulta corre dentro de rows(): queda en db y en serialize
+        with timed("serialize"):
+            data = plan.rows(values, embed)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.lean_response(self.filter_queryset(self.get_queryset()))
+
+    def _object_permissions(self) -> bool:
+        #permisos con has_object_permission propio (o compuestos con & |)
+        return any(type(p).has_object_permission is not BasePermission.has_object_permission
+                   for p in self.get_permissions())
+
+    def retrieve(self, request, *args, **kwargs):
+        #has_object_permission recibe la instancia del modelo: si la vista
+        #tiene permisos por objeto va por get_object (check_object_permissions)
+        if not settings.LEAN_READS or self._object_permissions():
+            return super().retrieve(request, *args, **kwargs)
+        plan = get_plan(self.get_serializer_class())
+        embed = self.get_embed()
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            row = plan.values(queryset, embed).filter(**{self.lookup_field: kwargs[lookup]}).first()
+        except (TypeError, ValueError):
+            #un id que no es numero, igual que get_object_or_404
+            row = None
+        if row is None:
+            #mismo mensaje que get_object_or_404
+            raise Http404(f"No {queryset.model._meta.object_name} matches the given query.")  # pylint: disable=protected-access
+        return Response(plan.row(row, embed))
@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from enrollments import partitions, terms
+from enrollments.models import Term
+
+
+class Command(BaseCommand):
+    help = ("Archiva un periodo viejo: queda de solo lectura (se lee con ?term=<codigo>, ?term=all lo "
+            "saltea) y en postgres su particion se separa de la tabla de matriculas y pasa al schema "
+            "ENROLLMENT_ARCHIVE_SCHEMA, asi no pesa en los indices ni en los planes del periodo actual. "
+            "--restore la vuelve a conectar. Sin argumentos lista los periodos y sus particiones.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("code", nargs="?", help="Codigo del periodo.")
+        parser.add_argument("--restore", action="store_true", help="Vuelve a conectar un periodo archivado.")
+        parser.add_argument("--concurrently", action="store_true",
+                            help="DETACH ... CONCURRENTLY: no bloquea las consultas (postgres 14+).")
+
+    def _list(self):
+        sizes = {row["name"]: row for row in partitions.partitions()}
+        for term in Term.objects.order_by("starts_on", "code"):  # pylint: disable=no-member
+            state = "actual" if term.is_current else "archivado" if term.archived_at else "activo"
+            row = sizes.get(partitions.partition_name(term.pk))
+            where = f"  {row['schema']}.{row['name']} ~{row['rows']} filas, {row['bytes'] // 1024} KiB" if row else ""
+            self.stdout.write(f"{term.code:<20} {state:<10}{where}")
+
+    def handle(self, *args, **options):
+        if not options["code"]:
+            self._list()
+            return
+        try:
+            term = Term.objects.get(code=options["code"])  # pylint: disable=no-member
+        except Term.DoesNotExist:  # pylint: disable=no-member
+            raise CommandError(f"No existe el periodo {options['code']}")
+        partitioned = partitions.is_partitioned()
+
+        if options["restore"]:
+            if term.archived_at is None:
+                raise CommandError(f"El periodo {term.code} no esta archivado")
+            with transaction.atomic():
+                if partitioned:
+                    partitions.attach(term.pk)
+                terms.mark_archived(term, archived=False)
+            self.stdout.write(self.style.SUCCESS(f"periodo {term.code} restaurado"))
+            return
+
+        if term.is_current:
+            raise CommandError(f"{term.code} es el periodo actual: activar otro antes de archivarlo")
+        if term.archived_at is not None:
+            raise CommandError(f"El periodo {term.code} ya esta archivado")
+        if partitioned and options["concurrently"]:
+            #CONCURRENTLY no puede ir en una transaccion: primero se cierra el
+            #periodo a escrituras y despues se separa la particion (mientras
+            #tanto ?term=<codigo> puede verlo vacio)
+            terms.mark_archived(term)
+            partitions.detach(term.pk, concurrently=True)
+        else:
+            with transaction.atomic():
+                terms.mark_archived(term)
+                if partitioned:
+                    partitions.detach(term.pk)
+        where = "particion movida al schema de archivo" if partitioned else "solo logico, la base no esta particionada"
+        self.stdout.write(self.style.SUCCESS(f"periodo {term.code} archivado ({where})"))
@@ -0,0 +1,144 @@
+import http.client
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def _async_path(path: str) -> str:
+    #la variante async de cada ruta esta bajo /api/async/ (psis_api/urls.py)
+    if path.startswith("/auth/"):
+        return "/api/async" + path
+    return path.replace("/api/", "/api/async/", 1)
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga contra servidores de verdad: gunicorn (WSGI, vistas sync) y uvicorn "
+            "(ASGI, vistas de /api/async/ y tambien las sync) con la misma cantidad de workers. "
+            "Cada ruta se mide en cada modo con N clientes concurrentes (keep-alive).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="*", default=["/api/courses/?page_size=20", "/api/enrollments/?page_size=20"],
+                            help="Rutas sync; la async se arma sola (/api/... -> /api/async/...).")
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--port", type=int, default=8701)
+        parser.add_argument("--token", help="Bearer para rutas autenticadas (/auth/me/).")
+        parser.add_argument("--cache", action="store_true",
+                            help="Deja prendido el cache de respuestas (por defecto se apaga para medir la base).")
+        parser.add_argument("--json", action="store_true")
+
+    def _modes(self, workers: int, port: int):
+        bind = f"127.0.0.1:{port}"
+        return [
+            ("gunicorn (wsgi)", [sys.executable, "-m", "gunicorn", "psis_api.wsgi:application",
+                                 "-w", str(workers), "-b", bind, "--log-level", "warning"], False),
+            ("uvicorn (vistas async)", [sys.executable, "-m", "uvicorn", "psis_api.asgi:application",
+                                        "--workers", str(workers), "--port", str(port), "--log-level", "warning",
+                                        "--no-access-log"], True),
+            ("uvicorn (vistas sync)", [sys.executable, "-m", "uvicorn", "psis_api.asgi:application",
+                                       "--workers", str(workers), "--port", str(port), "--log-level", "warning",
+                                       "--no-access-log"], False),
+        ]
+
+    def _wait_ready(self, proc, port: int, path: str, headers: dict):
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if proc.poll() is not None:
+                raise CommandError(f"El servidor termino al arrancar (codigo {proc.returncode})")
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+                conn.request("GET", path, headers=headers)
+                conn.getresponse().read()
+                conn.close()
+                return
+            except OSError:
+                time.sleep(0.3)
+        raise CommandError("El servidor no respondio en 60 segundos")
+
+    def _load(self, port: int, path: str, total: int, concurrency: int, headers: dict) -> dict:
+        latencies = []
+        statuses = {}
+        lock = threading.Lock()
+
+        def client(count):
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            mine = []
+            codes = {}
+            for _ in range(count):
+                started = time.perf_counter()
+                try:
+                    conn.request("GET", path, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    code = response.status
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+                    code = "error"
+                mine.append((time.perf_counter() - started) * 1000)
+                codes[code] = codes.get(code, 0) + 1
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+                for code, n in codes.items():
+                    statuses[code] = statuses.get(code, 0) + n
+
+        per_client = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client, args=(count,)) for count in per_client if count]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": sum(n for code, n in statuses.items() if code != 200),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+        }
+
+    def handle(self, *args, **options):
+        headers = {"Authorization": f"Bearer {options['token']}"} if options["token"] else {}
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "psis_api.settings")}
+        if not options["cache"]:
+            env["RESPONSE_CACHE_ENABLED"] = "False"
+        results = []
+        for name, cmd, use_async in self._modes(options["workers"], options["port"]):
+            paths = [_async_path(p) if use_async else p for p in options["paths"]]
+            proc = subprocess.Popen(cmd, env=env, cwd=settings.BASE_DIR)  # pylint: disable=consider-using-with
+            try:
+                self._wait_ready(proc, options["port"], paths[0], headers)
+                for original, path in zip(options["paths"], paths):
+                    #calentamiento: conexiones, templates, planes de lectura
+                    self._load(options["port"], path, options["concurrency"] * 2, options["concurrency"], headers)
+                    result = self._load(options["port"], path, options["requests"], options["concurrency"], headers)
+                    results.append({"mode": name, "path": original, **result})
+            finally:
+                proc.send_signal(signal.SIGTERM)
+                try:
+                    proc.wait(timeout=30)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+        if options["json"]:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"{options['workers']} workers, {options['concurrency']} clientes, "
+                          f"{options['requests']} requests por ruta")
+        self.stdout.write(f"{'modo':24} {'ruta':34} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errores':>8}")
+        for row in results:
+            self.stdout.write(f"{row['mode']:24} {row['path'][:34]:34} {row['rps']:>8} {row['p50_ms']:>8} "
+                              f"{row['p99_ms']:>8} {row['errors']:>8}")
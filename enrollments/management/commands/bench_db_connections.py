@@ -0,0 +1,116 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import RequestFactory
+
+from enrollments.db import pool_stats
+
+#(nombre, variables de entorno) de cada modo que compara --compare
+MODES = [
+    ("una conexion por request", {"DB_POOL": "False", "DB_CONN_MAX_AGE": "0"}),
+    ("CONN_MAX_AGE=60", {"DB_POOL": "False", "DB_CONN_MAX_AGE": "60"}),
+    ("pool psycopg", {"DB_POOL": "True"}),
+]
+
+
+def _percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga de un endpoint chico pasando por el handler WSGI completo "
+            "(las conexiones se abren y cierran como en produccion). Con --compare corre "
+            "la misma prueba con una conexion por request, con CONN_MAX_AGE y con el pool.")
+
+    def add_arguments(self, parser):
+        #enrollments no pasa por el cache de respuestas, asi cada request va a la base
+        parser.add_argument("--url", default="/api/enrollments/?page_size=20")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--compare", action="store_true")
+        parser.add_argument("--json", action="store_true", help="Imprime el resultado como json.")
+
+    def _run(self, url: str, total: int, threads: int) -> dict:
+        handler = WSGIHandler()
+        factory = RequestFactory()
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def start_response(status, headers, exc_info=None):
+            return None
+
+        def worker(count):
+            mine = []
+            for _ in range(count):
+                environ = factory.get(url).environ
+                started = time.perf_counter()
+                response = handler(environ, start_response)
+                b"".join(response)
+                #close() manda request_finished: ahi se cierra o devuelve la conexion
+                response.close()
+                mine.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    with lock:
+                        errors.append(response.status_code)
+            connections.close_all()
+            with lock:
+                latencies.extend(mine)
+
+        per_thread = [total // threads + (1 if i < total % threads else 0) for i in range(threads)]
+        started = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(count,)) for count in per_thread]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        latencies.sort()
+        return {
+            "requests": len(latencies),
+            "errors": len(errors),
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "pool": pool_stats()["default"]["pool"],
+        }
+
+    def _compare(self, options):
+        rows = []
+        for name, env in MODES:
+            cmd = [sys.executable, sys.argv[0], "bench_db_connections", "--json", "--url", options["url"],
+                   "--requests", str(options["requests"]), "--threads", str(options["threads"])]
+            proc = subprocess.run(cmd, env={**os.environ, **env}, capture_output=True, text=True, check=False)
+            if proc.returncode != 0:
+                self.stdout.write(self.style.WARNING(f"{name}: fallo ({proc.stderr.strip().splitlines()[-1:]})"))
+                continue
+            rows.append((name, json.loads(proc.stdout.strip().splitlines()[-1])))
+        self.stdout.write(f"{'modo':26} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'espera pool ms':>15}")
+        for name, result in rows:
+            wait = (result["pool"] or {}).get("avg_wait_ms")
+            self.stdout.write(f"{name:26} {result['rps']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} "
+                              f"{'-' if wait is None else wait:>15}")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("No es postgres: el pool no aplica"))
+        if options["compare"]:
+            self._compare(options)
+            return
+        result = self._run(options["url"], options["requests"], max(1, options["threads"]))
+        if result["errors"] == result["requests"]:
+            raise CommandError(f"Todas las requests a {options['url']} fallaron")
+        if options["json"]:
+            self.stdout.write(json.dumps(result))
+            return
+        self.stdout.write(f"{result['requests']} requests con {options['threads']} threads: {result['rps']} req/s, "
+                          f"p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, errores {result['errors']}")
+        if result["pool"]:
+            self.stdout.write(f"pool: {result['pool']}")
@@ -0,0 +1,94 @@
+import json
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from django.template.loader import get_template
+
+from enrollments.pdf_engines import ENGINES, get_engine
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[2] / "templates" / "enrollments"
+
+
+def _context(rows: int) -> dict:
+    #datos falsos en memoria (sin base) con todas las variables que usan los
+    #templates. Las matriculas se reparten en 10 cursos
+    now = datetime.now()
+    students = [
+        SimpleNamespace(first_name=f"José {i}", last_name=f"Núñez {i}",
+                        email=f"alumno{i}@example.com", id_number=f"4.{i:03d}.{i % 1000:03d}-{i % 10}")
+        for i in range(rows)
+    ]
+    courses = [
+        SimpleNamespace(id=c, code=f"MAT{c:03d}", title=f"Matemática {c}", capacity=30, total=0)
+        for c in range(10)
+    ]
+    enrolls = []
+    per_course = {c.code: [] for c in courses}
+    for i, student in enumerate(students):
+        course = courses[i % len(courses)]
+        enroll = SimpleNamespace(student=student, course=course, enrolled_at=now)
+        enrolls.append(enroll)
+        per_course[course.code].append(enroll)
+        course.total += 1
+    for course in courses:
+        course.enrollments = SimpleNamespace(all=per_course[course.code].copy)
+    return {
+        "student": students[0] if students else None,
+        "course": courses[0],
+        "students": students,
+        "courses": courses,
+        "enrolls": enrolls,
+        "offset": 0,
+        "first": True,
+        "generated_at": now.strftime("%Y-%m-%d %H:%M"),
+    }
+
+
+class Command(BaseCommand):
+    help = ("Renderiza cada template de reportes con cada motor a distintos tamaños "
+            "y muestra tiempo, pico de memoria y tamaño de salida.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1000, 10000])
+        parser.add_argument("--engines", nargs="+", default=sorted(ENGINES))
+        parser.add_argument("--templates", nargs="+", default=None,
+                            help="Nombres de template (default: todos los .html).")
+        parser.add_argument("--json", dest="json_path", default=None,
+                            help="Guarda los resultados en este archivo.")
+
+    def handle(self, *args, **options):
+        names = options["templates"] or sorted(p.name for p in TEMPLATES_DIR.glob("*.html"))
+        results = []
+        self.stdout.write(f"{'template':42} {'engine':11} {'rows':>6} {'ms':>9} {'peak KB':>9} {'out KB':>8}")
+        for size in options["sizes"]:
+            ctx = _context(size)
+            for name in names:
+                html = get_template(f"enrollments/{name}").render(ctx)
+                for engine_name in options["engines"]:
+                    row = {"template": name, "engine": engine_name, "rows": size}
+                    try:
+                        engine = get_engine(engine_name)
+                        tracemalloc.start()
+                        started = time.perf_counter()
+                        out = engine.render(html)
+                        row["ms"] = round((time.perf_counter() - started) * 1000, 1)
+                        row["peak_kb"] = tracemalloc.get_traced_memory()[1] // 1024
+                        row["out_kb"] = len(out) // 1024
+                    except Exception as exc:  # pylint: disable=broad-except
+                        #por ejemplo weasyprint sin pango instalado
+                        row["error"] = str(exc).splitlines()[0] if str(exc) else type(exc).__name__
+                    finally:
+                        tracemalloc.stop()
+                    results.append(row)
+                    if "error" in row:
+                        self.stdout.write(f"{name:42} {engine_name:11} {size:>6} error: {row['error']}")
+                    else:
+                        self.stdout.write(f"{name:42} {engine_name:11} {size:>6} {row['ms']:>9} "
+                                          f"{row['peak_kb']:>9} {row['out_kb']:>8}")
+        if options["json_path"]:
+            Path(options["json_path"]).write_text(json.dumps(results, indent=2), encoding="utf-8")
+            self.stdout.write(f"Resultados guardados en {options['json_path']}")
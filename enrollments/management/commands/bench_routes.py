@@ -0,0 +1,361 @@
+import itertools
+import json
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import URLResolver, get_resolver
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from enrollments import batch_reports, terms
+from enrollments.instrumentation import measure
+from enrollments.jobs import enqueue, run_job
+from enrollments.models import Course, Enrollment, ReportJob, Student, Term, WaitlistEntry
+from enrollments.services import enroll, join_waitlist
+
+from .generate_dataset import EMAIL_DOMAIN, _cedula
+
+#lo que crean los escenarios de escritura se marca asi y se borra al terminar
+BENCH_DOMAIN = "bench.invalid"
+BENCH_PREFIX = "BZ"
+
+_PARAM = re.compile(r"\(\?P<(\w+)>[^()]*\)|<(?:\w+:)?(\w+)>")
+#recurso de cada ruta para saber que id va en <pk>
+_RESOURCES = {"students": "student", "courses": "course", "enrollments": "enrollment",
+              "waitlist": "waitlist", "report-jobs": "job", "terms": "term"}
+_SLOW = ("report", "export", "download", "login", "import", "schema", "docs", "redoc")
+
+
+def _routes(patterns, prefix=""):
+    #(ruta, vista) de todo psis_api/urls.py, con los parametros como <nombre>
+    for pattern in patterns:
+        route = prefix + str(pattern.pattern).lstrip("^").rstrip("$")
+        if isinstance(pattern, URLResolver):
+            if route.startswith("admin/"):
+                continue
+            yield from _routes(pattern.url_patterns, route)
+        elif "(?P<format>" not in route and pattern.name != "api-root":
+            yield _PARAM.sub(lambda m: f"<{m.group(1) or m.group(2)}>", route), pattern.callback
+
+def _endpoints():
+    #una entrada por metodo: las acciones de los viewsets, los metodos de las
+    #APIView y GET para las vistas funcion (las async de /api/async/)
+    for route, callback in _routes(get_resolver().url_patterns):
+        actions = getattr(callback, "actions", None)
+        cls = getattr(callback, "cls", None)
+        if actions:
+            basename = callback.initkwargs.get("basename")
+            #DRF agrega "head" a actions en la primera request
+            for method, action in list(actions.items()):
+                if method in ("head", "options"):
+                    continue
+                yield method.upper(), route, f"{basename}.{action}"
+        elif cls is not None:
+            for method in ("get", "post", "put", "patch", "delete"):
+                if hasattr(cls, method):
+                    yield method.upper(), route, cls.__name__
+        else:
+            prefix = "async." if route.startswith("api/async/") else ""
+            yield "GET", route, f"{prefix}{callback.__name__}"
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+def _git_commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=settings.BASE_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "nogit"
+    return f"{sha}-dirty" if dirty else sha
+
+
+class _Fixtures:
+    #ids de muestra del dataset y objetos propios para las escrituras
+    def __init__(self):
+        #los reportes encolados desde aca se borran por fecha (cleanup)
+        self.started = timezone.now()
+        dataset = Student.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}")  # pylint: disable=no-member
+        self.student = (dataset.annotate(n=Count("enrollments")).order_by("-n", "id").first()
+                        or Student.objects.order_by("id").first())  # pylint: disable=no-member
+        #el curso con mas alumnos: las listas y reportes mas pesados
+        self.course = Course.objects.order_by("-seats_taken", "id").first()  # pylint: disable=no-member
+        if self.student is None or self.course is None:
+            raise CommandError("No hay datos: correr antes manage.py generate_dataset")
+        self.enrollment = (
+            Enrollment.objects.filter(course=self.course, term_id=terms.current_term_id())  # pylint: disable=no-member
+            .order_by("id").first()
+        )
+        self.user = (User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}", student__isnull=False)
+                     .select_related("student").order_by("id").first())
+        self.access = self.refresh = None
+        if self.user is not None:
+            refresh = RefreshToken.for_user(self.user)
+            #los claims de perfil que agrega el login (auth_serializers.py)
+            self.access, self.refresh = str(refresh.access_token), str(refresh)
+        self._seq = itertools.count(90_000_000 + int(time.time()) % 1_000_000 * 7)
+        #cupo de sobra para todas las matriculas de los escenarios, y uno lleno
+        self.open_course = Course.objects.create(code=f"{BENCH_PREFIX}OPEN", title="Bench abierto",  # pylint: disable=no-member
+                                                 capacity=1_000_000)
+        self.full_course = Course.objects.create(code=f"{BENCH_PREFIX}FULL", title="Bench lleno", capacity=1)  # pylint: disable=no-member
+        enroll(self.new_student().pk, self.full_course.pk)
+        self.waitlist = join_waitlist(self.new_student().pk, self.full_course.pk)
+        self.job = run_job(enqueue("courses_all"))
+        #periodo propio para update: activar uno (global) no se mide
+        self.term = Term.objects.create(code=f"{BENCH_PREFIX}TERM", name="Bench")  # pylint: disable=no-member
+        #un lote chico ya terminado para la ruta de avance
+        self.batch = batch_reports.Batch("course", [self.course.pk], engine="html")
+        b"".join(self.batch.iter_zip(workers=1))
+
+    def ids(self) -> dict:
+        return {"student": self.student.pk, "course": self.course.pk, "enrollment": self.enrollment.pk,
+                "waitlist": self.waitlist.pk, "job": self.job.pk, "term": self.term.pk, "batch_id": self.batch.id,
+                "student_id": self.student.pk, "course_id": self.course.pk}
+
+    def student_row(self) -> dict:
+        n = next(self._seq)
+        return {"first_name": "Bench", "last_name": f"Núñez {n}", "email": f"b{n}@{BENCH_DOMAIN}",
+                "id_number": _cedula(n)}
+
+    def new_student(self) -> Student:
+        return Student.objects.create(**self.student_row())  # pylint: disable=no-member
+
+    def new_course(self) -> Course:
+        n = next(self._seq)
+        return Course.objects.create(code=f"{BENCH_PREFIX}{n}", title="Bench", capacity=30)  # pylint: disable=no-member
+
+
+def cleanup(since=None):
+    #los reportes no tienen marca propia: se borran los encolados durante la
+    #corrida (los de una corrida cortada los borra purge_expired)
+    if since is not None:
+        for job in ReportJob.objects.filter(created_at__gte=since):  # pylint: disable=no-member
+            if job.file_path:
+                Path(job.file_path).unlink(missing_ok=True)
+            job.delete()
+    students = Student.objects.filter(email__endswith=f"@{BENCH_DOMAIN}")  # pylint: disable=no-member
+    courses = Course.objects.filter(code__startswith=BENCH_PREFIX)  # pylint: disable=no-member
+    WaitlistEntry.objects.filter(student__in=students).delete()  # pylint: disable=no-member
+    Enrollment.objects.filter(student__in=students).delete()  # pylint: disable=no-member
+    User.objects.filter(email__endswith=f"@{BENCH_DOMAIN}").delete()
+    students.delete()
+    courses.delete()
+    Term.objects.filter(code__startswith=BENCH_PREFIX).delete()  # pylint: disable=no-member
+
+
+def _scenarios(fx: _Fixtures) -> dict:
+    #escritura: (nombre) -> funcion que prepara y devuelve ids a reemplazar y
+    #el cuerpo. Cada iteracion trabaja sobre objetos nuevos
+    student, course, enrollment = fx.student, fx.course, fx.enrollment
+    student_data = {k: getattr(student, k) for k in ("first_name", "last_name", "email", "id_number")}
+    course_data = {"code": course.code, "title": course.title, "capacity": course.capacity}
+
+    def destroy_enrollment():
+        return {"enrollment": enroll(fx.new_student().pk, fx.open_course.pk).pk}, None
+
+    def destroy_waitlist():
+        return {"waitlist": join_waitlist(fx.new_student().pk, fx.full_course.pk).pk}, None
+
+    return {
+        "student.create": lambda: ({}, fx.student_row()),
+        "student.update": lambda: ({}, student_data),
+        "student.partial_update": lambda: ({}, {"first_name": student.first_name}),
+        "student.destroy": lambda: ({"student": fx.new_student().pk}, None),
+        "student.import_students": lambda: ({}, [fx.student_row() for _ in range(5)]),
+        "course.create": lambda: ({}, {"code": f"{BENCH_PREFIX}{next(fx._seq)}", "title": "Bench", "capacity": 30}),  # pylint: disable=protected-access
+        "course.update": lambda: ({}, course_data),
+        "course.partial_update": lambda: ({}, {"title": course.title}),
+        "course.destroy": lambda: ({"course": fx.new_course().pk}, None),
+        "enrollment.create": lambda: ({}, {"student": fx.new_student().pk, "course": fx.open_course.pk}),
+        "enrollment.update": lambda: ({}, {"student": enrollment.student_id, "course": enrollment.course_id}),
+        "enrollment.partial_update": lambda: ({}, {"course": enrollment.course_id}),
+        "enrollment.destroy": destroy_enrollment,
+        "enrollment.report_batch": lambda: ({}, {"kind": "course", "ids": [course.pk]}),
+        "enrollment.bulk": lambda: ({}, [{"student": fx.new_student().pk, "course": fx.open_course.pk}
+                                         for _ in range(10)]),
+        "waitlist.create": lambda: ({}, {"student": fx.new_student().pk, "course": fx.full_course.pk}),
+        "waitlist.destroy": destroy_waitlist,
+        "term.create": lambda: ({}, {"code": f"{BENCH_PREFIX}{next(fx._seq)}", "name": "Bench"}),  # pylint: disable=protected-access
+        "term.update": lambda: ({}, {"code": fx.term.code, "name": fx.term.name}),
+        "term.partial_update": lambda: ({}, {"name": fx.term.name}),
+        "reportjob.create": lambda: ({}, {"report_type": "courses_all"}),
+        "LoginView": lambda: ({}, {"username": fx.user.username, "password": fx.user.student.id_number}),
+        "TokenRefreshView": lambda: ({}, {"refresh": fx.refresh}),
+    }
+
+def _fill(route: str, ids: dict) -> str:
+    resource_name = next((name for part, name in _RESOURCES.items() if f"/{part}/" in f"/{route}"), None)
+
+    def value(match):
+        param = match.group(1) or match.group(2)
+        return str(ids[resource_name if param == "pk" else param])
+    return "/" + _PARAM.sub(value, route)
+
+
+class Command(BaseCommand):
+    help = ("Mide cada ruta de psis_api/urls.py (CRUD, acciones de alumnos/cursos, cada reporte, login) "
+            "dentro del proceso con el cliente de Django: percentiles de latencia, consultas por request "
+            "y pico de memoria. Los resultados quedan en un json para comparar entre commits "
+            "(--compare). Conviene correrlo sobre un dataset de manage.py generate_dataset.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=20)
+        parser.add_argument("--slow-iterations", type=int, default=3,
+                            help="Iteraciones de reportes, exportaciones, login e importacion.")
+        parser.add_argument("--only", action="append", default=[],
+                            help="Solo rutas o nombres que contengan este texto (se puede repetir).")
+        parser.add_argument("--exclude", action="append", default=[],
+                            help="Saltea rutas o nombres que contengan este texto (se puede repetir).")
+        parser.add_argument("--output", help="Archivo json (por defecto bench/results/<fecha>-<commit>.json).")
+        parser.add_argument("--compare", help="json de una corrida anterior para mostrar la diferencia.")
+        parser.add_argument("--cache", action="store_true",
+                            help="Deja prendidos los caches de respuestas y de reportes.")
+        parser.add_argument("--no-memory", action="store_true", help="Sin la corrida extra con tracemalloc.")
+
+    def _request(self, client, method, path, data, headers):
+        #consume el cuerpo: en los streaming las consultas y el render pasan aca
+        with measure() as metrics:
+            started = time.perf_counter()
+            response = getattr(client, method.lower())(
+                path, data=json.dumps(data) if data is not None else None,
+                content_type="application/json", headers=headers,
+            ) if method != "GET" else client.get(path, headers=headers)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+            elapsed = (time.perf_counter() - started) * 1000
+        response.close()
+        return response.status_code, elapsed, metrics.queries
+
+    def _bench(self, client, fx, scenarios, method, route, name, iterations, memory):
+        headers = {"Authorization": f"Bearer {fx.access}"} if fx.access else {}
+        latencies, queries, statuses = [], [], {}
+        scenario = scenarios.get(name)
+
+        def once():
+            ids, data = scenario() if scenario else ({}, None)
+            return self._request(client, method, _fill(route, {**fx.ids(), **ids}), data, headers)
+
+        once()  #calentamiento: templates, planes, conexiones
+        for _ in range(iterations):
+            code, elapsed, count = once()
+            latencies.append(elapsed)
+            queries.append(count)
+            statuses[str(code)] = statuses.get(str(code), 0) + 1
+        peak_kb = None
+        if memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            once()
+            peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        return {
+            "method": method, "route": route, "name": name, "iterations": iterations, "status": statuses,
+            "p50_ms": round(_percentile(latencies, 0.50), 2),
+            "p90_ms": round(_percentile(latencies, 0.90), 2),
+            "p99_ms": round(_percentile(latencies, 0.99), 2),
+            "mean_ms": round(statistics.fmean(latencies), 2),
+            "max_ms": round(max(latencies), 2),
+            "queries": round(statistics.median(queries)),
+            "queries_max": max(queries),
+            "peak_kb": peak_kb,
+        }
+
+    def _meta(self, fx: _Fixtures, options) -> dict:
+        return {
+            "commit": _git_commit(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "cache": options["cache"],
+            "dataset": {
+                "students": Student.objects.count(),  # pylint: disable=no-member
+                "courses": Course.objects.count(),  # pylint: disable=no-member
+                "enrollments": Enrollment.objects.count(),  # pylint: disable=no-member
+                "sample_course_students": fx.course.seats_taken,
+            },
+        }
+
+    def _compare(self, results: list, path: str):
+        try:
+            previous = json.loads(Path(path).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"No se pudo leer {path}: {exc}")
+        before = {(r["method"], r["route"]): r for r in previous["results"]}
+        self.stdout.write(f"\ncomparado con {previous['meta']['commit']} ({previous['meta']['date']})")
+        self.stdout.write(f"{'':7}{'ruta':52} {'p50 antes':>10} {'p50 ahora':>10} {'dif':>7} {'consultas':>10}")
+        for row in results:
+            old = before.get((row["method"], row["route"]))
+            if old is None:
+                continue
+            diff = (row["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100 if old["p50_ms"] else 0
+            self.stdout.write(f"{row['method']:7}{row['route'][:52]:52} {old['p50_ms']:>10} {row['p50_ms']:>10} "
+                              f"{diff:>+6.0f}% {old['queries']:>4} -> {row['queries']:<4}")
+
+    def handle(self, *args, **options):
+        cleanup()
+        fx = _Fixtures()
+        scenarios = _scenarios(fx)
+        overrides = {"INSTRUMENTATION_ENABLED": False, "QUERY_BUDGET_STRICT": False}
+        if not options["cache"]:
+            overrides["RESPONSE_CACHE"] = {**settings.RESPONSE_CACHE, "ENABLED": False}
+            overrides["REPORT_CACHE"] = None
+        #el cliente de pruebas arma requests con host "testserver"
+        overrides["ALLOWED_HOSTS"] = [*settings.ALLOWED_HOSTS, "testserver"]
+
+        results, skipped = [], []
+        client = Client(raise_request_exception=False)
+        try:
+            with override_settings(**overrides):
+                for method, route, name in list(_endpoints()):
+                    key = f"{method} {route}"
+                    if options["only"] and not any(o in key or o in name for o in options["only"]):
+                        continue
+                    if any(o in key or o in name for o in options["exclude"]):
+                        continue
+                    if method != "GET" and name not in scenarios:
+                        skipped.append({"method": method, "route": route, "name": name})
+                        continue
+                    slow = any(word in route or word in name.lower() for word in _SLOW)
+                    iterations = max(1, options["slow_iterations"] if slow else options["iterations"])
+                    row = self._bench(client, fx, scenarios, method, route, name, iterations,
+                                      not options["no_memory"])
+                    results.append(row)
+                    self.stdout.write(f"{method:7}{route[:52]:52} p50 {row['p50_ms']:>9} ms  p99 {row['p99_ms']:>9} ms  "
+                                      f"{row['queries']:>4} q  {row['peak_kb'] or '-':>6} KB  {row['status']}")
+        finally:
+            cleanup(fx.started)
+
+        for entry in skipped:
+            self.stdout.write(f"{entry['method']:7}{entry['route'][:52]:52} sin escenario")
+        output = {
+            "meta": {**self._meta(fx, options),
+                     "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss},
+            "results": results,
+            "skipped": skipped,
+        }
+        path = Path(options["output"] or settings.BASE_DIR / "bench" / "results" /
+                    f"{datetime.now():%Y%m%d-%H%M%S}-{output['meta']['commit']}.json")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(output, indent=2, ensure_ascii=False), encoding="utf-8")
+        self.stdout.write(self.style.SUCCESS(f"{len(results)} rutas medidas, resultados en {path}"))
+        if options["compare"]:
+            self._compare(results, options["compare"])
@@ -0,0 +1,96 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from enrollments.models import Student
+from enrollments.search import DocumentSearchFilter, student_document
+from enrollments.views import StudentViewSet
+
+FIRST_NAMES = ["José", "María", "Ana", "Sofía", "Martín", "Lucía", "Nicolás", "Inés", "Joaquín", "Valentina",
+               "Agustín", "Camila", "Andrés", "Belén", "Tomás", "Florencia", "Germán", "Julieta", "Ramón", "Pilar"]
+LAST_NAMES = ["Núñez", "Pérez", "González", "Rodríguez", "Fernández", "López", "Martínez", "Gómez", "Díaz",
+              "Sánchez", "Álvarez", "Romero", "Suárez", "Benítez", "Acuña", "Ibáñez", "Méndez", "Peña"]
+
+#lo que escribe la gente en el mostrador: nombres parciales, sin tildes,
+#con errores de tipeo y cedulas a medias
+QUERIES = ["jose", "nunez", "maria gonz", "Martín Pé", "benitez", "fernandes", "acuna ines", "4.01", "3.000"]
+
+
+class Command(BaseCommand):
+    help = ("Mide la latencia del buscador de alumnos (search.py) contra el SearchFilter "
+            "de DRF (ILIKE por columna), con una tabla de --students alumnos.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=100000,
+                            help="Crea alumnos de prueba hasta llegar a esta cantidad.")
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--queries", nargs="+", default=QUERIES)
+        parser.add_argument("--explain", action="store_true", help="Muestra el plan de cada consulta (postgres).")
+        parser.add_argument("--keep", action="store_true", help="No borra los alumnos de prueba.")
+
+    def _create(self, total: int) -> list[int]:
+        missing = total - Student.objects.count()  # pylint: disable=no-member
+        if missing <= 0:
+            return []
+        tag = uuid.uuid4().hex[:6]
+        rnd = random.Random(tag)
+        ids = []
+        for start in range(0, missing, 5000):
+            batch = []
+            for i in range(start, min(start + 5000, missing)):
+                student = Student(
+                    first_name=rnd.choice(FIRST_NAMES), last_name=f"{rnd.choice(LAST_NAMES)} {rnd.choice(LAST_NAMES)}",
+                    email=f"bench-{tag}-{i}@example.invalid",
+                    id_number=f"{rnd.randint(1, 6)}.{i // 1000:03d}.{i % 1000:03d}-{int(tag, 16) % 100:02d}",
+                )
+                student.search_document = student_document(student)
+                batch.append(student)
+            ids += [s.pk for s in Student.objects.bulk_create(batch)]  # pylint: disable=no-member
+        self.stdout.write(f"Creados {missing} alumnos de prueba")
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE enrollments_student")
+        return ids
+
+    def _time(self, backend, query: str, repeat: int):
+        view = StudentViewSet()
+        #los campos que usaba el SearchFilter antes del buscador
+        view.search_fields = ["first_name", "last_name", "email", "id_number"]
+        request = Request(APIRequestFactory().get("/api/students/", {"search": query}))
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            qs = backend.filter_queryset(request, Student.objects.all(), view)  # pylint: disable=no-member
+            rows = list(qs[:20])
+            times.append((time.perf_counter() - started) * 1000)
+        return rows, qs, times
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            self.stdout.write(self.style.WARNING("No es postgres: el buscador usa el LIKE de respaldo"))
+        created = self._create(options["students"])
+        try:
+            self.stdout.write(f"{'consulta':16} {'motor':8} {'filas':>5} {'p50 ms':>8} {'p95 ms':>8}")
+            for query in options["queries"]:
+                for name, backend in (("search", DocumentSearchFilter()), ("ilike", SearchFilter())):
+                    rows, qs, times = self._time(backend, query, options["repeat"])
+                    times.sort()
+                    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+                    self.stdout.write(f"{query:16} {name:8} {len(rows):>5} "
+                                      f"{statistics.median(times):>8.2f} {p95:>8.2f}")
+                    if options["explain"] and connection.vendor == "postgresql":
+                        self.stdout.write(qs[:20].explain(analyze=True))
+        finally:
+            if created and not options["keep"]:
+                #borrado directo, sin signals: son alumnos de prueba sin matriculas
+                #y con delete() serian dos consultas por alumno
+                for start in range(0, len(created), 5000):
+                    qs = Student.objects.filter(pk__in=created[start:start + 5000])  # pylint: disable=no-member
+                    qs._raw_delete(qs.db)  # pylint: disable=protected-access
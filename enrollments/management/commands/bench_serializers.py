@@ -0,0 +1,71 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from enrollments.lean import get_plan
+from enrollments.models import Course, Enrollment, Student
+from enrollments.serializers import CourseSerializer, EnrollmentSerializer, StudentSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Compara el ModelSerializer contra la lectura liviana (lean.py, .values() + plan "
+            "de campos) serializando --rows filas de alumnos, cursos y matriculas.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def _seed(self, rows: int):
+        #datos de prueba dentro de una transaccion que despues se descarta
+        tag = uuid.uuid4().hex[:6]
+        students = Student.objects.bulk_create([  # pylint: disable=no-member
+            Student(first_name="José", last_name=f"Núñez {i}", email=f"bench-{tag}-{i}@example.invalid",
+                    id_number=f"8.{i:06d}-{int(tag, 16) % 10}")
+            for i in range(rows)
+        ])
+        courses = Course.objects.bulk_create([  # pylint: disable=no-member
+            Course(code=f"B{tag}{i:03d}"[:10], title=f"Curso de prueba {i}", capacity=rows) for i in range(max(1, rows // 100))
+        ])
+        Enrollment.objects.bulk_create([  # pylint: disable=no-member
+            Enrollment(student=s, course=courses[i % len(courses)]) for i, s in enumerate(students)
+        ])
+        return [s.pk for s in students], [c.pk for c in courses]
+
+    def _time(self, func, repeat: int) -> float:
+        times = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            times.append((time.perf_counter() - started) * 1000)
+        return statistics.median(times)
+
+    def handle(self, *args, **options):
+        rows, repeat = options["rows"], options["repeat"]
+        try:
+            with transaction.atomic():
+                student_ids, course_ids = self._seed(rows)
+                cases = [
+                    ("students", StudentSerializer, Student.objects.filter(pk__in=student_ids)),  # pylint: disable=no-member
+                    ("courses", CourseSerializer, Course.objects.filter(pk__in=course_ids)),  # pylint: disable=no-member
+                    #el queryset de antes hacia select_related aunque solo se muestran los ids
+                    ("enrollments", EnrollmentSerializer,
+                     Enrollment.objects.filter(student_id__in=student_ids)),  # pylint: disable=no-member
+                ]
+                self.stdout.write(f"{'datos':12} {'filas':>7} {'serializer ms':>14} {'lean ms':>9} {'x':>6}")
+                for name, serializer_class, qs in cases:
+                    plan = get_plan(serializer_class)
+                    full_qs = qs.select_related("student", "course") if name == "enrollments" else qs
+                    slow = self._time(lambda: serializer_class(full_qs.all(), many=True).data, repeat)
+                    fast = self._time(lambda: plan.rows(plan.values(qs.all())), repeat)
+                    count = qs.count()
+                    self.stdout.write(f"{name:12} {count:>7} {slow:>14.1f} {fast:>9.1f} {slow / fast:>6.1f}")
+                raise _Rollback
+        except _Rollback:
+            pass
@@ -0,0 +1,123 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench_routes import _git_commit
+
+#modulos que solo hacen falta para renderizar reportes o para la
+#documentacion de la api: no deberian estar cargados al terminar de arrancar.
+#drf_spectacular.openapi no esta: lo importa @extend_schema en views.py al
+#decorar (~12ms, <1MB); el generador y las vistas del esquema si son lazy
+HEAVY = (
+    "xhtml2pdf", "reportlab", "pypdf", "html5lib", "lxml", "PIL", "svglib", "pyhanko",
+    "arabic_reshaper", "weasyprint", "drf_spectacular.generators", "drf_spectacular.views",
+)
+
+#corre en un interprete nuevo, como un worker de gunicorn al arrancar. RSS
+#es el actual (VmRSS, KB); ru_maxrss no sirve aca porque en linux el hijo
+#hereda el pico del proceso que lo lanzo
+_PROBE = """
+import json, resource, sys, time
+
+def rss():
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+rss_setup = rss()
+setup_modules = len(sys.modules)
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls = time.perf_counter()
+result = {
+    "setup_ms": (setup - started) * 1000, "urls_ms": (urls - setup) * 1000,
+    "rss_setup_kb": rss_setup, "rss_urls_kb": rss(), "modules_setup": setup_modules,
+    "modules": len(sys.modules), "heavy": [m for m in HEAVY if m in sys.modules],
+}
+if PRELOAD:
+    from enrollments.reports import warm_up
+    warm_up()
+    result["preload_ms"] = (time.perf_counter() - urls) * 1000
+    result["rss_preload_kb"] = rss()
+print(json.dumps(result))
+"""
+
+_FIELDS = ("total_ms", "setup_ms", "urls_ms", "rss_setup_kb", "rss_urls_kb", "modules_setup", "modules",
+           "preload_ms", "rss_preload_kb")
+
+
+class Command(BaseCommand):
+    help = ("Mide el arranque de un worker en procesos nuevos: tiempo de django.setup(), de cargar "
+            "las urls, RSS despues de cada paso y que modulos pesados (pdf, esquema de la api) ya "
+            "quedaron importados. --save agrega la corrida a bench/startup.json (versionado en el "
+            "repo) y siempre se compara con la ultima guardada. --check falla si algun modulo pesado "
+            "se carga al arrancar.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("--preload", action="store_true",
+                            help="Mide tambien reports.warm_up() (REPORT_PRELOAD).")
+        parser.add_argument("--save", action="store_true", help="Agrega el resultado a --history.")
+        parser.add_argument("--history", default=str(settings.BASE_DIR / "bench" / "startup.json"))
+        parser.add_argument("--check", action="store_true")
+
+    def _probe(self, preload: bool) -> dict:
+        code = f"HEAVY = {HEAVY!r}\nPRELOAD = {preload!r}\n{_PROBE}"
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", code], cwd=settings.BASE_DIR, env=os.environ.copy(),
+                              capture_output=True, text=True, check=False)
+        total = (time.perf_counter() - started) * 1000
+        if proc.returncode:
+            raise CommandError(f"Fallo el proceso de prueba:\n{proc.stderr[-2000:]}")
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["total_ms"] = total
+        return result
+
+    def handle(self, *args, **options):
+        runs = [self._probe(options["preload"]) for _ in range(max(1, options["runs"]))]
+        summary = {
+            field: round(statistics.median(run[field] for run in runs), 1)
+            for field in _FIELDS if field in runs[0]
+        }
+        heavy = sorted({module for run in runs for module in run["heavy"]})
+        for field, value in summary.items():
+            self.stdout.write(f"  {field:<16} {value:>10}")
+        self.stdout.write(f"  {'heavy':<16} {', '.join(heavy) or '-'}")
+
+        path = Path(options["history"])
+        history = json.loads(path.read_text(encoding="utf-8")) if path.exists() else []
+        if history:
+            last = history[-1]
+            self.stdout.write(f"\ncomparado con {last['meta']['commit']} ({last['meta']['date']})")
+            for field, value in summary.items():
+                old = last["results"].get(field)
+                if old:
+                    self.stdout.write(f"  {field:<16} {old:>10} -> {value:<10} {(value - old) / old * 100:>+6.0f}%")
+        if options["save"]:
+            history.append({
+                "meta": {"commit": _git_commit(), "date": datetime.now().isoformat(timespec="seconds"),
+                         "python": platform.python_version(), "django": django.get_version(),
+                         "cpus": os.cpu_count(), "runs": len(runs)},
+                "results": {**summary, "heavy": heavy},
+            })
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(history, indent=2) + "\n", encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"guardado en {path}"))
+        if options["check"] and heavy:
+            raise CommandError(f"Se cargan al arrancar: {', '.join(heavy)}")
@@ -0,0 +1,95 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Max, Sum
+
+from enrollments import terms
+from enrollments.models import Course, Enrollment, ReportJob, Student, WaitlistEntry
+
+
+def _checks(student_id: int, course_id: int, term_id: int) -> list:
+    #(descripcion, modelo, consulta, indices aceptados). Son las consultas
+    #calientes de views.py, reports.py, exports.py y pagination.py, con el
+    #filtro de periodo que les agrega terms.scope; el nombre del unique de
+    #(student, term, course) lo arma django, se busca por su parte fija.
+    #En postgres particionado el plan nombra el indice de la particion
+    #(enrollments_enrollment_t<id>_term_id_course_id_...)
+    return [
+        ("alumnos de un curso (by-course, reportes, export)", Enrollment,
+         Enrollment.objects.filter(course_id=course_id, term_id=term_id)  # pylint: disable=no-member
+         .order_by("student__last_name", "student__first_name")
+         .values("student_id", "enrolled_at", "student__last_name", "student__first_name"),
+         ["enrollment_term_course_idx", "term_id_course_id"]),
+        ("huella de un curso (cache de reportes)", Enrollment,
+         Enrollment.objects.filter(course_id=course_id, term_id=term_id).order_by()  # pylint: disable=no-member
+         .values("course_id").annotate(total=Count("id"), ids=Sum("id"), last=Max("id")),
+         ["enrollment_term_course_idx", "term_id_course_id"]),
+        ("cursos de un alumno (by-student, reportes)", Enrollment,
+         Enrollment.objects.filter(student_id=student_id, term_id=term_id)  # pylint: disable=no-member
+         .order_by("course__code").values("course_id", "enrolled_at", "course__code"),
+         ["student_id_term_id"]),
+        ("pagina de alumnos por apellido", Student,
+         Student.objects.order_by("last_name", "first_name", "id")[:50],  # pylint: disable=no-member
+         ["student_last_first_id_idx"]),
+        ("pagina de alumnos por nombre", Student,
+         Student.objects.order_by("first_name", "last_name", "id")[:50],  # pylint: disable=no-member
+         ["student_first_last_id_idx"]),
+        ("ranking de cursos (stats)", Course,
+         Course.objects.order_by("-seats_taken", "code")[:10],  # pylint: disable=no-member
+         ["course_ranking_idx"]),
+        ("cabeza de la lista de espera", WaitlistEntry,
+         WaitlistEntry.objects.filter(course_id=course_id).order_by("id")[:1],  # pylint: disable=no-member
+         ["waitlist_course_id_idx"]),
+        ("proximo reporte en cola", ReportJob,
+         ReportJob.objects.filter(status=ReportJob.QUEUED).order_by("created_at")[:1],  # pylint: disable=no-member
+         ["reportjob_status_created_idx"]),
+    ]
+
+
+class Command(BaseCommand):
+    help = ("Corre EXPLAIN sobre las consultas calientes y falla si alguna dejo de usar su indice "
+            "(sirve como prueba de regresion en CI). Con tablas chicas el planificador prefiere "
+            "recorrer la tabla, por eso las que tienen menos de --min-rows filas se saltean: "
+            "correrlo sobre un dataset de manage.py generate_dataset (o con --generate).")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--min-rows", type=int, default=5000)
+        parser.add_argument("--generate", type=int, metavar="STUDENTS",
+                            help="Genera antes un dataset de ese tamaño (reemplaza el anterior).")
+        parser.add_argument("--plans", action="store_true", help="Muestra el plan de cada consulta.")
+
+    def handle(self, *args, **options):
+        if options["generate"]:
+            call_command("generate_dataset", students=options["generate"],
+                         courses=max(20, options["generate"] // 50), clear=True, stdout=self.stdout)
+        course = Course.objects.order_by("-seats_taken", "id").first()  # pylint: disable=no-member
+        student = (
+            Enrollment.objects.filter(term_id=terms.current_term_id())  # pylint: disable=no-member
+            .order_by("id").values_list("student_id", flat=True).first()
+        )
+        if course is None or student is None:
+            raise CommandError("No hay matriculas: correr antes manage.py generate_dataset")
+        if connection.vendor in ("postgresql", "sqlite"):
+            #estadisticas al dia despues de una carga masiva (sqlite sin
+            #estadisticas elige el indice que cubre la consulta aunque filtre menos)
+            with connection.cursor() as cursor:
+                for model in (Student, Course, Enrollment, WaitlistEntry, ReportJob):
+                    cursor.execute(f"ANALYZE {model._meta.db_table}")  # pylint: disable=protected-access
+
+        failures = 0
+        for description, model, queryset, indexes in _checks(student, course.pk, terms.current_term_id()):
+            rows = model.objects.count()
+            if rows < options["min_rows"]:
+                self.stdout.write(f"  -  {description}: omitida ({rows} filas)")
+                continue
+            plan = queryset.explain()
+            used = any(name in plan for name in indexes)
+            if used:
+                self.stdout.write(self.style.SUCCESS(f"  ok {description}"))
+            else:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"  !! {description}: no usa {' / '.join(indexes)}"))
+            if options["plans"] or not used:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"{failures} consultas no usan el indice esperado ({connection.vendor})")
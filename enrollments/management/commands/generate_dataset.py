@@ -0,0 +1,243 @@
+import random
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from enrollments import report_cache, response_cache, stats, terms
+from enrollments.importer import import_students
+from enrollments.models import Course, Enrollment, Student, Term, cedula_validator
+from enrollments.search import course_document, student_document
+from enrollments.usernames import fold
+
+#todo lo generado usa este dominio y este prefijo de codigo, asi --clear
+#borra solo el dataset y nunca datos cargados a mano
+EMAIL_DOMAIN = "dataset.invalid"
+CODE_PREFIX = "DS"
+
+FIRST_NAMES = [
+    "José", "María", "Juan", "Ana", "Luis", "Lucía", "Carlos", "Sofía", "Jorge", "Camila",
+    "Andrés", "Valentina", "Martín", "Inés", "Óscar", "Belén", "Ángel", "Mónica", "Jesús", "Rocío",
+    "Raúl", "Verónica", "Sebastián", "Fátima", "Nicolás", "Araceli", "Matías", "Noemí", "Víctor", "Tamara",
+    "Hernán", "Liz", "Iván", "Dahiana", "Joaquín", "Nélida", "Ramón", "Zunilda", "Adrián", "Gisela",
+]
+LAST_NAMES = [
+    "González", "Benítez", "Martínez", "López", "Giménez", "Fernández", "Ramírez", "Núñez", "Acuña", "Báez",
+    "Ibáñez", "Ortiz", "Peña", "Cáceres", "Villalba", "Ayala", "Duarte", "Rolón", "Estigarribia", "Ríos",
+    "Sánchez", "Pérez", "Gómez", "Díaz", "Vázquez", "Céspedes", "Aquino", "Cabañas", "Britez", "Maidana",
+    "Ferreira", "Franco", "Añazco", "Escobar", "Insfrán", "Galeano", "Sosa", "Riquelme", "Zárate", "Ocampo",
+]
+SUBJECTS = [
+    "Matemática", "Álgebra Lineal", "Cálculo", "Física", "Química", "Programación", "Bases de Datos",
+    "Estadística", "Economía", "Contabilidad", "Derecho Civil", "Historia del Paraguay", "Guaraní",
+    "Inglés Técnico", "Redes", "Sistemas Operativos", "Ingeniería de Software", "Investigación Operativa",
+    "Administración", "Ética Profesional", "Biología", "Anatomía", "Psicología", "Sociología",
+    "Comunicación", "Diseño Gráfico", "Electrónica", "Termodinámica", "Geometría", "Filosofía",
+]
+LEVELS = ["I", "II", "III", "IV"]
+CAPACITIES = [25, 30, 30, 35, 40, 40, 50, 60, 80, 120]
+
+
+def _cedula(number: int) -> str:
+    #formato de cedula con puntos de miles: 4.512.307
+    return f"{number:,}".replace(",", ".")
+
+
+class Command(BaseCommand):
+    help = ("Genera un dataset de prueba a escala de institucion: alumnos con nombres con tildes y "
+            "cedulas validas, cursos con cupo y matriculas con distribucion sesgada (pocos cursos muy "
+            "pedidos, muchos con pocos alumnos), todo con bulk_create. Los primeros --users alumnos "
+            "tienen usuario (contraseña = cedula) para medir el login.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=10000)
+        parser.add_argument("--courses", type=int, default=200)
+        parser.add_argument("--per-student", type=float, default=4.0,
+                            help="Promedio de cursos por alumno.")
+        parser.add_argument("--skew", type=float, default=1.1,
+                            help="Exponente zipf de la popularidad de los cursos (0 = uniforme).")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--days", type=int, default=21,
+                            help="Dias del periodo de inscripcion (fechas de las matriculas).")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--past-terms", type=int, default=0,
+                            help="Periodos anteriores a generar, cada uno con tantas matriculas como el actual "
+                                 "(para medir que el periodo actual no se vuelve mas lento con la historia).")
+        parser.add_argument("--clear", action="store_true", help="Borra el dataset generado antes.")
+
+    def _clear(self):
+        courses = Course.objects.filter(code__startswith=CODE_PREFIX)  # pylint: disable=no-member
+        students = Student.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}")  # pylint: disable=no-member
+        with transaction.atomic():
+            #sin signals (uno por matricula): los cursos y alumnos se borran igual
+            enrollments = Enrollment.objects.filter(course__in=courses) | Enrollment.objects.filter(student__in=students)  # pylint: disable=no-member
+            removed = enrollments._raw_delete(enrollments.db)  # pylint: disable=protected-access
+            User.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").delete()
+            students.delete()
+            courses.delete()
+            Term.objects.filter(code__startswith=f"{CODE_PREFIX}-", is_current=False).delete()  # pylint: disable=no-member
+            stats.rebuild()
+        self.stdout.write(f"dataset anterior borrado ({removed} matriculas)")
+
+    def _students(self, rng, options) -> list[int]:
+        #cedulas correlativas con saltos al azar: unicas sin consultar la base
+        number = 3_000_000
+        rows = []
+        for i in range(options["students"]):
+            number += rng.randint(1, 40)
+            first = rng.choice(FIRST_NAMES)
+            if rng.random() < 0.25:
+                first = f"{first} {rng.choice(FIRST_NAMES)}"
+            last = f"{rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+            handle = f"{fold(first.split()[0])}.{fold(last.split()[0])}"
+            rows.append({"first_name": first, "last_name": last, "email": f"{handle}.{i}@{EMAIL_DOMAIN}",
+                         "id_number": _cedula(number)})
+        try:
+            cedula_validator(rows[-1]["id_number"])
+        except ValidationError as exc:
+            raise CommandError(f"Cedula generada invalida: {exc.messages}")
+
+        users = rows[:options["users"]]
+        if users:
+            report = import_students(users)
+            if report["errors"]:
+                raise CommandError(f"No se pudieron crear los usuarios: {report['errors'][:3]}")
+        students = []
+        for row in rows[len(users):]:
+            student = Student(**row)
+            #bulk_create no pasa por el pre_save que arma el documento
+            student.search_document = student_document(student)
+            students.append(student)
+        Student.objects.bulk_create(students, batch_size=options["batch_size"])  # pylint: disable=no-member
+        return list(
+            Student.objects.filter(email__endswith=f"@{EMAIL_DOMAIN}").order_by("id").values_list("id", flat=True)  # pylint: disable=no-member
+        )
+
+    def _pairs(self, rng, student_ids, options) -> list[tuple[int, int]]:
+        #(alumno, indice de curso). La popularidad sigue una zipf sobre un
+        #orden al azar de los cursos
+        total = options["courses"]
+        ranks = list(range(total))
+        rng.shuffle(ranks)
+        weights = [1 / (rank + 1) ** options["skew"] for rank in ranks]
+        cum, acc = [], 0.0
+        for weight in weights:
+            acc += weight
+            cum.append(acc)
+        pairs = []
+        for student_id in student_ids:
+            wanted = min(total, max(1, round(rng.gauss(options["per_student"], 1.5))))
+            chosen = set()
+            for _ in range(wanted * 10):
+                chosen.add(rng.choices(range(total), cum_weights=cum)[0])
+                if len(chosen) == wanted:
+                    break
+            pairs.extend((student_id, index) for index in chosen)
+        return pairs
+
+    def _courses(self, rng, counts: Counter, options) -> list[int]:
+        courses = []
+        for index in range(options["courses"]):
+            taken = counts[index]
+            #el cupo acompaña la demanda; uno de cada cinco queda lleno
+            if taken and rng.random() < 0.2:
+                capacity = taken
+            else:
+                capacity = max(rng.choice(CAPACITIES), int(taken * rng.uniform(1.05, 1.4)))
+            course = Course(code=f"{CODE_PREFIX}{index:04d}",
+                            title=f"{rng.choice(SUBJECTS)} {rng.choice(LEVELS)}",
+                            capacity=capacity, seats_taken=taken)
+            course.search_document = course_document(course)
+            courses.append(course)
+        Course.objects.bulk_create(courses, batch_size=options["batch_size"])  # pylint: disable=no-member
+        return list(
+            Course.objects.filter(code__startswith=CODE_PREFIX).order_by("code").values_list("id", flat=True)  # pylint: disable=no-member
+        )
+
+    def _spread_dates(self, rng, options):
+        #enrolled_at es auto_now_add: despues del insert se reparten las
+        #fechas en el periodo, con mas inscripciones los primeros dias
+        now = timezone.now()
+        by_day = {}
+        ids = (
+            Enrollment.objects  # pylint: disable=no-member
+            .filter(course__code__startswith=CODE_PREFIX, term_id=terms.current_term_id())
+            .values_list("id", flat=True)
+        )
+        for enrollment_id in ids.iterator(chunk_size=options["batch_size"]):
+            day = min(options["days"] - 1, int(rng.expovariate(4 / max(1, options["days"]))))
+            by_day.setdefault(day, []).append(enrollment_id)
+        start = now - timedelta(days=options["days"])
+        for day, day_ids in by_day.items():
+            moment = start + timedelta(days=day, hours=rng.randint(7, 20), minutes=rng.randint(0, 59))
+            for i in range(0, len(day_ids), options["batch_size"]):
+                Enrollment.objects.filter(id__in=day_ids[i:i + options["batch_size"]]).update(enrolled_at=moment)  # pylint: disable=no-member
+
+    def _insert(self, enrollments, batch: int):
+        buffer = []
+        for enrollment in enrollments:
+            buffer.append(enrollment)
+            if len(buffer) == batch:
+                Enrollment.objects.bulk_create(buffer)  # pylint: disable=no-member
+                buffer = []
+        if buffer:
+            Enrollment.objects.bulk_create(buffer)  # pylint: disable=no-member
+
+    def _past_terms(self, rng, student_ids, course_ids, options) -> int:
+        #periodos DS-P01, DS-P02... de seis meses para atras, con otra eleccion
+        #de cursos por alumno. Crear el periodo crea su particion (signals.py)
+        total = 0
+        today = timezone.localdate()
+        for number in range(1, options["past_terms"] + 1):
+            starts = today - timedelta(days=182 * number)
+            term = Term.objects.create(code=f"{CODE_PREFIX}-P{number:02d}", name=f"Dataset {starts:%Y-%m}",  # pylint: disable=no-member
+                                       starts_on=starts, ends_on=starts + timedelta(days=150))
+            pairs = self._pairs(rng, student_ids, options)
+            self._insert((Enrollment(student_id=student_id, course_id=course_ids[index], term=term)
+                          for student_id, index in pairs), options["batch_size"])
+            Enrollment.objects.filter(term=term).update(  # pylint: disable=no-member
+                enrolled_at=timezone.make_aware(datetime.combine(starts, datetime.min.time())))
+            total += len(pairs)
+        return total
+
+    def handle(self, *args, **options):
+        if options["students"] < 1 or options["courses"] < 1:
+            raise CommandError("--students y --courses tienen que ser mayores a 0")
+        if options["clear"]:
+            self._clear()
+        elif Course.objects.filter(code__startswith=CODE_PREFIX).exists():  # pylint: disable=no-member
+            raise CommandError("Ya hay un dataset generado; usar --clear para reemplazarlo")
+        rng = random.Random(options["seed"])
+        started = time.perf_counter()
+
+        student_ids = self._students(rng, options)
+        pairs = self._pairs(rng, student_ids, options)
+        counts = Counter(index for _, index in pairs)
+        course_ids = self._courses(rng, counts, options)
+        self._insert((Enrollment(student_id=student_id, course_id=course_ids[index]) for student_id, index in pairs),
+                     options["batch_size"])
+        self._spread_dates(rng, options)
+        past = self._past_terms(rng, student_ids, course_ids, options)
+        #la serie diaria (stats.py) se arma con las fechas ya repartidas
+        stats.rebuild()
+
+        #bulk_create no manda signals
+        response_cache.bump("student", "course", "enrollment")
+        cache = report_cache.get_report_cache()
+        if cache is not None:
+            cache.clear()
+        elapsed = time.perf_counter() - started
+        full = Course.objects.filter(code__startswith=CODE_PREFIX, seats_taken=F("capacity")).count()  # pylint: disable=no-member
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(student_ids)} alumnos ({min(options['users'], len(student_ids))} con usuario), "
+            f"{len(course_ids)} cursos ({full} llenos), {len(pairs)} matriculas "
+            f"(+{past} en {options['past_terms']} periodos anteriores) en {elapsed:.1f}s; "
+            f"el curso mas pedido tiene {max(counts.values())} alumnos"
+        ))
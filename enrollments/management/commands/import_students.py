@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from enrollments.importer import import_students, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Importa alumnos desde un csv (first_name,last_name,email,id_number) o json "
+            "(lista u objeto por linea), creando su usuario y grupo de a lotes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "json"], default=None,
+                            help="Default: segun la extension del archivo.")
+        parser.add_argument("--batch-size", type=int, default=None)
+        parser.add_argument("--workers", type=int, default=None,
+                            help="Procesos para hashear contraseñas (1 = sin pool).")
+        parser.add_argument("--show-errors", type=int, default=20,
+                            help="Cuantos errores por fila mostrar.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("json" if path.lower().endswith((".json", ".ndjson")) else "csv")
+        try:
+            with open(path, "rb") as fh:
+                report = import_students(read_rows(fh, fmt), options["batch_size"], options["workers"])
+        except OSError as exc:
+            raise CommandError(str(exc))
+        for error in report["errors"][:options["show_errors"]]:
+            self.stdout.write(f"fila {error['row']}: {error['errors']}")
+        if len(report["errors"]) > options["show_errors"]:
+            self.stdout.write(f"... y {len(report['errors']) - options['show_errors']} errores mas")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} filas, {report['created']} alumnos creados, {len(report['errors'])} con error "
+            f"en {report['elapsed_ms'] / 1000:.2f}s ({report['rows_per_sec']} filas/s)"
+        ))
+        if "invalid" in report:
+            raise CommandError(f"{report['invalid']['detail']} (alumno {report['invalid']['row']}); "
+                               f"{report['created']} alumnos ya quedaron guardados")
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from enrollments import response_cache, stats
+
+
+class Command(BaseCommand):
+    help = ("Recalcula los inscriptos por curso (seats_taken) y la serie diaria de matriculas desde "
+            "la tabla de matriculas. Hace falta despues de cargas que no pasan por los signals "
+            "(bulk_create, sql a mano, restores).")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = stats.rebuild()
+        response_cache.bump("course", "enrollment")
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['courses_fixed']} cursos y {result['days_fixed']} dias corregidos "
+            f"en {time.perf_counter() - started:.2f}s"
+        ))
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from enrollments import batch_reports
+
+
+class Command(BaseCommand):
+    help = ("Genera en un zip el reporte de matriculas de cada curso o alumno (lo mismo que "
+            "POST /api/enrollments/report-batch/), renderizando en paralelo con --workers procesos. "
+            "Sin ids hace todos los que tienen matriculas en el periodo.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=sorted(batch_reports.KINDS))
+        parser.add_argument("ids", nargs="*", type=int)
+        parser.add_argument("--term", help="Codigo de periodo o all (default: el actual).")
+        parser.add_argument("--engine")
+        parser.add_argument("--workers", type=int, help="Default: REPORT_BATCH_WORKERS.")
+        parser.add_argument("--output", help="Default: el nombre del lote en el directorio actual.")
+
+    def handle(self, *args, **options):
+        try:
+            batch = batch_reports.Batch(options["kind"], options["ids"] or batch_reports.ALL,
+                                        term=options["term"], engine=options["engine"])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        total = batch.state["total"]
+        if not total:
+            raise CommandError("No hay reportes para generar")
+        path = Path(options["output"] or batch.filename)
+        every = max(1, total // 20)
+        started = time.perf_counter()
+
+        def on_progress(state, pk, result):
+            if result not in ("ok", "cache"):
+                self.stderr.write(f"  {pk}: {result}")
+            if state["done"] % every == 0 or state["done"] == total:
+                elapsed = time.perf_counter() - started
+                eta = elapsed / state["done"] * (total - state["done"])
+                self.stdout.write(f"  {state['done']}/{total} ({state['cached']} del cache, "
+                                  f"{state['failed']} con error) {elapsed:.1f}s, faltan ~{eta:.0f}s")
+
+        size = 0
+        with path.open("wb") as dest:
+            for chunk in batch.iter_zip(on_progress, workers=options["workers"]):
+                dest.write(chunk)
+                size += len(chunk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} reportes en {elapsed:.1f}s ({total / elapsed:.1f}/s), {size / 1024 / 1024:.1f} MB -> {path}"
+        ))
@@ -0,0 +1,57 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from enrollments.db import forget_pools
+from enrollments.jobs import work
+from enrollments.reports import warm_up
+
+
+def _worker(poll_interval, once, stop):
+    #cada proceso hijo abre sus propias conexiones, no comparte las del padre
+    forget_pools()
+    connections.close_all()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        work(poll_interval=poll_interval, once=once, stop=stop)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Levanta un pool de procesos que generan los reportes pdf encolados."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Cantidad de procesos.")
+        parser.add_argument("--poll", type=float, default=1.0,
+                            help="Segundos de espera cuando la cola esta vacia.")
+        parser.add_argument("--once", action="store_true",
+                            help="Procesa lo que haya en la cola y termina.")
+        parser.add_argument("--no-preload", action="store_true",
+                            help="No carga los motores de pdf antes de lanzar los procesos.")
+
+    def handle(self, *args, **options):
+        workers = max(1, options["workers"])
+        if not options["no_preload"]:
+            #una sola vez aca: los hijos heredan xhtml2pdf ya importado en el fork
+            warm_up()
+        #las conexiones abiertas no se pueden heredar en un fork
+        connections.close_all()
+        stop = multiprocessing.Event()
+        procs = [
+            multiprocessing.Process(target=_worker, args=(options["poll"], options["once"], stop))
+            for _ in range(workers)
+        ]
+        for proc in procs:
+            proc.start()
+        self.stdout.write(f"{workers} workers de reportes iniciados")
+        try:
+            for proc in procs:
+                proc.join()
+        except KeyboardInterrupt:
+            self.stdout.write("Deteniendo workers...")
+            stop.set()
+            for proc in procs:
+                proc.join()
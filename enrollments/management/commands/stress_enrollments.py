@@ -0,0 +1,77 @@
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from enrollments.models import Student, Course, Enrollment
+from enrollments.services import AlreadyEnrolledError, CourseFullError, enroll
+
+
+def _tag_num(tag: str) -> str:
+    #la cedula solo admite digitos, puntos y guiones
+    return str(int(tag, 16) % 1000).zfill(3)
+
+
+class Command(BaseCommand):
+    help = ("Prueba de carga de asientos: muchos threads matriculan alumnos en un mismo "
+            "curso a la vez y se verifica que no haya sobreventa. Necesita postgres "
+            "(sqlite serializa todo y da 'database is locked').")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=500)
+        parser.add_argument("--capacity", type=int, default=100)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--keep", action="store_true", help="No borra los datos de prueba.")
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:6]
+        course = Course.objects.create(code=f"ST{tag}", title="Curso de prueba de carga",  # pylint: disable=no-member
+                                       capacity=options["capacity"])
+        students = Student.objects.bulk_create([  # pylint: disable=no-member
+            Student(first_name="Carga", last_name=f"Prueba {i}",
+                    email=f"stress-{tag}-{i}@example.invalid", id_number=f"9{_tag_num(tag)}{i:06d}")
+            for i in range(options["students"])
+        ])
+        student_ids = [s.pk for s in students]
+        counts = {"ok": 0, "full": 0, "dup": 0}
+        lock = threading.Lock()
+
+        def attempt(student_id):
+            try:
+                enroll(student_id, course.pk)
+                outcome = "ok"
+            except CourseFullError:
+                outcome = "full"
+            except AlreadyEnrolledError:
+                outcome = "dup"
+            finally:
+                #cada thread tiene su propia conexion, se cierra al terminar
+                connection.close()
+            with lock:
+                counts[outcome] += 1
+
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+                list(pool.map(attempt, student_ids))
+            elapsed = time.perf_counter() - started
+
+            course.refresh_from_db()
+            enrolled = Enrollment.objects.filter(course=course).count()  # pylint: disable=no-member
+            self.stdout.write(
+                f"{len(student_ids)} intentos con {options['threads']} threads en {elapsed:.2f}s "
+                f"({len(student_ids) / elapsed:.0f} intentos/s, {counts['ok'] / elapsed:.0f} matriculas/s)"
+            )
+            self.stdout.write(f"ok={counts['ok']} completo={counts['full']} duplicado={counts['dup']} "
+                              f"matriculas={enrolled} seats_taken={course.seats_taken} "
+                              f"capacidad={course.capacity}")
+            if enrolled > course.capacity or enrolled != course.seats_taken or enrolled != counts["ok"]:
+                raise CommandError("SOBREVENTA o contador inconsistente")
+            self.stdout.write(self.style.SUCCESS("Sin sobreventa"))
+        finally:
+            if not options["keep"]:
+                Student.objects.filter(pk__in=student_ids).delete()  # pylint: disable=no-member
+                course.delete()
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-18 12:48
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_seats(apps, schema_editor):
+    #llena seats_taken con las matriculas que ya existian
+    Course = apps.get_model("enrollments", "Course")
+    Enrollment = apps.get_model("enrollments", "Enrollment")
+    totals = (
+        Enrollment.objects.filter(course=OuterRef("pk"))
+        .order_by().values("course").annotate(total=Count("id")).values("total")
+    )
+    Course.objects.update(seats_taken=Coalesce(Subquery(totals), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0002_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='seats_taken',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:03
+
+from django.contrib.postgres.indexes import GinIndex
+from django.db import migrations, models
+
+from enrollments.search import course_document, search_vector, student_document
+
+
+def _indexes():
+    #(modelo, indice). Se crean a mano y solo en postgres, asi las
+    #migraciones siguen andando en sqlite para desarrollo local
+    return [
+        ("student", GinIndex(search_vector(), name="student_search_fts_idx")),
+        ("student", GinIndex(fields=["search_document"], opclasses=["gin_trgm_ops"], name="student_search_trgm_idx")),
+        #LIKE 'prefijo%' sobre la cedula sin depender del collation de la base
+        ("student", models.Index(fields=["id_number"], opclasses=["varchar_pattern_ops"], name="student_id_number_like_idx")),
+        ("course", GinIndex(search_vector(), name="course_search_fts_idx")),
+        ("course", GinIndex(fields=["search_document"], opclasses=["gin_trgm_ops"], name="course_search_trgm_idx")),
+    ]
+
+def fill_documents(apps, schema_editor):
+    for name, document in (("Student", student_document), ("Course", course_document)):
+        model = apps.get_model("enrollments", name)
+        batch = []
+        for obj in model.objects.order_by("pk").iterator(chunk_size=2000):
+            obj.search_document = document(obj)
+            batch.append(obj)
+            if len(batch) == 2000:
+                model.objects.bulk_update(batch, ["search_document"])
+                batch = []
+        model.objects.bulk_update(batch, ["search_document"])
+
+def add_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for model_name, index in _indexes():
+        schema_editor.add_index(apps.get_model("enrollments", model_name), index)
+
+def remove_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for model_name, index in _indexes():
+        schema_editor.remove_index(apps.get_model("enrollments", model_name), index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0005_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_documents, migrations.RunPython.noop),
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:42
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_days(apps, schema_editor):
+    #arma la serie con las matriculas que ya existian (las bajas anteriores no quedaron registradas)
+    Enrollment = apps.get_model("enrollments", "Enrollment")
+    DailyEnrollmentStat = apps.get_model("enrollments", "DailyEnrollmentStat")
+    rows = (
+        Enrollment.objects.annotate(day=TruncDate("enrolled_at"))
+        .order_by().values("day").annotate(total=Count("id"))
+    )
+    DailyEnrollmentStat.objects.bulk_create(
+        [DailyEnrollmentStat(day=row["day"], enrollments=row["total"]) for row in rows]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0006_search_document'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyEnrollmentStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('enrollments', models.IntegerField(default=0)),
+                ('drops', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['-seats_taken', 'code'], name='course_ranking_idx'),
+        ),
+        migrations.RunPython(count_days, migrations.RunPython.noop),
+    ]
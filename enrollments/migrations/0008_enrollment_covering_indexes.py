@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 13:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0007_daily_enrollment_stats'),
+    ]
+
+    operations = [
+        #primero el indice nuevo, asi las consultas por curso nunca quedan sin indice
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course', 'student', 'enrolled_at', 'id'], name='enrollment_course_cover_idx'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='course',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='enrollments.course'),
+        ),
+        migrations.AlterField(
+            model_name='enrollment',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='enrollments', to='enrollments.student'),
+        ),
+    ]
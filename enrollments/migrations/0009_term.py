@@ -0,0 +1,50 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def create_current_term(apps, schema_editor):
+    #las matriculas que ya existen quedan en un periodo inicial, que pasa a ser el actual
+    Term = apps.get_model("enrollments", "Term")
+    Enrollment = apps.get_model("enrollments", "Enrollment")
+    today = timezone.localdate()
+    code = f"{today.year}-{1 if today.month <= 6 else 2}"
+    first = Enrollment.objects.order_by("enrolled_at").values_list("enrolled_at", flat=True).first()
+    term = Term.objects.create(code=code, name=f"Periodo {code}", is_current=True,
+                               starts_on=timezone.localdate(first) if first else today)
+    Enrollment.objects.update(term=term)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0008_enrollment_covering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Term',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(blank=True, max_length=120)),
+                ('starts_on', models.DateField(blank=True, null=True)),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('is_current', models.BooleanField(default=False, editable=False)),
+                ('archived_at', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('is_current',), name='term_single_current')],
+            },
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='term',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='enrollments', to='enrollments.term'),
+        ),
+        #en una migracion aparte del ALTER de la 0010: postgres no deja
+        #alterar una tabla con chequeos de FK pendientes en la misma transaccion
+        migrations.RunPython(create_current_term, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.7 on 2026-10-18 14:05
+
+import django.db.models.deletion
+import enrollments.models
+from django.db import migrations, models
+
+from enrollments import partitions
+
+
+def partition(apps, schema_editor):
+    #solo postgres: la tabla pasa a estar particionada por periodo
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Term = apps.get_model("enrollments", "Term")
+    partitions.partition_table(schema_editor, apps.get_model("enrollments", "Enrollment"),
+                               Term.objects.values_list("pk", flat=True))
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    partitions.unpartition_table(schema_editor, apps.get_model("enrollments", "Enrollment"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0009_term'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='enrollment',
+            name='term',
+            field=models.ForeignKey(db_index=False, default=enrollments.models.current_term_id, on_delete=django.db.models.deletion.PROTECT, related_name='enrollments', to='enrollments.term'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='enrollment',
+            unique_together={('student', 'term', 'course')},
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['term', 'course', 'student', 'enrolled_at', 'id'], name='enrollment_term_course_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='enrollment',
+            name='enrollment_course_cover_idx',
+        ),
+        #al final, con el modelo ya en su forma nueva: la tabla se arma de
+        #nuevo particionada con esos unique, indices y FK
+        migrations.RunPython(partition, unpartition),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_current_term(apps, schema_editor):
+    #las entradas que ya existen esperan asientos del periodo actual
+    Term = apps.get_model("enrollments", "Term")
+    WaitlistEntry = apps.get_model("enrollments", "WaitlistEntry")
+    current = Term.objects.filter(is_current=True).first()
+    if current is not None:
+        WaitlistEntry.objects.update(term=current)
+    else:
+        WaitlistEntry.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0010_enrollment_term_partitions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='term',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='enrollments.term'),
+        ),
+        #el NOT NULL va en la 0012: postgres no deja alterar la tabla con
+        #chequeos de FK pendientes en la misma transaccion (igual que 0009/0010)
+        migrations.RunPython(assign_current_term, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+import django.db.models.deletion
+import enrollments.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('enrollments', '0011_waitlistentry_term'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='waitlistentry',
+            name='term',
+            field=models.ForeignKey(default=enrollments.models.current_term_id, on_delete=django.db.models.deletion.CASCADE, related_name='waitlist_entries', to='enrollments.term'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 #MODULO DE MATRICULACION
 #ARCHIVO DE MODELOS, para las migraciones a la bd
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator, MinLengthValidator
@@ -26,6 +27,17 @@ class Student(models.Model):
         validators=[MinLengthValidator(4), cedula_validator],
         help_text="Número de cedula sera la contraseña inicial del usuario"
     )
+    #nombre, apellido, email y cedula en minusculas y sin tildes, lo arma
+    #search.py al guardar. Tiene indices de texto y trigramas en postgres
+    search_document = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        #indices para la paginacion por cursor (pagination.py): cada orden
+        #de la lista con el id de desempate
+        indexes = [
+            models.Index(fields=["last_name", "first_name", "id"], name="student_last_first_id_idx"),
+            models.Index(fields=["first_name", "last_name", "id"], name="student_first_last_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.last_name}, {self.first_name}"
@@ -34,14 +46,134 @@ class Course(models.Model):
     code = models.CharField(max_length=10, unique=True)
     title = models.CharField(max_length=120)
     capacity = models.PositiveIntegerField(default=30)
+    #asientos ocupados en el periodo actual, se mantiene con UPDATE
+    #condicionales en services.py (alta) y en el post_delete de Enrollment
+    #(baja), nunca a mano. Al cambiar de periodo se recalcula (terms.activate)
+    seats_taken = models.PositiveIntegerField(default=0, editable=False)
+    #codigo y titulo normalizados para el buscador (ver search.py)
+    search_document = models.TextField(blank=True, default="", editable=False)
+
+    class Meta:
+        #el orden por code ya lo cubre el unique de code
+        indexes = [
+            models.Index(fields=["title", "code", "id"], name="course_title_code_id_idx"),
+            #ranking de cursos por inscriptos (stats.py y el reporte general)
+            models.Index(fields=["-seats_taken", "code"], name="course_ranking_idx"),
+        ]
 
     def __str__(self):
         return f"{self.code} - {self.title}"
     
+class Term(models.Model):
+    #periodo lectivo. Las matriculas nuevas van al periodo actual (hay uno
+    #solo) y las lecturas de la api se limitan a el salvo ?term= (ver
+    #terms.py). En postgres cada periodo es una particion de la tabla de
+    #matriculas; manage.py archive_term separa las de periodos viejos
+    code = models.CharField(max_length=20, unique=True)
+    name = models.CharField(max_length=120, blank=True)
+    starts_on = models.DateField(null=True, blank=True)
+    ends_on = models.DateField(null=True, blank=True)
+    is_current = models.BooleanField(default=False, editable=False)
+    archived_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["is_current"], condition=models.Q(is_current=True),
+                                    name="term_single_current"),
+        ]
+
+    def __str__(self):
+        return self.code
+
+def current_term_id():
+    #default de Enrollment.term; el periodo actual se cachea en terms.py
+    from .terms import current_term_id as cached  # pylint: disable=import-outside-toplevel
+    return cached()
+
 class Enrollment(models.Model):
-    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="enrollments")
-    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments")
+    #sin indices propios en las FK: las busquedas por alumno usan el unique
+    #(student, course, term) y las por periodo y curso el indice de abajo
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="enrollments", db_index=False)
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="enrollments", db_index=False)
+    term = models.ForeignKey(Term, on_delete=models.PROTECT, related_name="enrollments", db_index=False,
+                             default=current_term_id)
     enrolled_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ("student", "course")
\ No newline at end of file
+        #en este orden el indice del unique tambien sirve para "cursos de un
+        #alumno en el periodo" (student, term)
+        unique_together = ("student", "term", "course")
+        indexes = [
+            #todas las columnas: lo que se consulta por curso (listas, reportes,
+            #exportaciones, la huella del cache de reportes) sale solo del
+            #indice. manage.py check_query_plans verifica que se use
+            models.Index(fields=["term", "course", "student", "enrolled_at", "id"], name="enrollment_term_course_idx"),
+        ]
+
+class DailyEnrollmentStat(models.Model):
+    #serie diaria para el tablero (stats.py): matriculas vigentes por dia de
+    #inscripcion y bajas registradas ese dia. La mantienen los signals de
+    #Enrollment; manage.py rebuild_stats la recalcula desde las matriculas
+    day = models.DateField(unique=True)
+    enrollments = models.IntegerField(default=0)
+    drops = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.enrollments} matriculas, {self.drops} bajas"
+
+class WaitlistEntry(models.Model):
+    #lista de espera FIFO por curso: el orden es el id (autoincremental), la
+    #posicion se calcula contando los que estan antes en el mismo curso
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, related_name="waitlist_entries")
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name="waitlist_entries")
+    #periodo de los asientos que se esperan (el actual al anotarse). Al
+    #activar otro periodo se borran las entradas del que termina (terms.activate)
+    term = models.ForeignKey(Term, on_delete=models.CASCADE, related_name="waitlist_entries",
+                             default=current_term_id)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("student", "course")
+        indexes = [
+            #la cabeza de la cola de un curso sale de este indice
+            models.Index(fields=["course", "id"], name="waitlist_course_id_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.student} en espera de {self.course}"
+
+
+class ReportJob(models.Model):
+    #cola de reportes pdf: el POST encola, los workers (manage.py report_worker)
+    #lo renderizan y el cliente consulta el estado hasta poder descargarlo
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (QUEUED, "En cola"),
+        (RUNNING, "Generando"),
+        (DONE, "Terminado"),
+        (FAILED, "Fallido"),
+    ]
+
+    #uuid para que no se puedan adivinar los reportes de otros
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    report_type = models.CharField(max_length=40)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    file_path = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True)
+    render_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="reportjob_status_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type} ({self.status})"
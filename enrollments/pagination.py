@@ -0,0 +1,219 @@
+#PAGINACION POR CURSOR (KEYSET)
+#en vez de OFFSET + COUNT(*) la siguiente pagina se pide con los valores de
+#orden de la ultima fila: WHERE (last_name, first_name, id) > (...) LIMIT n.
+#Cuesta lo mismo la pagina 1 que la 1000 y no se saltean ni repiten filas si
+#se insertan alumnos mientras se recorre. Con ?page=N se usa la paginacion
+#por numero de siempre (la usa el admin del front, que necesita el total).
+#Los campos de orden no pueden aceptar NULL: (a > NULL) no es verdadero en
+#ninguna base y cada una ordena los NULL en otro lugar, asi que el cursor
+#perdia filas (o postgres fallaba con el valor None). Una vista que ordena
+#por un campo nullable es un error de configuracion, no se pagina a medias
+import base64
+import datetime
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class _CursorEncoder(DjangoJSONEncoder):
+    #DjangoJSONEncoder corta las horas a milisegundos: con varias filas en el
+    #mismo milisegundo (-created_at de los reportes) el cursor se salteaba filas
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 200
+    invalid_cursor_message = "Cursor invalido."
+
+    def __init__(self):
+        self._page_number = None
+
+    #ORDEN
+    #el orden sale del queryset (OrderingFilter o el order_by de la vista),
+    #se completa con el "ordering" por defecto de la vista y al final el id,
+    #asi dos filas nunca empatan y el cursor es estable
+    def get_ordering(self, queryset, view) -> list[str]:
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        if not ordering:
+            ordering = list(getattr(view, "ordering", None) or queryset.model._meta.ordering or [])
+        names = {o.lstrip("-") for o in ordering}
+        for extra in getattr(view, "ordering", None) or []:
+            if extra.lstrip("-") not in names:
+                ordering.append(extra)
+                names.add(extra.lstrip("-"))
+        pk = queryset.model._meta.pk.name  # pylint: disable=protected-access
+        if pk not in names and "pk" not in names:
+            ordering.append(pk)
+        ordering = [o.replace("pk", pk) if o.lstrip("-") == "pk" else o for o in ordering]
+        for name in ordering:
+            if self._nullable(queryset.model, name.lstrip("-")):
+                raise ImproperlyConfigured(
+                    f"{type(view).__name__}: la paginacion por cursor no admite ordenar por "
+                    f"{name.lstrip('-')}, que acepta NULL"
+                )
+        return ordering
+
+    @staticmethod
+    def _nullable(model, name) -> bool:
+        try:
+            return model._meta.get_field(name).null  # pylint: disable=protected-access
+        except FieldDoesNotExist:
+            #anotaciones (rank del buscador) y campos de relaciones
+            return False
+
+    def get_page_size(self, request) -> int:
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    #CURSOR
+    #base64 de un json con los valores de orden de la fila de borde y si es
+    #hacia atras ("r"); los valores se vuelven a tipar con el campo del modelo
+    def encode_cursor(self, values: list, reverse: bool) -> str:
+        raw = json.dumps({"v": values, "r": reverse}, cls=_CursorEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, request, model, ordering):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(raw.encode("ascii")))
+            values = data["v"]
+            if len(values) != len(ordering):
+                raise ValueError
+            values = [self._to_python(model, name.lstrip("-"), value) for name, value in zip(ordering, values)]
+            return values, bool(data.get("r"))
+        except Exception:  # pylint: disable=broad-except
+            #base64/json roto, cantidad de valores distinta o un valor que
+            #to_python no acepta (ValidationError)
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _to_python(model, name, value):
+        try:
+            field = model._meta.get_field(name)  # pylint: disable=protected-access
+        except FieldDoesNotExist:
+            #anotaciones, como el rank del buscador (search.py)
+            return value
+        return field.to_python(value)
+
+    @staticmethod
+    def _value(row, name):
+        #filas de modelo o dicts (querysets con values())
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def _row_values(self, row, ordering) -> list:
+        return [self._value(row, name.lstrip("-")) for name in ordering]
+
+    @staticmethod
+    def _after(ordering, values) -> Q:
+        #(a, b, id) > (x, y, z) respetando la direccion de cada campo:
+        #a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        q = Q()
+        equal = Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip("-")
+            op = "lt" if name.startswith("-") else "gt"
+            q |= equal & Q(**{f"{field}__{op}": value})
+            equal &= Q(**{field: value})
+        #ademas el primer campo como rango (>=), que el planner puede usar
+        #directo contra el indice compuesto
+        first = ordering[0].lstrip("-")
+        op = "lte" if ordering[0].startswith("-") else "gte"
+        return Q(**{f"{first}__{op}": values[0]}) & q
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if "page" in request.query_params:
+            self._page_number = PageNumberPagination()
+            return self._page_number.paginate_queryset(queryset, request, view)
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    #paginate_queryset en dos pasos para las vistas async (async_views.py):
+    #page_queryset arma la consulta sin tocar la base y set_page recibe las
+    #filas ya leidas
+    def page_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        values, reverse = self.decode_cursor(request, queryset.model, self.ordering)
+        #hacia atras se recorre con el orden invertido y despues se da vuelta
+        ordering = [o[1:] if o.startswith("-") else f"-{o}" for o in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(ordering, values))
+        self._values, self._reverse = values, reverse
+        #una fila de mas para saber si hay otra pagina sin hacer COUNT(*)
+        return queryset[:self.page_size_value + 1]
+
+    def set_page(self, rows: list) -> list:
+        values, reverse = self._values, self._reverse
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = values is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, values is not None
+        self.first_values = self._row_values(rows[0], self.ordering) if rows else None
+        self.last_values = self._row_values(rows[-1], self.ordering) if rows else None
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or self.last_values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_values, False))
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_values is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.first_values, True))
+
+    def get_paginated_response(self, data):
+        if self._page_number is not None:
+            return self._page_number.get_paginated_response(data)
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {"name": self.cursor_query_param, "required": False, "in": "query",
+             "description": "Cursor de la pagina (sale de next/previous).", "schema": {"type": "string"}},
+            {"name": self.page_size_query_param, "required": False, "in": "query",
+             "description": f"Filas por pagina (maximo {self.max_page_size}).", "schema": {"type": "integer"}},
+            {"name": "page", "required": False, "in": "query",
+             "description": "Paginacion por numero (con total), para el admin.", "schema": {"type": "integer"}},
+        ]
@@ -0,0 +1,144 @@
+#PARTICIONES DE MATRICULAS (solo postgres)
+#la tabla de matriculas esta particionada por LIST (term_id), una particion
+#por periodo: enrollments_enrollment_t<id>. Se crea al dar de alta el periodo
+#(signals.py); no hay particion DEFAULT, asi una matricula de un periodo sin
+#particion falla en vez de quedar mezclada, y el DETACH puede ser CONCURRENTLY.
+#manage.py archive_term separa la particion de un periodo viejo y la mueve al
+#schema ENROLLMENT_ARCHIVE_SCHEMA: deja de pesar en la tabla (indices,
+#vacuum, planes) pero los datos siguen ahi y se vuelve a conectar con
+#--restore. En ese schema las particiones archivadas cuelgan de otra tabla
+#enrollments_enrollment (sin claves ni FK); el alias "archive" de settings
+#tiene ese schema primero en el search_path, asi las mismas consultas del
+#ORM leen un periodo archivado (terms.read_alias). La clave primaria de la tabla particionada es (id, term_id);
+#django sigue buscando por id. En sqlite la tabla es comun y esto no hace nada
+from django.conf import settings
+from django.db import connections
+
+TABLE = "enrollments_enrollment"
+#la columna id deja de ser identity (postgres < 17 no las acepta en tablas
+#particionadas): usa esta secuencia, de la que es duena
+SEQUENCE = f"{TABLE}_part_id_seq"
+
+
+def partition_name(term_id: int) -> str:
+    return f"{TABLE}_t{int(term_id)}"
+
+def is_partitioned(using: str = "default") -> bool:
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+            "WHERE c.relname = %s AND pg_table_is_visible(c.oid)", [TABLE],
+        )
+        return cursor.fetchone() is not None
+
+def _execute(using: str, *statements: str):
+    with connections[using].cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+def create_partition(term_id: int, using: str = "default") -> bool:
+    if not is_partitioned(using):
+        return False
+    qn = connections[using].ops.quote_name
+    _execute(using, f"CREATE TABLE IF NOT EXISTS {qn(partition_name(term_id))} "
+                    f"PARTITION OF {qn(TABLE)} FOR VALUES IN ({int(term_id)})")
+    return True
+
+def drop_partition(term_id: int, using: str = "default"):
+    #solo para periodos borrados: el PROTECT de Enrollment.term asegura que esta vacia
+    if is_partitioned(using):
+        _execute(using, f"DROP TABLE IF EXISTS {connections[using].ops.quote_name(partition_name(term_id))}")
+
+def partitions(using: str = "default") -> list[dict]:
+    #particiones conectadas y archivadas, con filas estimadas y tamaño
+    if connections[using].vendor != "postgresql":
+        return []
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT n.nspname, c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid), "
+            "EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid) "
+            "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE c.relname LIKE %s AND c.relkind = 'r' ORDER BY c.relname",
+            [f"{TABLE}\\_t%"],
+        )
+        return [
+            {"schema": schema, "name": name, "rows": max(rows, 0), "bytes": size, "attached": attached}
+            for schema, name, rows, size, attached in cursor.fetchall()
+        ]
+
+def detach(term_id: int, concurrently: bool = False, using: str = "default"):
+    #con concurrently no bloquea las consultas a la tabla, pero no puede correr
+    #dentro de una transaccion
+    qn = connections[using].ops.quote_name
+    name, schema = qn(partition_name(term_id)), qn(settings.ENROLLMENT_ARCHIVE_SCHEMA)
+    _execute(using, f"ALTER TABLE {qn(TABLE)} DETACH PARTITION {name}{' CONCURRENTLY' if concurrently else ''}")
+    #las FK copiadas de la tabla madre impedirian borrar alumnos o cursos con historia archivada
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+                       [partition_name(term_id)])
+        fks = [row[0] for row in cursor.fetchall()]
+    _execute(using, *(f"ALTER TABLE {name} DROP CONSTRAINT {qn(fk)}" for fk in fks),
+             f"CREATE SCHEMA IF NOT EXISTS {schema}",
+             f"CREATE TABLE IF NOT EXISTS {schema}.{qn(TABLE)} (LIKE {qn(TABLE)}) PARTITION BY LIST (term_id)",
+             f"ALTER TABLE {name} SET SCHEMA {schema}",
+             f"ALTER TABLE {schema}.{qn(TABLE)} ATTACH PARTITION {schema}.{name} FOR VALUES IN ({int(term_id)})")
+
+def attach(term_id: int, using: str = "default"):
+    #ATTACH revisa que las filas sean del periodo y vuelve a crear las FK
+    qn = connections[using].ops.quote_name
+    name, schema = qn(partition_name(term_id)), qn(settings.ENROLLMENT_ARCHIVE_SCHEMA)
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT current_schema()")
+        current = qn(cursor.fetchone()[0])
+    _execute(using, f"ALTER TABLE {schema}.{qn(TABLE)} DETACH PARTITION {schema}.{name}",
+             f"ALTER TABLE {schema}.{name} SET SCHEMA {current}",
+             f"ALTER TABLE {qn(TABLE)} ATTACH PARTITION {name} FOR VALUES IN ({int(term_id)})")
+
+
+# --- Migracion ---
+#la tabla se arma de nuevo con LIKE y se copian las filas; despues se crean
+#la clave primaria, los unique, los indices y las FK del modelo con los
+#mismos nombres que usaria django, asi las migraciones siguientes los encuentran
+def _add_constraints(schema_editor, model, primary_key: str):
+    qn = schema_editor.quote_name
+    table = model._meta.db_table  # pylint: disable=protected-access
+    meta = model._meta  # pylint: disable=protected-access
+    schema_editor.execute(f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(table + '_pkey')} PRIMARY KEY ({primary_key})")
+    for fields in meta.unique_together:
+        schema_editor.execute(schema_editor._create_unique_sql(  # pylint: disable=protected-access
+            model, [meta.get_field(name) for name in fields]))
+    for index in meta.indexes:
+        schema_editor.add_index(model, index)
+    for field in meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(schema_editor._create_fk_sql(  # pylint: disable=protected-access
+                model, field, "_fk_%(to_table)s_%(to_column)s"))
+
+def partition_table(schema_editor, model, term_ids):
+    qn = schema_editor.quote_name
+    old = f"{TABLE}_plain"
+    schema_editor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}")
+    schema_editor.execute(f"CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS) PARTITION BY LIST (term_id)")
+    schema_editor.execute(f"CREATE SEQUENCE {qn(SEQUENCE)} OWNED BY {qn(TABLE)}.id")
+    schema_editor.execute(f"ALTER TABLE {qn(TABLE)} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+    for term_id in term_ids:
+        schema_editor.execute(f"CREATE TABLE {qn(partition_name(term_id))} PARTITION OF {qn(TABLE)} "
+                              f"FOR VALUES IN ({int(term_id)})")
+    schema_editor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}")
+    schema_editor.execute(f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {qn(TABLE)}), 0) + 1, false)")
+    schema_editor.execute(f"DROP TABLE {qn(old)}")
+    _add_constraints(schema_editor, model, "id, term_id")
+
+def unpartition_table(schema_editor, model):
+    #vuelta atras: las particiones archivadas (otro schema) no se tocan
+    qn = schema_editor.quote_name
+    old = f"{TABLE}_parted"
+    schema_editor.execute(f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}")
+    schema_editor.execute(f"CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS)")
+    schema_editor.execute(f"ALTER SEQUENCE {qn(SEQUENCE)} OWNED BY {qn(TABLE)}.id")
+    schema_editor.execute(f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}")
+    schema_editor.execute(f"DROP TABLE {qn(old)}")
+    _add_constraints(schema_editor, model, "id")
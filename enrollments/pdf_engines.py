@@ -0,0 +1,127 @@
+#MOTORES DE RENDER
+#cada motor convierte el html de un template en el archivo final. Se elige
+#por request (?engine=), por tipo de reporte (settings.REPORT_ENGINES) o el
+#default de settings.REPORT_ENGINE
+import csv
+import io
+from html.parser import HTMLParser
+
+from django.conf import settings
+
+
+class EngineError(Exception):
+    """El motor no pudo generar el documento."""
+
+
+class XHtml2PdfEngine:
+    name = "xhtml2pdf"
+    content_type = "application/pdf"
+    extension = "pdf"
+    #los pdf se pueden unir con pypdf (fragmentos y modo streaming)
+    mergeable = True
+
+    def render(self, html: str) -> bytes:
+        #xhtml2pdf arrastra reportlab, lxml, html5lib, pillow... (~60 MB y
+        #casi un segundo): se importa con el primer reporte, no al arrancar
+        #cada worker. reports.warm_up() lo carga antes si hace falta
+        from xhtml2pdf import pisa  # pylint: disable=import-outside-toplevel
+        buffer = io.BytesIO()
+        result = pisa.CreatePDF(src=html, dest=buffer, encoding="utf-8")
+        if result.err:
+            raise EngineError("Error al generar PDF")
+        return buffer.getvalue()
+
+
+class WeasyPrintEngine:
+    name = "weasyprint"
+    content_type = "application/pdf"
+    extension = "pdf"
+    mergeable = True
+
+    def render(self, html: str) -> bytes:
+        try:
+            #weasyprint necesita pango instalado en el sistema, por eso se importa aca
+            from weasyprint import HTML  # pylint: disable=import-outside-toplevel
+            return HTML(string=html).write_pdf()
+        except Exception as exc:  # pylint: disable=broad-except
+            raise EngineError(f"Error al generar PDF: {exc}")
+
+
+class HtmlEngine:
+    #devuelve el html tal cual, sirve para ver el reporte en el navegador
+    name = "html"
+    content_type = "text/html; charset=utf-8"
+    extension = "html"
+    mergeable = False
+
+    def render(self, html: str) -> bytes:
+        return html.encode("utf-8")
+
+
+class _TableParser(HTMLParser):
+    #junta el texto de cada celda de las tablas del html
+    def __init__(self):
+        super().__init__()
+        self.tables = []
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self._row = []
+        elif tag in ("td", "th") and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._cell is not None:
+            self._row.append(" ".join("".join(self._cell).split()))
+            self._cell = None
+        elif tag == "tr" and self._row is not None:
+            self.tables[-1].append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+class CsvEngine:
+    #saca las tablas del reporte como csv, una linea en blanco entre tablas
+    name = "csv"
+    content_type = "text/csv; charset=utf-8"
+    extension = "csv"
+    mergeable = False
+
+    def render(self, html: str) -> bytes:
+        parser = _TableParser()
+        parser.feed(html)
+        out = io.StringIO()
+        writer = csv.writer(out)
+        for i, table in enumerate(parser.tables):
+            if i:
+                writer.writerow([])
+            writer.writerows(table)
+        return out.getvalue().encode("utf-8")
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (XHtml2PdfEngine, WeasyPrintEngine, HtmlEngine, CsvEngine)
+}
+
+_instances = {}
+
+
+def engine_name(name: str | None = None, report_type: str | None = None) -> str:
+    name = name or settings.REPORT_ENGINES.get(report_type) or settings.REPORT_ENGINE
+    if name not in ENGINES:
+        raise ValueError(f"Motor de reportes desconocido: {name}")
+    return name
+
+def get_engine(name: str | None = None, report_type: str | None = None):
+    name = engine_name(name, report_type)
+    if name not in _instances:
+        _instances[name] = ENGINES[name]()
+    return _instances[name]
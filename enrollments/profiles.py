@@ -0,0 +1,47 @@
+#PERFIL DEL USUARIO LOGUEADO
+#los datos que van en el token y en /auth/me/ (grupos y alumno vinculado).
+#Se guardan un rato en el cache de django para no repetir las consultas en
+#cada login; los signals borran la entrada cuando cambian los grupos, el
+#usuario o el alumno vinculado, y PROFILE_CACHE_TIMEOUT acota lo que pueda
+#quedar viejo por otros caminos (por ejemplo un alumno que cambia de usuario)
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+
+from .models import Student
+
+FIELDS = ["id", "username", "email", "first_name", "last_name"]
+
+
+def _cache():
+    return caches[settings.PROFILE_CACHE["ALIAS"]]
+
+def _key(user_id) -> str:
+    return f"profile:{user_id}"
+
+def load_profile(user_id) -> dict | None:
+    #tres consultas chicas, sin armar instancias de modelo
+    profile = User.objects.filter(pk=user_id).values(*FIELDS).first()
+    if profile is None:
+        return None
+    profile["groups"] = list(
+        User.groups.through.objects.filter(user_id=user_id).order_by("group__name").values_list("group__name", flat=True)
+    )
+    profile["student_id"] = Student.objects.filter(user_id=user_id).values_list("id", flat=True).first()  # pylint: disable=no-member
+    return profile
+
+def get_profile(user_id, fresh: bool = False) -> dict | None:
+    #fresh=True va a la base y actualiza el cache
+    if not fresh:
+        profile = _cache().get(_key(user_id))
+        if profile is not None:
+            return profile
+    profile = load_profile(user_id)
+    if profile is not None:
+        _cache().set(_key(user_id), profile, settings.PROFILE_CACHE["TIMEOUT"])
+    return profile
+
+def invalidate(*user_ids):
+    ids = [user_id for user_id in user_ids if user_id is not None]
+    if ids:
+        _cache().delete_many([_key(user_id) for user_id in ids])
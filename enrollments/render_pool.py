@@ -0,0 +1,76 @@
+#POOL DE PROCESOS PARA RENDERIZAR PDF
+#pisa es puro python y usa CPU, con threads no se gana nada por el GIL.
+#El pool se crea la primera vez que se usa y queda vivo para el proceso.
+#Los hijos solo reciben html y devuelven bytes, nunca tocan la base.
+#Los procesos arrancan con REPORT_POOL_START_METHOD (forkserver por defecto):
+#un fork de un worker de gunicorn/asgi con threads puede dejar locks tomados
+#en el hijo. Si un hijo se muere (OOM, crash de una libreria) el pool queda
+#roto para siempre: se descarta, se arma otro y se reintenta una vez
+#(pool_map). El importador de alumnos usa el mismo mecanismo para hashear
+#contraseñas, en su propio pool ("import")
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+#(nombre, procesos) -> pool. "render" es el de las requests comunes;
+#batch_reports.py usa uno propio ("batch") para no quitarles procesos
+_pools = {}
+#pools que no renderizan pdf: no cargan los motores con REPORT_PRELOAD
+_NO_PRELOAD = {"import"}
+
+
+def _init_worker(preload: bool):
+    #con forkserver/spawn el hijo arranca sin django configurado ni los
+    #motores de pdf importados (REPORT_PRELOAD los carga antes del primer pdf)
+    import django  # pylint: disable=import-outside-toplevel
+    django.setup()
+    if preload and settings.REPORT_PRELOAD:
+        from .reports import warm_up  # pylint: disable=import-outside-toplevel
+        warm_up()
+
+def get_pool(workers: int | None = None, name: str = "render") -> ProcessPoolExecutor:
+    workers = workers or settings.REPORT_RENDER_WORKERS
+    pool = _pools.get((name, workers))
+    if pool is None:
+        pool = _pools[(name, workers)] = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(settings.REPORT_POOL_START_METHOD),
+            initializer=_init_worker,
+            initargs=(name not in _NO_PRELOAD,),
+        )
+    return pool
+
+def discard(pool: ProcessPoolExecutor):
+    #saca un pool roto, el proximo get_pool arma uno nuevo
+    for key, value in list(_pools.items()):
+        if value is pool:
+            del _pools[key]
+            logger.warning("pool de render %s roto, se arma uno nuevo", key[0])
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def close_all():
+    #apaga todos los pools de este proceso (tests, apagado ordenado)
+    for pool in list(_pools.values()):
+        pool.shutdown(wait=True, cancel_futures=True)
+    _pools.clear()
+
+def pool_map(func, items: list, workers: int | None = None, name: str = "render", chunksize: int = 1) -> list:
+    #map en el pool; si esta roto (o se rompe a mitad) se arma otro y se
+    #reintenta una vez
+    pool = get_pool(workers, name)
+    try:
+        return list(pool.map(func, items, chunksize=chunksize))
+    except BrokenProcessPool:
+        discard(pool)
+        return list(get_pool(workers, name).map(func, items, chunksize=chunksize))
+
+def render_many(func, items: list) -> list:
+    #con un solo item (o un solo worker) no vale la pena pasar por el pool
+    if len(items) <= 1 or settings.REPORT_RENDER_WORKERS <= 1:
+        return [func(item) for item in items]
+    return pool_map(func, items)
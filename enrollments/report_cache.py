@@ -0,0 +1,169 @@
+#CACHE DE REPORTES PDF
+#los pdf generados se guardan con una clave que sale del template y de una
+#"huella" de las filas que usa el reporte (cantidades, ids y fechas maximas).
+#Ademas cada entrada pertenece a un scope (student-5, course-3, students...)
+#y los signals de signals.py borran solo los scopes afectados por cada cambio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+
+
+def cache_key(template_name: str, fingerprint) -> str:
+    raw = json.dumps([template_name, fingerprint], default=str, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskReportCache:
+    #un directorio por scope y un archivo por clave. El tamaño total esta
+    #acotado por max_bytes y se desaloja el menos usado (LRU por mtime,
+    #que se actualiza en cada hit). Recorrer el directorio es caro: cada
+    #proceso lleva una estimacion del tamaño (el ultimo recorrido mas lo que
+    #escribio despues) y solo lo recorre al pasarse de max_bytes o cada
+    #scan_every escrituras, para enterarse de lo que escribieron los demas
+    def __init__(self, location, max_bytes=256 * 1024 * 1024, scan_every=100):
+        self.location = Path(location)
+        self.max_bytes = int(max_bytes)
+        self.scan_every = int(scan_every)
+        self._size = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, scope: str, key: str) -> Path:
+        return self.location / scope / f"{key}.pdf"
+
+    def get(self, scope: str, key: str) -> bytes | None:
+        path = self._path(scope, key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return data
+
+    def set(self, scope: str, key: str, data: bytes):
+        path = self._path(scope, key)
+        #un invalidate de otro proceso puede borrar el directorio del scope
+        #entre el mkdir y el mkstemp (o el replace): se vuelve a crear y se
+        #reintenta una vez
+        for attempt in range(2):
+            path.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                self._write(path, data)
+                break
+            except FileNotFoundError:
+                if attempt:
+                    raise
+        self._account(len(data))
+
+    def _write(self, path: Path, data: bytes):
+        #se escribe a un temporal y se renombra para que otro proceso
+        #nunca lea un pdf a medio escribir
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+
+    def _account(self, size: int):
+        with self._lock:
+            self._writes += 1
+            if self._size is not None and self._writes % self.scan_every:
+                self._size += size
+                if self._size <= self.max_bytes:
+                    return
+            self._size = self._evict()
+
+    def _evict(self) -> int:
+        #recorre el directorio y, si se paso de max_bytes, borra los menos
+        #usados hasta el 90%: asi la escritura siguiente no vuelve a recorrerlo.
+        #Devuelve el tamaño que queda
+        entries = []
+        total = 0
+        for path in self.location.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return total
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            if total <= self.max_bytes * 0.9:
+                break
+        return total
+
+    def invalidate(self, scopes):
+        for scope in scopes:
+            shutil.rmtree(self.location / scope, ignore_errors=True)
+
+    def clear(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+
+class DjangoReportCache:
+    #usa un cache de django (locmem, redis, memcached...). Para invalidar un
+    #scope se incrementa su "generacion", que es parte de la clave, y las
+    #entradas viejas quedan huerfanas hasta que el backend las desaloja
+    def __init__(self, alias="default", timeout=None):
+        self.alias = alias
+        self.timeout = timeout
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def _generation(self, scope: str) -> int:
+        return self.cache.get_or_set(f"report-gen:{scope}", 0, None)
+
+    def _key(self, scope: str, key: str) -> str:
+        return f"report:{scope}:{self._generation(scope)}:{key}"
+
+    def get(self, scope: str, key: str) -> bytes | None:
+        return self.cache.get(self._key(scope, key))
+
+    def set(self, scope: str, key: str, data: bytes):
+        self.cache.set(self._key(scope, key), data, self.timeout)
+
+    def invalidate(self, scopes):
+        for scope in scopes:
+            try:
+                self.cache.incr(f"report-gen:{scope}")
+            except ValueError:
+                self.cache.set(f"report-gen:{scope}", 1, None)
+
+    def clear(self):
+        self.cache.clear()
+
+
+_backend = None
+
+def get_report_cache():
+    #devuelve None si el cache de reportes esta deshabilitado
+    global _backend  # pylint: disable=global-statement
+    config = getattr(settings, "REPORT_CACHE", None)
+    if not config:
+        return None
+    if _backend is None:
+        _backend = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+    return _backend
+
+def invalidate(*scopes):
+    backend = get_report_cache()
+    if backend is not None and scopes:
+        backend.invalidate(set(scopes))
@@ -0,0 +1,498 @@
+#MODULO DE REPORTES
+#aca se arman los reportes pdf, separados de las vistas para que los pueda
+#usar tanto una request normal como el worker de la cola de reportes (jobs.py)
+from datetime import datetime
+from functools import partial
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import Count, F, Max, Prefetch, Q, Sum
+from django.http import Http404
+from django.template.loader import get_template
+
+from . import report_cache, terms
+from .pdf_engines import EngineError, get_engine
+from .render_pool import render_many
+from .models import Student, Course, Enrollment
+
+
+class ReportError(Exception):
+    """Error al generar el pdf de un reporte."""
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M")
+
+def _id_param(params: dict, name: str) -> int:
+    #los ids pueden venir de la url (str) o del body de un job (int)
+    try:
+        return int(params[name])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"El parametro {name} es requerido y debe ser numerico.")
+
+def _rows(qs):
+    #huella barata de un conjunto de filas: cantidad, suma y maximo de ids.
+    #Cualquier alta o baja la cambia aunque no pase por los signals
+    #(bulk_create, update, sql a mano)
+    agg = qs.order_by().aggregate(total=Count("id"), ids=Sum("id"), last=Max("id"))
+    return [agg["total"], agg["ids"], agg["last"]]
+
+def _enrollments(params: dict):
+    #matriculas del periodo pedido en params["term"] (el actual si no viene);
+    #ValueError si el periodo no existe. Los archivados se leen igual
+    return terms.scope(Enrollment.objects.all(), params.get("term"))  # pylint: disable=no-member
+
+def _student_row(student) -> list:
+    return [student.pk, student.first_name, student.last_name, student.email, student.id_number]
+
+def _course_row(course) -> list:
+    return [course.pk, course.code, course.title, course.capacity]
+
+
+#cada builder recibe los parametros del reporte y devuelve un dict con
+#el template, el contexto y el nombre de archivo. Los querysets quedan
+#lazy asi que armar el reporte es barato hasta que se renderiza.
+#"scope" y "fingerprint" son para el cache de pdf (report_cache.py)
+def _student(params: dict) -> dict:
+    student_id = _id_param(params, "student_id")
+    try:
+        student = Student.objects.get(pk=student_id)  # pylint: disable=no-member
+    except Student.DoesNotExist:  # pylint: disable=no-member
+        raise Http404("Alumno no encontrado")
+    enrolls = (
+        _enrollments(params)
+        .filter(student=student)
+        .select_related("course")
+        .order_by("course__code")
+    )
+    return {
+        "template": "enrollments/report_student.html",
+        "context": {"student": student, "enrolls": enrolls, "generated_at": _now()},
+        "filename": f"alumno_{student.last_name}_{student.first_name}_cursos.pdf",
+        "scope": f"student-{student.pk}",
+        "fingerprint": lambda: [_student_row(student), _rows(enrolls)],
+    }
+
+def _students_all(params: dict) -> dict:
+    students = Student.objects.order_by("last_name", "first_name")  # pylint: disable=no-member
+    return {
+        "template": "enrollments/report_students_all.html",
+        "context": {"students": students, "generated_at": _now()},
+        "filename": "all_students.pdf",
+        "stream": _stream_students,
+        "scope": "students",
+        "fingerprint": lambda: _rows(students),
+    }
+
+def _course(params: dict) -> dict:
+    course_id = _id_param(params, "course_id")
+    try:
+        course = Course.objects.get(pk=course_id)  # pylint: disable=no-member
+    except Course.DoesNotExist:  # pylint: disable=no-member
+        raise Http404("Curso no encontrado")
+    enrolls = (
+        _enrollments(params)
+        .filter(course=course)
+        .select_related("student")
+        .order_by("student__last_name", "student__first_name")
+    )
+    return {
+        "template": "enrollments/report_course.html",
+        "context": {"course": course, "enrolls": enrolls, "generated_at": _now()},
+        "filename": f"curso_{course.code}_alumnos.pdf",
+        "scope": f"course-{course.pk}",
+        "fingerprint": lambda: [_course_row(course), _rows(enrolls)],
+    }
+
+def _courses_all(params: dict) -> dict:
+    courses = Course.objects.all().order_by("code")  # pylint: disable=no-member
+    return {
+        "template": "enrollments/report_courses_all.html",
+        "context": {"courses": courses, "generated_at": _now()},
+        "filename": "cursos_disponibles.pdf",
+        "scope": "courses",
+        "fingerprint": lambda: _rows(courses),
+    }
+
+def _student_enrollments(params: dict) -> dict:
+    student_id = _id_param(params, "student_id")
+    enrolls = (
+        _enrollments(params)
+        .filter(student_id=student_id)
+        .select_related("student", "course")
+        .order_by("course__code")
+    )
+    first = enrolls.first()
+    if first is None:
+        raise Http404("El alumno no tiene matriculaciones")
+    student = first.student
+    return {
+        "template": "enrollments/report_student_enrollments.html",
+        "context": {"student": student, "enrolls": enrolls, "generated_at": _now()},
+        "filename": f"matriculas_{student.last_name}_{student.first_name}.pdf",
+        "scope": f"student-{student.pk}",
+        "fingerprint": lambda: [_student_row(student), _rows(enrolls)],
+    }
+
+def _course_enrollments(params: dict) -> dict:
+    course_id = _id_param(params, "course_id")
+    enrolls = (
+        _enrollments(params)
+        .filter(course_id=course_id)
+        .select_related("student", "course")
+        .order_by("student__last_name", "student__first_name")
+    )
+    first = enrolls.first()
+    if first is None:
+        raise Http404("El curso no tiene alumnos matriculados")
+    course = first.course
+    return {
+        "template": "enrollments/report_course_enrollments.html",
+        "context": {"course": course, "enrolls": enrolls, "generated_at": _now()},
+        "filename": f"alumnos_{course.code}.pdf",
+        "scope": f"course-{course.pk}",
+        "fingerprint": lambda: [_course_row(course), _rows(enrolls)],
+    }
+
+def _enrollments_all(params: dict) -> dict:
+    #total = seats_taken, el conteo que ya mantienen las altas y bajas (ver
+    #stats.py): no se cuenta la tabla de matriculas en cada request. Eso vale
+    #para el periodo actual; para otro periodo (o ?term=all) se cuenta
+    enrolls = _enrollments(params)
+    term_ids = terms.resolve(params.get("term"))
+    if term_ids is None or term_ids == [terms.current_term_id()]:
+        ranking = Course.objects.annotate(total=F("seats_taken")).order_by("-seats_taken", "code")  # pylint: disable=no-member
+    else:
+        ranking = (
+            Course.objects  # pylint: disable=no-member
+            .annotate(total=Count("enrollments", filter=Q(enrollments__term_id__in=term_ids)))
+            .order_by("-total", "code")
+            #un periodo archivado se cuenta donde estan sus matriculas
+            .using(terms.read_alias(params.get("term")))
+        )
+    ranking = ranking.prefetch_related(Prefetch("enrollments", enrolls.select_related("student")))
+    return {
+        "template": "enrollments/report_enrollments_all.html",
+        "context": {"courses": ranking, "generated_at": _now()},
+        "filename": "matriculaciones_por_curso.pdf",
+        "render": _render_enrollments_all,
+        "stream": _stream_enrollments,
+        "enrollments": enrolls,
+    }
+
+
+# --- Reporte general por fragmentos ---
+#cada curso es un pdf aparte, cacheado en el scope course-<id>. Una matricula
+#nueva solo invalida el fragmento de su curso, los demas salen del cache.
+#Los que faltan se renderizan en paralelo y al final se unen con pypdf
+#junto con la pagina del ranking
+RANKING_TEMPLATE = "enrollments/report_enrollments_ranking.html"
+FRAGMENT_TEMPLATE = "enrollments/report_enrollments_course.html"
+
+def _render_enrollments_all(report: dict) -> bytes:
+    cache = report_cache.get_report_cache()
+    #el ranking del contexto trae prefetch de todas las matriculas (lo usa el
+    #template completo), aca no hace falta
+    courses = list(report["context"]["courses"].prefetch_related(None))
+    fingerprints = {
+        row["course_id"]: [row["total"], row["ids"], row["last"]]
+        for row in (
+            report["enrollments"]
+            .values("course_id")
+            .annotate(total=Count("id"), ids=Sum("id"), last=Max("id"))
+            .order_by()
+        )
+    }
+    keys = [
+        report_cache.cache_key(FRAGMENT_TEMPLATE, [
+            report["engine"], _course_row(c), fingerprints.get(c.pk, [0, None, None]),
+        ])
+        for c in courses
+    ]
+    doc_key = report_cache.cache_key(report["template"], keys)
+    if cache is not None:
+        pdf = cache.get("enrollments", doc_key)
+        if pdf is not None:
+            return pdf
+
+    fragments = {}
+    if cache is not None:
+        for course, key in zip(courses, keys):
+            fragments[course.pk] = cache.get(f"course-{course.pk}", key)
+    missing = [c for c in courses if fragments.get(c.pk) is None]
+
+    enrolls_by_course = {c.pk: [] for c in missing}
+    enrolls = (
+        report["enrollments"]
+        .filter(course_id__in=list(enrolls_by_course))
+        .select_related("student")
+        .order_by("course_id", "student__last_name", "student__first_name")
+    )
+    for enroll in enrolls:
+        enrolls_by_course[enroll.course_id].append(enroll)
+
+    htmls = [render_html(RANKING_TEMPLATE, report["context"] | {"courses": courses})]
+    htmls += [
+        render_html(FRAGMENT_TEMPLATE, {"course": c, "enrolls": enrolls_by_course[c.pk]})
+        for c in missing
+    ]
+    ranking_pdf, *rendered = render_many(partial(render_pdf, engine=report["engine"]), htmls)
+    for course, pdf in zip(missing, rendered):
+        fragments[course.pk] = pdf
+    if cache is not None:
+        for course, key in zip(courses, keys):
+            if course.pk in enrolls_by_course:
+                cache.set(f"course-{course.pk}", key, fragments[course.pk])
+
+    pdf = merge_pdfs([ranking_pdf] + [fragments[c.pk] for c in courses])
+    if cache is not None:
+        cache.set("enrollments", doc_key, pdf)
+    return pdf
+
+
+# --- Modo streaming ---
+#para los reportes de toda la institucion: las filas se leen con un cursor
+#del lado del servidor (.iterator), se renderizan de a bloques de
+#REPORT_STREAM_CHUNK filas y las paginas de cada bloque se escriben en el
+#archivo apenas se renderiza (_write_pdf). En memoria queda un solo bloque a
+#la vez y la tabla xref (un offset por objeto del pdf), no todo el queryset,
+#ni todo el html, ni las paginas ya escritas
+STUDENTS_CHUNK_TEMPLATE = "enrollments/report_students_chunk.html"
+ENROLLMENTS_CHUNK_TEMPLATE = "enrollments/report_enrollments_chunk.html"
+
+def _chunks(rows, size: int):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def _stream_students(report: dict):
+    size = settings.REPORT_STREAM_CHUNK
+    rows = (
+        report["context"]["students"]
+        .values("last_name", "first_name", "email", "id_number")
+        .iterator(chunk_size=size)
+    )
+    offset = 0
+    for chunk in _chunks(rows, size):
+        yield render_html(STUDENTS_CHUNK_TEMPLATE, {
+            "students": chunk, "offset": offset, "first": offset == 0,
+            "generated_at": report["context"]["generated_at"],
+        })
+        offset += len(chunk)
+    if offset == 0:
+        yield render_html(STUDENTS_CHUNK_TEMPLATE, {
+            "students": [], "offset": 0, "first": True,
+            "generated_at": report["context"]["generated_at"],
+        })
+
+def _stream_enrollments(report: dict):
+    size = settings.REPORT_STREAM_CHUNK
+    #la lista de cursos es chica comparada con las matriculas, esa si se carga entera
+    courses = list(
+        report["context"]["courses"].prefetch_related(None).values("id", "code", "title", "total")
+    )
+    yield render_html(RANKING_TEMPLATE, {
+        "courses": courses, "generated_at": report["context"]["generated_at"],
+    })
+    for course in courses:
+        rows = (
+            report["enrollments"]
+            .filter(course_id=course["id"])
+            .order_by("student__last_name", "student__first_name")
+            .values("student__last_name", "student__first_name", "student__email",
+                    "student__id_number", "enrolled_at")
+            .iterator(chunk_size=size)
+        )
+        offset = 0
+        for chunk in _chunks(rows, size):
+            yield render_html(ENROLLMENTS_CHUNK_TEMPLATE, {
+                "course": course, "enrolls": chunk, "offset": offset, "first": offset == 0,
+            })
+            offset += len(chunk)
+        if offset == 0:
+            yield render_html(ENROLLMENTS_CHUNK_TEMPLATE, {
+                "course": course, "enrolls": [], "offset": 0, "first": True,
+            })
+
+def can_stream(report: dict) -> bool:
+    #el modo streaming une pdf, con los motores html/csv no aplica
+    return "stream" in report and get_engine(report["engine"]).mergeable
+
+def _translate(obj, refs: dict, queue: list, new_ref):
+    #cambia en el lugar las referencias de una parte (n g R) por los numeros
+    #del pdf final; las que todavia no se escribieron quedan en queue
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject  # pylint: disable=import-outside-toplevel
+    if isinstance(obj, IndirectObject):
+        if obj.pdf is None:
+            #ya es del pdf final
+            return obj
+        key = (obj.idnum, obj.generation)
+        if key not in refs:
+            refs[key] = new_ref()
+            queue.append((refs[key], obj))
+        return refs[key]
+    if isinstance(obj, DictionaryObject):
+        for key, value in list(obj.items()):
+            obj[key] = _translate(value, refs, queue, new_ref)
+    elif isinstance(obj, ArrayObject):
+        for i, value in enumerate(obj):
+            obj[i] = _translate(value, refs, queue, new_ref)
+    return obj
+
+def _write_pdf(parts, dest):
+    #une los pdf de parts (bytes) escribiendo en dest a medida que llegan: los
+    #objetos de cada parte se renumeran y se escriben enseguida. pypdf solo
+    #lee cada parte, nunca arma el documento entero en memoria como PdfWriter.
+    #1 es el catalogo y 2 el arbol de paginas, se escriben al final
+    from pypdf import PdfReader  # pylint: disable=import-outside-toplevel
+    from pypdf.generic import (  # pylint: disable=import-outside-toplevel
+        ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject,
+    )
+    base = dest.tell()
+    offsets = [None, None, None]
+    kids = []
+
+    def new_ref():
+        offsets.append(None)
+        return IndirectObject(len(offsets) - 1, 0, None)
+
+    def write(ref, obj):
+        offsets[ref.idnum] = dest.tell() - base
+        dest.write(f"{ref.idnum} 0 obj\n".encode("ascii"))
+        obj.write_to_stream(dest)
+        dest.write(b"\nendobj\n")
+
+    dest.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    pages = IndirectObject(2, 0, None)
+    for part in parts:
+        reader = PdfReader(BytesIO(part))
+        refs, queue = {}, []
+        for page in reader.pages:
+            #los atributos heredados del arbol de paginas viejo pasan a la pagina
+            for key in ("/Resources", "/MediaBox", "/CropBox", "/Rotate"):
+                node = page
+                while key not in node and "/Parent" in node:
+                    node = node["/Parent"]
+                if node is not page and key in node:
+                    page[NameObject(key)] = node.raw_get(key)
+            del page["/Parent"]
+            ref = refs[(page.indirect_reference.idnum, page.indirect_reference.generation)] = new_ref()
+            _translate(page, refs, queue, new_ref)
+            page[NameObject("/Parent")] = pages
+            write(ref, page)
+            kids.append(ref)
+            while queue:
+                ref, old = queue.pop()
+                write(ref, _translate(old.get_object(), refs, queue, new_ref))
+    write(pages, DictionaryObject({
+        NameObject("/Type"): NameObject("/Pages"),
+        NameObject("/Kids"): ArrayObject(kids),
+        NameObject("/Count"): NumberObject(len(kids)),
+    }))
+    write(IndirectObject(1, 0, None), DictionaryObject({
+        NameObject("/Type"): NameObject("/Catalog"), NameObject("/Pages"): pages,
+    }))
+    xref = dest.tell() - base
+    dest.write(f"xref\n0 {len(offsets)}\n0000000000 65535 f\r\n".encode("ascii"))
+    for offset in offsets[1:]:
+        dest.write(f"{offset:010d} 00000 n\r\n".encode("ascii"))
+    dest.write(f"trailer\n<< /Size {len(offsets)} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("ascii"))
+
+def stream_report(report: dict, dest):
+    #escribe el pdf en dest (un archivo abierto en modo binario), bloque por bloque
+    _write_pdf((render_pdf(html, report["engine"]) for html in report["stream"](report)), dest)
+
+
+REPORTS = {
+    "student": _student,
+    "students_all": _students_all,
+    "course": _course,
+    "courses_all": _courses_all,
+    "student_enrollments": _student_enrollments,
+    "course_enrollments": _course_enrollments,
+    "enrollments_all": _enrollments_all,
+}
+
+
+#parametros que acepta cada tipo de reporte, ademas de COMMON_PARAMS. Los
+#usa el serializer de la cola de reportes para rechazar lo que no existe
+REPORT_PARAMS = {
+    "student": {"student_id"},
+    "students_all": set(),
+    "course": {"course_id"},
+    "courses_all": set(),
+    "student_enrollments": {"student_id"},
+    "course_enrollments": {"course_id"},
+    "enrollments_all": set(),
+}
+COMMON_PARAMS = {"engine", "term"}
+
+
+def build_report(report_type: str, params: dict | None = None) -> dict:
+    params = params or {}
+    if not isinstance(params, dict):
+        raise ValueError("Los parametros del reporte deben ser un objeto.")
+    try:
+        builder = REPORTS[report_type]
+    except KeyError:
+        raise ValueError(f"Tipo de reporte desconocido: {report_type}")
+    #el motor se resuelve antes de tocar la base, asi un motor invalido da 400
+    engine = get_engine(params.get("engine"), report_type)
+    report = builder(params)
+    report["engine"] = engine.name
+    report["content_type"] = engine.content_type
+    report["filename"] = f"{report['filename'].removesuffix('.pdf')}.{engine.extension}"
+    return report
+
+def render_html(template_name: str, context: dict) -> str:
+    return get_template(template_name).render(context)
+
+def render_pdf(html: str, engine: str | None = None) -> bytes:
+    #"pdf" por costumbre: con los motores html/csv devuelve ese formato
+    try:
+        return get_engine(engine).render(html)
+    except EngineError as exc:
+        raise ReportError(str(exc))
+
+def merge_pdfs(parts: list) -> bytes:
+    #pypdf (y xhtml2pdf en pdf_engines.py) se importan con el primer uso
+    from pypdf import PdfWriter  # pylint: disable=import-outside-toplevel
+    writer = PdfWriter()
+    for part in parts:
+        writer.append(BytesIO(part))
+    out = BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+def render_report(report: dict) -> bytes:
+    engine = report.get("engine")
+    #algunos reportes tienen su propia forma de renderizarse (por fragmentos)
+    if "render" in report and get_engine(engine).mergeable:
+        return report["render"](report)
+    cache = report_cache.get_report_cache()
+    if cache is None or "scope" not in report:
+        return render_pdf(render_html(report["template"], report["context"]), engine)
+    key = report_cache.cache_key(report["template"], [engine, report["fingerprint"]()])
+    pdf = cache.get(report["scope"], key)
+    if pdf is None:
+        pdf = render_pdf(render_html(report["template"], report["context"]), engine)
+        cache.set(report["scope"], key, pdf)
+    return pdf
+
+def warm_up():
+    #para procesos que van a renderizar: carga pypdf y los motores configurados
+    #y renderiza un documento minimo (fuentes, parser). Lo llaman wsgi.py/asgi.py
+    #con REPORT_PRELOAD=True (con gunicorn --preload una sola vez, en el master)
+    #y manage.py report_worker antes de lanzar los procesos
+    import pypdf  # noqa: F401 pylint: disable=import-outside-toplevel,unused-import
+    for engine in {settings.REPORT_ENGINE, *settings.REPORT_ENGINES.values()}:
+        try:
+            render_pdf("<p>warm-up</p>", engine)
+        except ReportError:
+            #weasyprint sin pango instalado: va a fallar igual en el primer reporte
+            pass
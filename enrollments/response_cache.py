@@ -0,0 +1,171 @@
+#CACHE DE RESPUESTAS DE LECTURA
+#el front consulta los listados de cursos y las nominas todo el tiempo. Cada
+#modelo (student, course, enrollment) tiene un contador de version que los
+#signals incrementan en cada escritura; la clave de una respuesta sale de la
+#url, del Accept y de las versiones de los modelos que lee la vista. El ETag
+#es esa misma clave, asi un If-None-Match se contesta con 304 leyendo solo
+#los contadores, sin ir a la base ni serializar nada
+import hashlib
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.response import Response
+
+from .routers import read_alias
+
+STATS = ("hit", "miss", "not_modified")
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE["ALIAS"]]
+
+def _version_key(model: str) -> str:
+    return f"resp-ver:{model}"
+
+def get_versions(models) -> dict:
+    cache = _cache()
+    keys = {_version_key(m): m for m in models}
+    found = cache.get_many(list(keys))
+    versions = {}
+    for key, model in keys.items():
+        if key not in found:
+            #si el backend desalojo el contador arranca de un valor nuevo
+            #(milisegundos), nunca de uno que ya se haya usado en una clave
+            cache.add(key, int(time.time() * 1000), None)
+            found[key] = cache.get(key)
+        versions[model] = found[key]
+    return versions
+
+def _bump_now(models):
+    cache = _cache()
+    for model in models:
+        try:
+            cache.incr(_version_key(model))
+        except ValueError:
+            cache.add(_version_key(model), int(time.time() * 1000), None)
+
+def bump(*models):
+    #despues del commit: si se incrementa antes, otra request podria
+    #cachear los datos viejos con la version nueva
+    if settings.RESPONSE_CACHE["ENABLED"] and models:
+        transaction.on_commit(lambda: _bump_now(models))
+
+def _count(stat: str):
+    cache = _cache()
+    try:
+        cache.incr(f"resp-stat:{stat}")
+    except ValueError:
+        cache.add(f"resp-stat:{stat}", 1, None)
+
+def stats() -> dict:
+    found = _cache().get_many([f"resp-stat:{s}" for s in STATS])
+    data = {s: found.get(f"resp-stat:{s}", 0) for s in STATS}
+    served = data["hit"] + data["not_modified"]
+    total = served + data["miss"]
+    data["hit_ratio"] = round(served / total, 3) if total else None
+    data["enabled"] = settings.RESPONSE_CACHE["ENABLED"]
+    return data
+
+def _etags(request) -> set[str]:
+    header = request.META.get("HTTP_IF_NONE_MATCH", "")
+    return {tag.strip() for tag in header.split(",") if tag.strip()}
+
+def _lookup(request, models):
+    #(etag, clave, contenido cacheado). La clave es None si el cliente ya
+    #tiene esa version (304)
+    raw = json.dumps([
+        request.path, sorted(request.GET.lists()), request.META.get("HTTP_ACCEPT", ""),
+        sorted(get_versions(models).items()),
+    ])
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    etag = f'"{digest}"'
+    if etag in _etags(request) or "*" in _etags(request):
+        _count("not_modified")
+        return etag, None, None
+    key = f"resp:{digest}"
+    cached = _cache().get(key)
+    if cached is not None:
+        _count("hit")
+    return etag, key, cached
+
+def _store(key: str, content: bytes, content_type: str):
+    timeout = settings.RESPONSE_CACHE["TIMEOUT"]
+    if read_alias() is not None:
+        #leida de una replica atrasada puede tener datos anteriores a la
+        #version actual: se guarda poco tiempo para no fijarlos
+        timeout = min(timeout, max(1, int(settings.REPLICA_MAX_LAG)))
+    _cache().set(key, (content, content_type), timeout)
+
+def _cached(etag: str, key, cached):
+    #respuesta armada sin llamar a la vista (304 o HIT), None si hay que llamarla
+    if key is None:
+        response = HttpResponseNotModified()
+    elif cached is not None:
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response["X-Cache"] = "HIT"
+    else:
+        return None
+    return _finish(response, etag)
+
+def _finish(response, etag: str):
+    response["ETag"] = etag
+    #el navegador guarda la respuesta pero la revalida siempre con If-None-Match
+    response["Cache-Control"] = "no-cache"
+    return response
+
+def cached_response(*models):
+    #decorador para acciones GET de un viewset que solo leen esos modelos.
+    #Solo se guardan las Response 200 de DRF (las exportaciones en streaming
+    #y los errores pasan de largo)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE["ENABLED"] or request.method != "GET":
+                return func(view, request, *args, **kwargs)
+            etag, key, cached = _lookup(request, models)
+            response = _cached(etag, key, cached)
+            if response is not None:
+                return response
+            response = func(view, request, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            _count("miss")
+            response["X-Cache"] = "MISS"
+            #la Response de DRF se renderiza despues; se guarda el contenido final
+            response.add_post_render_callback(lambda r: _store(key, r.content, r["Content-Type"]))
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+def async_cached_response(*models):
+    #lo mismo para las vistas async (async_views.py), que devuelven el
+    #HttpResponse ya armado. El cache se consulta en un thread: una sola
+    #vuelta para la busqueda y otra para guardar
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(request, *args, **kwargs):
+            if not settings.RESPONSE_CACHE["ENABLED"] or request.method != "GET":
+                return await func(request, *args, **kwargs)
+            etag, key, cached = await sync_to_async(_lookup)(request, models)
+            response = _cached(etag, key, cached)
+            if response is not None:
+                return response
+            response = await func(request, *args, **kwargs)
+            if response.streaming or response.status_code != 200:
+                return response
+            response["X-Cache"] = "MISS"
+            await sync_to_async(_store_miss)(key, response.content, response["Content-Type"])
+            return _finish(response, etag)
+        return wrapper
+    return decorator
+
+def _store_miss(key: str, content: bytes, content_type: str):
+    _count("miss")
+    _store(key, content, content_type)
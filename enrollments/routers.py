@@ -0,0 +1,199 @@
+#REPLICAS DE LECTURA
+#las lecturas de los reportes, listados, detalle y nominas van a una replica
+#(settings DB_REPLICA_URLS) y todo lo demas al primario. ReplicaMiddleware
+#decide por request segun la accion del viewset y el router solo mira esa
+#decision. Despues de que un cliente escribe queda "pegado" al primario unos
+#segundos, asi ve su matricula nueva aunque la replica venga atrasada: con una
+#cookie y, si vino con token, con una marca por usuario en el cache compartido
+#(clientes sin cookies, el mismo usuario desde otro dispositivo).
+#Si una replica se atrasa mas de REPLICA_MAX_LAG segundos o no responde, se
+#lee del primario
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = "db_primary_until"
+_PIN_PREFIX = "replica-pin:"
+
+#solo lee el token, sin consultar la base
+_jwt = JWTStatelessUserAuthentication()
+
+#alias de replica elegido para la request actual (None = primario). Se setea
+#al principio de cada request y no se limpia al final, asi las respuestas en
+#streaming (exportaciones) siguen leyendo de la misma replica
+_read_alias = contextvars.ContextVar("read_alias", default=None)
+
+_lag = {}
+_lag_lock = threading.Lock()
+
+#0 si no es una replica (o no tiene nada pendiente de aplicar)
+_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def read_alias() -> str | None:
+    #replica que esta usando la request actual, None si lee del primario
+    return _read_alias.get()
+
+def replica_aliases() -> list[str]:
+    return [alias for alias in settings.DATABASES if alias.startswith("replica")]
+
+def replica_lag(alias: str) -> float | None:
+    #segundos de atraso, medidos cada REPLICA_LAG_CHECK_INTERVAL por proceso.
+    #None si no se pudo consultar
+    now = time.monotonic()
+    with _lag_lock:
+        checked = _lag.get(alias)
+        if checked and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return checked[1]
+    lag = 0.0
+    conn = connections[alias]
+    if conn.vendor == "postgresql":
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute(_LAG_SQL)
+                lag = float(cursor.fetchone()[0] or 0)
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("No se pudo medir el atraso de %s", alias, exc_info=True)
+            lag = None
+    with _lag_lock:
+        _lag[alias] = (now, lag)
+    return lag
+
+def healthy_replicas() -> list[str]:
+    return [
+        alias for alias in replica_aliases()
+        if (lag := replica_lag(alias)) is not None and lag <= settings.REPLICA_MAX_LAG
+    ]
+
+def replica_stats() -> dict:
+    return {
+        alias: {"lag_seconds": replica_lag(alias), "max_lag": settings.REPLICA_MAX_LAG}
+        for alias in replica_aliases()
+    }
+
+def _read_only(request, view_func) -> bool:
+    if request.method not in ("GET", "HEAD"):
+        return False
+    #los viewsets de DRF guardan el mapeo metodo -> accion en la vista; las
+    #vistas async (async_views.py) dicen su accion en read_action
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get("get") or getattr(view_func, "read_action", None)
+    if action is None:
+        return False
+    return action in settings.REPLICA_READ_ACTIONS or action.startswith("report_")
+
+def _pinned(request) -> bool:
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+def _pin_key(request) -> str | None:
+    #clave de la marca del usuario del token; un token invalido se ignora
+    #aca (la vista lo rechaza despues)
+    try:
+        result = _jwt.authenticate(request)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+    return f"{_PIN_PREFIX}{result[0].id}" if result else None
+
+def _user_pinned(request) -> bool:
+    key = _pin_key(request)
+    return key is not None and bool(caches["default"].get(key))
+
+async def _auser_pinned(request) -> bool:
+    key = _pin_key(request)
+    return key is not None and bool(await caches["default"].aget(key))
+
+def _wants_replica(request, view_func) -> bool:
+    return bool(replica_aliases()) and _read_only(request, view_func) and not _pinned(request)
+
+
+class ReplicaMiddleware:
+    #sirve para WSGI y ASGI: bajo ASGI no agrega un salto a un thread por
+    #request, solo cuando hay que medir el atraso de las replicas
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        _read_alias.set(None)
+        response = self.get_response(request)
+        key = self._pin(request, response)
+        if key is not None:
+            caches["default"].set(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        _read_alias.set(None)
+        response = await self.get_response(request)
+        key = self._pin(request, response)
+        if key is not None:
+            await caches["default"].aset(key, 1, settings.REPLICA_PIN_SECONDS)
+        return response
+
+    @staticmethod
+    def _pin(request, response) -> str | None:
+        #una escritura que salio bien deja al cliente en el primario un rato.
+        #Pone la cookie y devuelve la clave de la marca del usuario (None sin token)
+        if request.method in ("GET", "HEAD", "OPTIONS") or response.status_code >= 400 or not replica_aliases():
+            return None
+        until = time.time() + settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, f"{until:.3f}", max_age=settings.REPLICA_PIN_SECONDS,
+                            httponly=True, samesite="Lax")
+        return _pin_key(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if _wants_replica(request, view_func) and not _user_pinned(request):
+            replicas = healthy_replicas()
+            if replicas:
+                _read_alias.set(random.choice(replicas))
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        if _wants_replica(request, view_func) and not await _auser_pinned(request):
+            replicas = await sync_to_async(healthy_replicas)()
+            if replicas:
+                _read_alias.set(random.choice(replicas))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        #dentro de una transaccion del primario se lee lo que se esta escribiendo
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        #las replicas tienen los mismos datos que el primario
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
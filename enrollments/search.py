@@ -0,0 +1,88 @@
+#BUSCADOR DE ALUMNOS Y CURSOS
+#cada alumno/curso guarda un search_document normalizado (minusculas, sin
+#tildes, con fold() de usernames.py). En postgres se busca con un indice GIN
+#de texto completo (prefijos: "jos nun" encuentra "José Núñez") y otro de
+#trigramas (tolera errores de tipeo: "nunes"), ordenando por relevancia.
+#Si lo que se escribe parece una cedula se busca por prefijo de id_number.
+#En sqlite (desarrollo local) se cae a un LIKE sobre el mismo documento
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+from rest_framework.filters import BaseFilterBackend, OrderingFilter
+
+from .usernames import fold
+
+#configuracion de postgres sin stemming ni stopwords: los nombres propios
+#no se tienen que "castellanizar"
+TS_CONFIG = "simple"
+
+_ID_NUMBER = re.compile(r"[0-9][0-9.\-]*")
+
+
+def normalize(text: str) -> str:
+    #fold + solo letras, numeros, @ . - y un espacio entre palabras
+    return " ".join(re.sub(r"[^a-z0-9@.\-]+", " ", fold(text)).split())
+
+def student_document(student) -> str:
+    return normalize(f"{student.first_name} {student.last_name} {student.email} {student.id_number}")
+
+def course_document(course) -> str:
+    return normalize(f"{course.code} {course.title}")
+
+def search_vector():
+    #tiene que ser la misma expresion que el indice de la migracion 0006
+    return SearchVector("search_document", config=TS_CONFIG)
+
+
+class DocumentSearchFilter(BaseFilterBackend):
+    #reemplaza a filters.SearchFilter (ILIKE '%...%' sobre cada columna).
+    #La vista puede definir search_prefix_field para buscar por prefijo
+    #(la cedula en alumnos). Va despues de OrderingFilter en filter_backends:
+    #sin ?ordering= explicito ordena por relevancia
+    search_param = "search"
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, "").strip()
+        if not term:
+            return queryset
+        prefix_field = getattr(view, "search_prefix_field", None)
+        if prefix_field and _ID_NUMBER.fullmatch(term):
+            return queryset.filter(**{f"{prefix_field}__startswith": term})
+
+        text = normalize(term)
+        words = re.findall(r"[a-z0-9]+", text)
+        if not words:
+            return queryset.none()
+        if connection.vendor != "postgresql":
+            for word in text.split():
+                queryset = queryset.filter(search_document__contains=word)
+            return queryset
+
+        #"jos nun" -> jos:* & nun:* (cada palabra como prefijo)
+        query = SearchQuery(" & ".join(f"{w}:*" for w in words), search_type="raw", config=TS_CONFIG)
+        queryset = (
+            queryset
+            .alias(search=search_vector())
+            .filter(Q(search=query) | Q(search_document__trigram_word_similar=text))
+            #ts_rank y word_similarity son real; se pasa a double para que el
+            #valor vuelva igual en el cursor de la paginacion
+            .annotate(rank=Cast(
+                SearchRank(search_vector(), query) + TrigramWordSimilarity(text, "search_document"),
+                FloatField(),
+            ))
+        )
+        if OrderingFilter.ordering_param not in request.query_params:
+            queryset = queryset.order_by("-rank", *(getattr(view, "ordering", None) or []))
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            "name": self.search_param, "required": False, "in": "query",
+            "description": "Busca sin importar tildes ni mayusculas; numeros = prefijo de cedula.",
+            "schema": {"type": "string"},
+        }]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Student, Course, Enrollment
+from .models import Student, Course, Enrollment, ReportJob, Term, WaitlistEntry
+from .reports import COMMON_PARAMS, REPORT_PARAMS, REPORTS
 
 class StudentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -9,10 +10,63 @@ class StudentSerializer(serializers.ModelSerializer):
 class CourseSerializer(serializers.ModelSerializer):
     class Meta:
         model = Course
-        fields = ["id", "code", "title", "capacity"]
+        fields = ["id", "code", "title", "capacity", "seats_taken"]
+        read_only_fields = ["seats_taken"]
 
 class EnrollmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Enrollment
-        fields = ["id", "student", "course", "enrolled_at"]
-        read_only_fields = ["enrolled_at"]
\ No newline at end of file
+        fields = ["id", "student", "course", "term", "enrolled_at"]
+        #el periodo lo pone el alta (siempre el actual)
+        read_only_fields = ["term", "enrolled_at"]
+
+class TermSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Term
+        fields = ["id", "code", "name", "starts_on", "ends_on", "is_current", "archived_at"]
+
+class WaitlistEntrySerializer(serializers.ModelSerializer):
+    #position viene anotada en el queryset de WaitlistViewSet (1 = proximo)
+    position = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = WaitlistEntry
+        fields = ["id", "student", "course", "term", "created_at", "position"]
+        read_only_fields = ["term", "created_at"]
+        #los duplicados los resuelve services.join_waitlist con el curso bloqueado
+        validators = []
+
+class ReportJobSerializer(serializers.ModelSerializer):
+    report_type = serializers.ChoiceField(choices=sorted(REPORTS))
+
+    class Meta:
+        model = ReportJob
+        fields = ["id", "report_type", "params", "status", "created_at", "started_at",
+                  "finished_at", "filename", "error", "render_ms"]
+        read_only_fields = ["status", "created_at", "started_at", "finished_at",
+                            "filename", "error", "render_ms"]
+
+    def validate_params(self, value):
+        #JSONField acepta cualquier json: aca solo un objeto con textos en
+        #engine/term y stream booleano (los ids los valida build_report)
+        if value is None:
+            return {}
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Debe ser un objeto.")
+        for name in ("engine", "term"):
+            if name in value and not isinstance(value[name], str):
+                raise serializers.ValidationError({name: "Debe ser un texto."})
+        if "stream" in value and not isinstance(value["stream"], bool):
+            raise serializers.ValidationError({"stream": "Debe ser true o false."})
+        return value
+
+    def validate(self, attrs):
+        #las claves dependen del tipo de reporte; stream solo lo usa la cola
+        allowed = REPORT_PARAMS[attrs["report_type"]] | COMMON_PARAMS | {"stream"}
+        unknown = sorted(set(attrs.get("params") or {}) - allowed)
+        if unknown:
+            raise serializers.ValidationError({"params": [
+                f"Parametros no validos para {attrs['report_type']}: {', '.join(unknown)}. "
+                f"Acepta: {', '.join(sorted(allowed))}."
+            ]})
+        return attrs
@@ -0,0 +1,225 @@
+#SERVICIOS DE MATRICULACION
+#operaciones de escritura sobre matriculas que no entran en un ModelViewSet comun.
+#Las altas son siempre del periodo actual (el default de Enrollment.term)
+import logging
+import time
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import terms
+from .models import Student, Course, Enrollment, WaitlistEntry
+from .signals import enrollments_changed
+from .stats import record_enrollments
+
+logger = logging.getLogger(__name__)
+
+
+class CourseFullError(Exception):
+    """El curso no tiene asientos libres."""
+
+
+class AlreadyEnrolledError(Exception):
+    """El alumno ya esta inscripto en el curso."""
+
+
+def take_seat(course_id: int, seats: int = 1) -> bool:
+    #UPDATE condicional: suma el asiento solo si sigue habiendo lugar. Postgres
+    #bloquea la fila del curso hasta el fin de la transaccion y vuelve a evaluar
+    #el WHERE si otra transaccion la cambio, asi que no hay sobreventa.
+    #El asiento se libera en el post_delete de Enrollment (signals.py)
+    return bool(
+        Course.objects  # pylint: disable=no-member
+        .filter(pk=course_id, seats_taken__lte=F("capacity") - seats)
+        .update(seats_taken=F("seats_taken") + seats)
+    )
+
+def enroll(student_id: int, course_id: int) -> Enrollment:
+    #una sola transaccion corta: tomar el asiento e insertar la matricula
+    with transaction.atomic():
+        if not take_seat(course_id):
+            raise CourseFullError()
+        try:
+            with transaction.atomic():
+                return Enrollment.objects.create(student_id=student_id, course_id=course_id)  # pylint: disable=no-member
+        except IntegrityError:
+            #al salir con la excepcion se deshace tambien el asiento tomado
+            raise AlreadyEnrolledError()
+
+
+class OnWaitlistError(Exception):
+    """El alumno ya esta en la lista de espera del curso."""
+
+
+def _lock_course(course_id: int) -> Course | None:
+    #bloquea la fila del curso; bajas, altas desde la lista de espera y
+    #entradas a la lista quedan serializadas por curso
+    return Course.objects.select_for_update().filter(pk=course_id).first()  # pylint: disable=no-member
+
+def join_waitlist(student_id: int, course_id: int) -> Enrollment | WaitlistEntry:
+    #si hay lugar matricula directo, si no anota al alumno al final de la cola
+    with transaction.atomic():
+        course = _lock_course(course_id)
+        if course is None:
+            raise Course.DoesNotExist()  # pylint: disable=no-member
+        if Enrollment.objects.filter(student_id=student_id, course_id=course_id,  # pylint: disable=no-member
+                                     term_id=terms.current_term_id()).exists():
+            raise AlreadyEnrolledError()
+        if course.seats_taken < course.capacity:
+            return enroll(student_id, course_id)
+        try:
+            with transaction.atomic():
+                return WaitlistEntry.objects.create(student_id=student_id, course_id=course_id)  # pylint: disable=no-member
+        except IntegrityError:
+            raise OnWaitlistError()
+
+def promote_waitlist(course_id: int) -> list[Enrollment]:
+    #pasa de la lista de espera a matriculas mientras haya asientos. Se llama
+    #con el curso ya bloqueado; por cada baja cuesta una lectura por indice
+    #(course, id), un insert y un delete
+    promoted = []
+    while True:
+        head = (
+            WaitlistEntry.objects  # pylint: disable=no-member
+            .filter(course_id=course_id)
+            .order_by("id")
+            .first()
+        )
+        if head is None:
+            return promoted
+        try:
+            promoted.append(enroll(head.student_id, course_id))
+        except CourseFullError:
+            return promoted
+        except AlreadyEnrolledError:
+            pass
+        head.delete()
+
+def lock_and_promote(course_id: int) -> list[Enrollment]:
+    with transaction.atomic():
+        _lock_course(course_id)
+        return promote_waitlist(course_id)
+
+def drop(enrollment: Enrollment) -> list[Enrollment]:
+    #baja de una matricula y alta del primero de la lista de espera, todo en
+    #la misma transaccion (el asiento se libera en el post_delete)
+    with transaction.atomic():
+        _lock_course(enrollment.course_id)
+        enrollment.delete()
+        return promote_waitlist(enrollment.course_id)
+
+def _pair(item) -> tuple[int, int]:
+    try:
+        return int(item["student"]), int(item["course"])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("student y course son requeridos y deben ser numericos.")
+
+def _insert_enrollments(to_create: dict, term_id) -> dict:
+    #inserta los pares de to_create ((student, course) -> indice) y devuelve
+    #par -> id. Sin ignore_conflicts: si otra request matriculo un par entre la
+    #validacion y el insert, el IntegrityError deshace solo el savepoint, esos
+    #pares se sacan de to_create y se reintenta con el resto
+    while to_create:
+        try:
+            with transaction.atomic():
+                rows = Enrollment.objects.bulk_create(  # pylint: disable=no-member
+                    [Enrollment(student_id=s, course_id=c, term_id=term_id) for s, c in to_create],
+                    batch_size=1000,
+                )
+        except IntegrityError:
+            taken = _existing_pairs(to_create, term_id)
+            if not taken:
+                raise
+            for pair in taken:
+                del to_create[pair]
+            continue
+        if all(row.pk is not None for row in rows):
+            return {(row.student_id, row.course_id): row.pk for row in rows}
+        #bases que no devuelven los ids del insert: todos los pares son nuestros
+        return _existing_pairs(to_create, term_id)
+    return {}
+
+def _existing_pairs(pairs, term_id) -> dict:
+    #par -> id de los pares que ya estan matriculados; el filtro por conjuntos
+    #trae tambien cruces que no se pidieron, se quedan solo los pares exactos
+    rows = (
+        Enrollment.objects  # pylint: disable=no-member
+        .filter(student_id__in={s for s, _ in pairs}, course_id__in={c for _, c in pairs}, term_id=term_id)
+        .values_list("student_id", "course_id", "id")
+    )
+    return {(s, c): pk for s, c, pk in rows if (s, c) in pairs}
+
+def bulk_enroll(items: list) -> dict:
+    #matricula una lista de {"student": id, "course": id}. La validacion se hace
+    #con unas pocas consultas por conjuntos (no una por item) y el insert es un
+    #solo bulk_create dentro de una transaccion. Devuelve el resultado por item
+    started = time.perf_counter()
+    results = []
+    pairs = {}
+    for index, item in enumerate(items):
+        try:
+            pairs[index] = _pair(item)
+            results.append({"index": index, "student": pairs[index][0], "course": pairs[index][1]})
+        except ValueError as exc:
+            results.append({"index": index, "status": "error", "detail": str(exc)})
+
+    student_ids = {s for s, _ in pairs.values()}
+    course_ids = {c for _, c in pairs.values()}
+    term_id = terms.current_term_id()
+    with transaction.atomic():
+        students = set(Student.objects.filter(pk__in=student_ids).values_list("pk", flat=True))  # pylint: disable=no-member
+        #los cursos se bloquean (en orden de id para no generar deadlocks) asi
+        #ninguna otra matricula toca sus asientos hasta el commit
+        free = dict(
+            Course.objects  # pylint: disable=no-member
+            .select_for_update()
+            .filter(pk__in=course_ids)
+            .order_by("pk")
+            .annotate(free=F("capacity") - F("seats_taken"))
+            .values_list("pk", "free")
+        )
+        courses = set(free)
+        existing = set(
+            Enrollment.objects  # pylint: disable=no-member
+            .filter(student_id__in=students, course_id__in=courses, term_id=term_id)
+            .values_list("student_id", "course_id")
+        )
+        to_create = {}
+        for index, pair in pairs.items():
+            result = results[index]
+            if pair[0] not in students or pair[1] not in courses:
+                result.update(status="error", detail="Alumno o curso no encontrado.")
+            elif pair in existing or pair in to_create:
+                result.update(status="error", detail="El alumno ya esta inscripto en este curso")
+            elif free[pair[1]] <= 0:
+                result.update(status="error", detail="El curso esta completo.")
+            else:
+                free[pair[1]] -= 1
+                to_create[pair] = index
+        requested = dict(to_create)
+        created = _insert_enrollments(to_create, term_id)
+        taken = Counter()
+        for pair, index in requested.items():
+            if pair in created:
+                results[index].update(status="created", id=created[pair])
+                taken[pair[1]] += 1
+            else:
+                results[index].update(status="error", detail="El alumno ya esta inscripto en este curso")
+        for course_id, seats in taken.items():
+            Course.objects.filter(pk=course_id).update(seats_taken=F("seats_taken") + seats)  # pylint: disable=no-member
+        #bulk_create no manda post_save: la serie diaria se suma aca
+        record_enrollments(Counter({timezone.localdate(): sum(taken.values())}))
+        transaction.on_commit(lambda: enrollments_changed(created))
+
+    elapsed = time.perf_counter() - started
+    total_created = sum(1 for r in results if r.get("status") == "created")
+    logger.info("bulk_enroll: %s items, %s creadas en %.3fs", len(items), total_created, elapsed)
+    return {
+        "created": total_created,
+        "errors": len(results) - total_created,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "rows_per_sec": round(len(items) / elapsed) if elapsed else None,
+        "results": results,
+    }
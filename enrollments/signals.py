@@ -0,0 +1,102 @@
+#SIGNALS
+#cuando cambia un alumno, curso o matricula se invalidan solo los reportes
+#cacheados que lo muestran (ver report_cache.py). Las altas y bajas tambien
+#actualizan la serie diaria de stats.py en la misma transaccion
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django.utils import timezone
+
+from . import partitions, profiles, report_cache, response_cache, stats, terms
+from .models import Student, Course, Enrollment, Term
+from .search import course_document, student_document
+
+
+@receiver(pre_save, sender=Student)
+def _student_document(sender, instance, **kwargs):
+    instance.search_document = student_document(instance)
+
+@receiver(pre_save, sender=Course)
+def _course_document(sender, instance, **kwargs):
+    instance.search_document = course_document(instance)
+
+@receiver([post_save, post_delete], sender=Student)
+def _student_changed(sender, instance, **kwargs):
+    response_cache.bump("student")
+    profiles.invalidate(instance.user_id)
+    course_ids = Enrollment.objects.filter(student_id=instance.pk).values_list("course_id", flat=True)  # pylint: disable=no-member
+    report_cache.invalidate(
+        f"student-{instance.pk}", "students", "enrollments",
+        *(f"course-{course_id}" for course_id in course_ids),
+    )
+
+@receiver([post_save, post_delete], sender=Course)
+def _course_changed(sender, instance, **kwargs):
+    response_cache.bump("course")
+    student_ids = Enrollment.objects.filter(course_id=instance.pk).values_list("student_id", flat=True)  # pylint: disable=no-member
+    report_cache.invalidate(
+        f"course-{instance.pk}", "courses", "enrollments",
+        *(f"student-{student_id}" for student_id in student_ids),
+    )
+
+def enrollments_changed(pairs):
+    #pairs: (student_id, course_id) de las matriculas creadas o borradas.
+    #Se llama a mano desde los caminos que usan bulk_create, que no manda signals.
+    #Tambien cambia el seats_taken de los cursos
+    response_cache.bump("enrollment", "course")
+    scopes = {"enrollments"}
+    for student_id, course_id in pairs:
+        scopes.add(f"student-{student_id}")
+        scopes.add(f"course-{course_id}")
+    report_cache.invalidate(*scopes)
+
+@receiver([post_save, post_delete], sender=Enrollment)
+def _enrollment_changed(sender, instance, **kwargs):
+    enrollments_changed([(instance.student_id, instance.course_id)])
+
+@receiver(post_save, sender=Enrollment)
+def _enrollment_created(sender, instance, created, **kwargs):
+    if created:
+        stats.record_enrollments(Counter([timezone.localdate(instance.enrolled_at)]))
+
+@receiver(post_delete, sender=Enrollment)
+def _enrollment_deleted(sender, instance, **kwargs):
+    #libera el asiento en cualquier borrado: la vista, el admin o el cascade
+    #al borrar un alumno. Las altas toman el asiento en services.enroll.
+    #seats_taken cuenta solo el periodo actual
+    if instance.term_id == terms.current_term_id():
+        Course.objects.filter(pk=instance.course_id, seats_taken__gt=0).update(seats_taken=F("seats_taken") - 1)  # pylint: disable=no-member
+    stats.record_drops(Counter([timezone.localdate(instance.enrolled_at)]))
+
+#PERIODOS (terms.py): cada periodo nuevo tiene su particion en postgres
+@receiver(post_save, sender=Term)
+def _term_saved(sender, instance, created, **kwargs):
+    terms.invalidate()
+    if created:
+        partitions.create_partition(instance.pk)
+
+@receiver(post_delete, sender=Term)
+def _term_deleted(sender, instance, **kwargs):
+    terms.invalidate()
+    partitions.drop_partition(instance.pk)
+
+#PERFILES (profiles.py): el perfil cacheado lleva los grupos y el alumno vinculado
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, update_fields=None, **kwargs):
+    #el last_login que se guarda en cada login no es parte del perfil
+    if update_fields is not None and set(update_fields) == {"last_login"}:
+        return
+    profiles.invalidate(instance.pk)
+
+@receiver(m2m_changed, sender=User.groups.through)
+def _user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    #reverse=True cuando se cambia desde el grupo (group.user_set.add(...))
+    if action in ("post_add", "post_remove"):
+        profiles.invalidate(*(pk_set if reverse else [instance.pk]))
+    elif action == "pre_clear":
+        #en el clear no viene pk_set, se buscan los usuarios antes de borrar
+        profiles.invalidate(*(instance.user_set.values_list("pk", flat=True) if reverse else [instance.pk]))
@@ -0,0 +1,133 @@
+#ESTADISTICAS DE MATRICULACION
+#el ranking y el tablero no recorren la tabla de matriculas: los inscriptos
+#por curso en el periodo actual son seats_taken (services.py) y la serie
+#diaria es DailyEnrollmentStat, que se actualiza en la misma transaccion de
+#cada alta y baja (signals.py y bulk_enroll). El costo depende de la cantidad de cursos y
+#de dias, no de matriculas. manage.py rebuild_stats recalcula todo desde las
+#matriculas (despues de cargas con bulk_create o sql a mano)
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Q, Sum
+from django.db.models.functions import Cast, NullIf, TruncDate
+from django.utils import timezone
+
+from . import terms
+from .models import Course, DailyEnrollmentStat, Enrollment
+
+RANKING_FIELDS = ("id", "code", "title", "capacity", "seats_taken")
+
+
+def _bump(day, field: str, amount: int):
+    if not amount:
+        return
+    rows = DailyEnrollmentStat.objects.filter(day=day)  # pylint: disable=no-member
+    if not rows.update(**{field: F(field) + amount}):
+        #primera del dia; si otra transaccion la crea a la vez get_or_create la encuentra
+        DailyEnrollmentStat.objects.get_or_create(day=day)  # pylint: disable=no-member
+        rows.update(**{field: F(field) + amount})
+
+def record_enrollments(days: Counter):
+    #days: {fecha de inscripcion: cantidad}. En orden de fecha, asi dos
+    #transacciones siempre bloquean las filas en el mismo orden
+    for day, amount in sorted(days.items()):
+        _bump(day, "enrollments", amount)
+
+def record_drops(days: Counter):
+    #days: {fecha de inscripcion de las matriculas borradas: cantidad}. Salen
+    #de la serie de vigentes y se cuentan como bajas de hoy
+    for day, amount in sorted(days.items()):
+        _bump(day, "enrollments", -amount)
+    _bump(timezone.localdate(), "drops", sum(days.values()))
+
+def _fill_ratio():
+    #cursos con capacidad 0 quedan con ratio null (al final del orden)
+    return Cast(F("seats_taken"), FloatField()) / NullIf(F("capacity"), 0)
+
+def _course_row(row: dict) -> dict:
+    ratio = row.pop("fill_ratio")
+    return {**row, "fill_ratio": round(ratio, 3) if ratio is not None else None}
+
+def ranking(limit: int = 10) -> list[dict]:
+    #los mas pedidos, sale del indice course_ranking_idx
+    return [
+        _course_row(row) for row in
+        Course.objects.order_by("-seats_taken", "code")  # pylint: disable=no-member
+        .annotate(fill_ratio=_fill_ratio()).values(*RANKING_FIELDS, "fill_ratio")[:limit]
+    ]
+
+def fullest(limit: int = 10) -> list[dict]:
+    return [
+        _course_row(row) for row in
+        Course.objects.annotate(fill_ratio=_fill_ratio())  # pylint: disable=no-member
+        .order_by(F("fill_ratio").desc(nulls_last=True), "code")
+        .values(*RANKING_FIELDS, "fill_ratio")[:limit]
+    ]
+
+def totals() -> dict:
+    agg = Course.objects.aggregate(  # pylint: disable=no-member
+        courses=Count("id"),
+        enrollments=Sum("seats_taken", default=0),
+        seats=Sum("capacity", default=0),
+        full_courses=Count("id", filter=Q(seats_taken__gte=F("capacity"))),
+    )
+    agg["fill_ratio"] = round(agg["enrollments"] / agg["seats"], 3) if agg["seats"] else None
+    return agg
+
+def daily(days: int = 30) -> list[dict]:
+    #serie continua de los ultimos dias (los dias sin movimiento van en 0)
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = {
+        row["day"]: row for row in
+        DailyEnrollmentStat.objects.filter(day__gte=start, day__lte=today)  # pylint: disable=no-member
+        .values("day", "enrollments", "drops")
+    }
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day, {"enrollments": 0, "drops": 0})
+        series.append({"day": day, "enrollments": row["enrollments"], "drops": row["drops"]})
+    return series
+
+def dashboard(limit: int = 10, days: int = 30) -> dict:
+    return {
+        "totals": totals(),
+        "ranking": ranking(limit),
+        "fullest": fullest(limit),
+        "daily": daily(days),
+    }
+
+def rebuild(term_id: int | None = None) -> dict:
+    #recalcula seats_taken (matriculas del periodo actual, o de term_id) y la
+    #serie de vigentes desde la tabla de matriculas. Las bajas no se pueden
+    #reconstruir y se dejan como estan
+    term_id = term_id or terms.current_term_id()
+    with transaction.atomic():
+        #con los cursos bloqueados ninguna alta o baja cambia los conteos hasta el commit
+        seats = dict(Course.objects.select_for_update().order_by("pk").values_list("pk", "seats_taken"))  # pylint: disable=no-member
+        counts = dict(
+            Enrollment.objects.filter(term_id=term_id).order_by().values("course_id")  # pylint: disable=no-member
+            .annotate(total=Count("id")).values_list("course_id", "total")
+        )
+        courses = 0
+        for course_id, taken in seats.items():
+            if counts.get(course_id, 0) != taken:
+                Course.objects.filter(pk=course_id).update(seats_taken=counts.get(course_id, 0))  # pylint: disable=no-member
+                courses += 1
+
+        by_day = dict(
+            Enrollment.objects.annotate(day=TruncDate("enrolled_at"))  # pylint: disable=no-member
+            .order_by().values("day").annotate(total=Count("id")).values_list("day", "total")
+        )
+        current = {stat.day: stat for stat in DailyEnrollmentStat.objects.select_for_update()}  # pylint: disable=no-member
+        changed = []
+        for day in set(by_day) | set(current):
+            stat = current.get(day) or DailyEnrollmentStat(day=day)
+            if stat.pk is None or stat.enrollments != by_day.get(day, 0):
+                stat.enrollments = by_day.get(day, 0)
+                changed.append(stat)
+        DailyEnrollmentStat.objects.bulk_create([s for s in changed if s.pk is None])  # pylint: disable=no-member
+        DailyEnrollmentStat.objects.bulk_update([s for s in changed if s.pk is not None], ["enrollments"])  # pylint: disable=no-member
+    return {"courses_fixed": courses, "days_fixed": len(changed)}
@@ -0,0 +1,141 @@
+#PERIODOS LECTIVOS
+#las lecturas de matriculas de la api se limitan al periodo actual; con
+#?term=<codigo> se pide otro periodo y con ?term=all todos los que no estan
+#archivados. Los archivados se pueden leer con su codigo pero no escribir
+#(scope(..., write=True) los rechaza); en postgres sus particiones ya no
+#estan en la tabla de matriculas y se leen por el alias ARCHIVE_ALIAS (ver
+#partitions.py). Filtrar siempre por term_id hace que postgres lea una sola
+#particion (ver partitions.py) y que el indice (term, course, ...) sirva en
+#cualquier base, asi la latencia del periodo actual no crece con la historia.
+#La tabla de periodos es chica: se lee entera y se guarda en memoria del
+#proceso. Cada cambio de periodo incrementa una version en el cache de django
+#(CACHE_URL, compartido entre procesos) y cada lectura la compara, asi los
+#demas workers se enteran en la request siguiente (si no, el default de
+#Enrollment.term seguiria siendo el periodo anterior). TERM_CACHE_SECONDS
+#queda como limite cuando el cache no es compartido (locmem)
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import partitions, response_cache
+from .models import Term, WaitlistEntry
+
+logger = logging.getLogger(__name__)
+
+ALL = "all"
+#alias de solo lectura de settings.DATABASES para los periodos archivados
+ARCHIVE_ALIAS = "archive"
+_VERSION_KEY = "terms:version"
+
+_cache = None
+
+
+def _version() -> int:
+    cache = caches["default"]
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        #si el backend desalojo el contador arranca de un valor nuevo
+        cache.add(_VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+def _bump():
+    cache = caches["default"]
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.add(_VERSION_KEY, int(time.time() * 1000), None)
+
+def _terms() -> dict:
+    global _cache  # pylint: disable=global-statement
+    version = _version()
+    if _cache is None or _cache["version"] != version or _cache["expires"] < time.monotonic():
+        rows = list(Term.objects.values_list("id", "code", "is_current", "archived_at"))  # pylint: disable=no-member
+        _cache = {
+            "version": version,
+            "expires": time.monotonic() + settings.TERM_CACHE_SECONDS,
+            "current": next((pk for pk, _, current, _ in rows if current), None),
+            "codes": {code: (pk, archived is not None) for pk, code, _, archived in rows},
+            "active": [pk for pk, _, _, archived in rows if archived is None],
+            "archived": {pk for pk, _, _, archived in rows if archived is not None},
+            "partitioned": partitions.is_partitioned(),
+        }
+    return _cache
+
+def invalidate():
+    #en este proceso ya mismo; en los demas despues del commit (si se
+    #incrementa antes otro proceso podria volver a leer los datos viejos)
+    global _cache  # pylint: disable=global-statement
+    _cache = None
+    transaction.on_commit(_bump)
+
+def current_term_id() -> int | None:
+    return _terms()["current"]
+
+def resolve(value: str | None, write: bool = False) -> list[int] | None:
+    #ids de periodo para filtrar, o None si no hay periodos (no se filtra).
+    #ValueError si el codigo no existe, o si esta archivado y es para escribir
+    terms = _terms()
+    if not value:
+        return [terms["current"]] if terms["current"] is not None else None
+    if value == ALL:
+        return terms["active"]
+    try:
+        pk, archived = terms["codes"][value]
+    except KeyError:
+        raise ValueError(f"No existe el periodo {value}.")
+    if archived and write:
+        raise ValueError(f"El periodo {value} esta archivado, es solo de lectura.")
+    return [pk]
+
+def read_alias(value: str | None) -> str | None:
+    #alias de base para leer ?term=value: ARCHIVE_ALIAS si es un periodo
+    #archivado con la particion separada, None para el de siempre
+    terms = _terms()
+    ids = resolve(value)
+    if terms["partitioned"] and ids and len(ids) == 1 and ids[0] in terms["archived"]:
+        return ARCHIVE_ALIAS
+    return None
+
+def scope(queryset, value: str | None, field: str = "term_id", write: bool = False):
+    ids = resolve(value, write)
+    if ids is None:
+        return queryset
+    if not write and (alias := read_alias(value)):
+        queryset = queryset.using(alias)
+    if len(ids) == 1:
+        return queryset.filter(**{field: ids[0]})
+    return queryset.filter(**{f"{field}__in": ids})
+
+def activate(term: Term) -> tuple[Term, int]:
+    #pasa a ser el periodo actual. Los asientos ocupados se recalculan con
+    #las matriculas del periodo nuevo y se borra la lista de espera del periodo
+    #que termina (esperaba asientos que ya no se liberan). Devuelve el periodo
+    #y cuantas entradas de lista de espera se borraron
+    from .stats import rebuild  # pylint: disable=import-outside-toplevel
+    if term.archived_at is not None:
+        raise ValueError(f"El periodo {term.code} esta archivado.")
+    with transaction.atomic():
+        outgoing = list(
+            Term.objects.filter(is_current=True).exclude(pk=term.pk).values_list("pk", flat=True)  # pylint: disable=no-member
+        )
+        Term.objects.filter(pk__in=outgoing).update(is_current=False)  # pylint: disable=no-member
+        Term.objects.filter(pk=term.pk).update(is_current=True)  # pylint: disable=no-member
+        term.is_current = True
+        invalidate()
+        cleared, _ = WaitlistEntry.objects.filter(term_id__in=outgoing).delete()  # pylint: disable=no-member
+        rebuild(term_id=term.pk)
+    response_cache.bump("enrollment", "course")
+    if cleared:
+        logger.info("periodo %s activado: %s entradas de lista de espera del periodo anterior borradas",
+                    term.code, cleared)
+    return term, cleared
+
+def mark_archived(term: Term, archived: bool = True):
+    Term.objects.filter(pk=term.pk).update(archived_at=timezone.now() if archived else None)  # pylint: disable=no-member
+    invalidate()
+    response_cache.bump("enrollment")
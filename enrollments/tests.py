@@ -1,3 +1,955 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import suppress
+from datetime import timedelta
+from functools import partial
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import Group, User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+import environ
+from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import async_views, batch_reports, exports, importer, render_pool, report_cache, routers, services, stats, terms, views
+from .instrumentation import QueryBudgetExceeded
+from .jobs import enqueue, purge_expired, run_job
+from .management.commands.bench_startup import HEAVY
+from .pagination import KeysetPagination
+from .models import Course, DailyEnrollmentStat, Enrollment, ReportJob, Student, Term, WaitlistEntry
+from .reports import build_report, render_pdf, stream_report
+from .services import enroll, lock_and_promote
+from .usernames import allocate_usernames, base_username
+
+
+def _student_row(i: int) -> str:
+    return (f'{{"first_name": "Ana", "last_name": "Prueba{i}", "email": "ana{i}@test.uy", '
+            f'"id_number": "1000{i}"}}\n')
+
+
+class ImportStudentsTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _post(self, content: bytes):
+        upload = SimpleUploadedFile("alumnos.ndjson", content, content_type="application/x-ndjson")
+        return self.client.post("/api/students/import/", {"file": upload}, format="multipart")
+
+    @override_settings(STUDENT_IMPORT_BATCH=2, STUDENT_IMPORT_WORKERS=1)
+    def test_invalid_line_after_saved_batches_is_207(self):
+        #los dos primeros lotes ya se guardaron cuando aparece la linea rota
+        content = "".join(_student_row(i) for i in range(5)).encode() + b'{"first_name": \n'
+        response = self._post(content)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data["created"], 5)
+        self.assertEqual(response.data["invalid"]["row"], 6)
+        self.assertEqual(Student.objects.count(), 5)  # pylint: disable=no-member
+
+    @override_settings(STUDENT_IMPORT_BATCH=2, STUDENT_IMPORT_WORKERS=1)
+    def test_invalid_file_without_saved_rows_is_400(self):
+        response = self._post(b'{"first_name": \n' + _student_row(1).encode())
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["created"], 0)
+        self.assertEqual(Student.objects.count(), 0)  # pylint: disable=no-member
+
+    def test_json_array_is_read_piece_by_piece(self):
+        #pedazos de 5 caracteres: los elementos y los "]" y "," dentro de
+        #strings quedan partidos entre lecturas
+        text = io.StringIO(' {"a": "x],y"} ,\n{"b": [1, 2]}, 7 ]')
+        self.assertEqual(list(importer._json_array(text, size=5)), [{"a": "x],y"}, {"b": [1, 2]}, 7])  # pylint: disable=protected-access
+        self.assertEqual(list(importer._json_array(io.StringIO(" ]"), size=5)), [])  # pylint: disable=protected-access
+        rows = importer._json_array(io.StringIO('{"a": 1}, {"b": '), size=5)  # pylint: disable=protected-access
+        self.assertEqual(next(rows), {"a": 1})
+        with self.assertRaises(ValueError):
+            next(rows)
+
+    @override_settings(STUDENT_IMPORT_BATCH=2, STUDENT_IMPORT_WORKERS=1)
+    def test_unclosed_json_array_keeps_the_saved_batches(self):
+        content = ("[" + ",".join(_student_row(i) for i in range(3))).encode()
+        response = self._post(content)
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data["created"], 3)
+        self.assertEqual(Student.objects.count(), 3)  # pylint: disable=no-member
+
+    @override_settings(STUDENT_IMPORT_BATCH=2, STUDENT_IMPORT_WORKERS=2)
+    def test_passwords_are_hashed_in_the_shared_import_pool(self):
+        self.addCleanup(render_pool.close_all)
+        self.assertEqual(self._post("".join(_student_row(i) for i in range(3)).encode()).status_code, 201)
+        pool = render_pool._pools[("import", 2)]  # pylint: disable=protected-access
+        #el segundo import usa el mismo pool, no arma uno nuevo
+        self.assertEqual(self._post(_student_row(9).encode()).status_code, 201)
+        self.assertIs(render_pool._pools[("import", 2)], pool)  # pylint: disable=protected-access
+        user = Student.objects.get(id_number="10009").user  # pylint: disable=no-member
+        self.assertTrue(user.check_password("10009"))
+
+
+class UsernameTests(TestCase):
+    def test_long_names_leave_room_for_the_suffix(self):
+        base = base_username("A" * 100, "Ñ" * 100)
+        self.assertEqual(len(base), 150 - 6)
+        User.objects.create_user(base)
+        names = allocate_usernames([base, base])
+        self.assertEqual(names, [f"{base}1", f"{base}2"])
+        for name in names:
+            User.objects.create_user(name)
+        self.assertTrue(all(len(name) <= 150 for name in names))
+
+
+class KeysetPaginationTests(TestCase):
+    def test_cursor_walks_rows_in_the_same_millisecond(self):
+        #cuatro reportes con created_at distinto solo en los microsegundos
+        base = timezone.now().replace(microsecond=500000)
+        for i in range(4):
+            job = ReportJob.objects.create(report_type="students_all")  # pylint: disable=no-member
+            ReportJob.objects.filter(pk=job.pk).update(created_at=base + timedelta(microseconds=i))  # pylint: disable=no-member
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        seen, url = [], "/api/report-jobs/?page_size=1"
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["id"] for row in response.data["results"]]
+            url = response.data["next"]
+        expected = [str(pk) for pk in ReportJob.objects.order_by("-created_at", "id").values_list("pk", flat=True)]  # pylint: disable=no-member
+        self.assertEqual(seen, expected)
+        #y de vuelta hacia atras desde la ultima pagina
+        back, url = [], response.data["previous"]
+        while url:
+            response = client.get(url)
+            back = [row["id"] for row in response.data["results"]] + back
+            url = response.data["previous"]
+        self.assertEqual(back, expected[:-1])
+
+    def test_terms_with_null_start_dates_are_all_listed(self):
+        Term.objects.create(code="2030-1")  # pylint: disable=no-member
+        Term.objects.create(code="2030-2", starts_on=timezone.now().date())  # pylint: disable=no-member
+        Term.objects.create(code="2031-1")  # pylint: disable=no-member
+        client = APIClient()
+        seen, url = [], "/api/terms/?page_size=1"
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["code"] for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, list(Term.objects.order_by("-code").values_list("code", flat=True)))  # pylint: disable=no-member
+        self.assertEqual(len(seen), Term.objects.count())  # pylint: disable=no-member
+
+    def test_nullable_ordering_is_rejected(self):
+        request = Request(RequestFactory().get("/api/terms/"))
+        with self.assertRaises(ImproperlyConfigured):
+            KeysetPagination().paginate_queryset(Term.objects.order_by("-starts_on"), request)  # pylint: disable=no-member
+
+
+class DiskReportCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location, ignore_errors=True)
+
+    def _size(self) -> int:
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(self.location) for name in names)
+
+    def test_evicts_oldest_above_max_bytes_without_scanning_every_write(self):
+        cache = report_cache.DiskReportCache(self.location, max_bytes=1000, scan_every=100)
+        with mock.patch.object(cache, "_evict", wraps=cache._evict) as evict:  # pylint: disable=protected-access
+            for i in range(5):
+                cache.set("course-1", f"k{i}", b"x" * 100)
+            #solo el primer set recorre el directorio
+            self.assertEqual(evict.call_count, 1)
+            for i in range(5, 12):
+                cache.set("course-1", f"k{i}", b"x" * 100)
+        self.assertLessEqual(self._size(), 1000)
+        self.assertIsNone(cache.get("course-1", "k0"))
+        self.assertEqual(cache.get("course-1", "k11"), b"x" * 100)
+
+    def test_set_survives_a_concurrent_invalidate(self):
+        cache = report_cache.DiskReportCache(self.location)
+        mkstemp = tempfile.mkstemp
+        calls = []
+
+        def invalidated(**kwargs):
+            #la primera vez otro proceso borra el scope justo antes del mkstemp
+            calls.append(kwargs)
+            if len(calls) == 1:
+                cache.invalidate(["course-1"])
+            return mkstemp(**kwargs)
+
+        with mock.patch.object(report_cache.tempfile, "mkstemp", side_effect=invalidated):
+            cache.set("course-1", "k", b"pdf")
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.get("course-1", "k"), b"pdf")
+
+
+class ReportJobTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_params_must_be_an_object_with_known_keys(self):
+        for params in ([1], "x", {"student_id": 1}, {"engine": 3}, {"stream": "si"}):
+            response = self.client.post("/api/report-jobs/", {"report_type": "courses_all", "params": params},
+                                        format="json")
+            self.assertEqual(response.status_code, 400, params)
+        self.assertFalse(ReportJob.objects.exists())  # pylint: disable=no-member
+
+    def test_list_is_staff_only(self):
+        ReportJob.objects.create(report_type="courses_all")  # pylint: disable=no-member
+        self.assertIn(self.client.get("/api/report-jobs/").status_code, (401, 403))
+        self.client.force_authenticate(User.objects.create_user("alumno"))
+        self.assertEqual(self.client.get("/api/report-jobs/").status_code, 403)
+        self.client.force_authenticate(User.objects.create_user("admin", is_staff=True))
+        self.assertEqual(len(self.client.get("/api/report-jobs/").data["results"]), 1)
+
+    def test_purge_expired_deletes_job_and_file(self):
+        with tempfile.TemporaryDirectory() as tmp, override_settings(REPORTS_DIR=tmp, REPORT_JOB_RETENTION_HOURS=1):
+            job = run_job(enqueue("courses_all", {"engine": "html"}))
+            self.assertTrue(os.path.exists(job.file_path))
+            self.assertEqual(purge_expired(), 0)
+            self.assertEqual(purge_expired(now=timezone.now() + timedelta(hours=2)), 1)
+            self.assertFalse(os.path.exists(job.file_path))
+            self.assertFalse(ReportJob.objects.exists())  # pylint: disable=no-member
+
+
+class StreamReportTests(TestCase):
+    @override_settings(REPORT_STREAM_CHUNK=2, REPORT_CACHE=None)
+    def test_each_chunk_is_written_before_the_next_is_rendered(self):
+        from pypdf import PdfReader  # pylint: disable=import-outside-toplevel
+        students = _students(5)
+        report = build_report("students_all", {})
+        dest, written = io.BytesIO(), []
+        chunks = report["stream"]
+
+        def recording(report):
+            for html in chunks(report):
+                written.append(dest.tell())
+                yield html
+        report["stream"] = recording
+        stream_report(report, dest)
+        #tres bloques: antes de renderizar cada uno el anterior ya esta en dest
+        self.assertEqual(len(written), 3)
+        self.assertTrue(written[0] < written[1] < written[2] < dest.tell())
+        reader = PdfReader(io.BytesIO(dest.getvalue()), strict=True)
+        self.assertEqual(len(reader.pages), 3)
+        text = "".join(page.extract_text() for page in reader.pages)
+        for student in students:
+            self.assertIn(student.last_name, text)
+
+
+def _break(pool):
+    #mata un proceso del pool como lo haria el OOM killer
+    with suppress(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+
+
+@override_settings(REPORT_RENDER_WORKERS=2, REPORT_CACHE=None)
+class RenderPoolTests(TestCase):
+    def setUp(self):
+        self.addCleanup(render_pool.close_all)
+
+    def test_render_many_rebuilds_a_broken_pool(self):
+        _break(render_pool.get_pool())
+        pdfs = render_pool.render_many(partial(render_pdf, engine="html"), ["<p>a</p>", "<p>b</p>"])
+        self.assertEqual(len(pdfs), 2)
+        self.assertIn(b"<p>b</p>", pdfs[1])
+
+    def test_pools_are_per_name_and_size(self):
+        self.assertIsNot(render_pool.get_pool(2, name="batch"), render_pool.get_pool(3, name="batch"))
+        self.assertIsNot(render_pool.get_pool(2, name="batch"), render_pool.get_pool(2))
+        self.assertIs(render_pool.get_pool(2, name="batch"), render_pool.get_pool(2, name="batch"))
+
+    def test_batch_survives_a_broken_pool(self):
+        courses = [Course.objects.create(code=f"C{i}", title=f"Curso {i}") for i in range(3)]  # pylint: disable=no-member
+        student = Student.objects.create(first_name="Ana", last_name="Lopez", email="ana@test.uy", id_number="12345")  # pylint: disable=no-member
+        for course in courses:
+            Enrollment.objects.create(student=student, course=course)  # pylint: disable=no-member
+        _break(render_pool.get_pool(2, name="batch"))
+        batch = batch_reports.Batch("course", [c.pk for c in courses], engine="html")
+        with zipfile.ZipFile(io.BytesIO(b"".join(batch.iter_zip(workers=2)))) as archive:
+            self.assertEqual(len(archive.namelist()), 4)
+        self.assertEqual((batch.state["done"], batch.state["failed"]), (3, 0))
+
+
+class TermTests(TestCase):
+    def setUp(self):
+        self.current = Term.objects.get(is_current=True)  # pylint: disable=no-member
+        self.next = Term.objects.create(code="2099-1")  # pylint: disable=no-member
+        terms.invalidate()
+
+    def test_other_processes_see_the_new_current_term(self):
+        self.assertEqual(terms.current_term_id(), self.current.pk)
+        #el cache de otro worker: sigue apuntando al periodo anterior
+        stale = dict(terms._cache)  # pylint: disable=protected-access
+        with self.captureOnCommitCallbacks(execute=True):
+            terms.activate(self.next)
+        terms._cache = stale  # pylint: disable=protected-access
+        self.assertEqual(terms.current_term_id(), self.next.pk)
+        course = Course.objects.create(code="C1", title="Curso")  # pylint: disable=no-member
+        student = Student.objects.create(first_name="Ana", last_name="Lopez", email="ana@test.uy", id_number="12345")  # pylint: disable=no-member
+        self.assertEqual(Enrollment.objects.create(student=student, course=course).term_id, self.next.pk)  # pylint: disable=no-member
+
+    def test_activate_clears_only_the_outgoing_waitlist(self):
+        course = Course.objects.create(code="C1", title="Curso", capacity=0)  # pylint: disable=no-member
+        student = Student.objects.create(first_name="Ana", last_name="Lopez", email="ana@test.uy", id_number="12345")  # pylint: disable=no-member
+        other = Student.objects.create(first_name="Juan", last_name="Perez", email="juan@test.uy", id_number="54321")  # pylint: disable=no-member
+        WaitlistEntry.objects.create(student=student, course=course)  # pylint: disable=no-member
+        #una entrada que ya espera asientos del periodo siguiente
+        kept = WaitlistEntry.objects.create(student=other, course=course, term=self.next)  # pylint: disable=no-member
+        client = APIClient()
+        response = client.post(f"/api/terms/{self.next.pk}/activate/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["waitlist_cleared"], 1)
+        self.assertEqual(list(WaitlistEntry.objects.values_list("pk", flat=True)), [kept.pk])  # pylint: disable=no-member
+        #activar el que ya es actual no borra nada
+        self.assertEqual(client.post(f"/api/terms/{self.next.pk}/activate/").data["waitlist_cleared"], 0)
+
+    def test_archived_term_is_read_only(self):
+        course = Course.objects.create(code="C1", title="Curso")  # pylint: disable=no-member
+        student = Student.objects.create(first_name="Ana", last_name="Lopez", email="ana@test.uy", id_number="12345")  # pylint: disable=no-member
+        enrollment = Enrollment.objects.create(student=student, course=course, term=self.next)  # pylint: disable=no-member
+        terms.mark_archived(self.next)
+        client = APIClient()
+        response = client.get(f"/api/enrollments/?term={self.next.code}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row["id"] for row in response.data["results"]], [enrollment.pk])
+        self.assertEqual(client.get("/api/enrollments/?term=all").data["results"], [])
+        response = client.patch(f"/api/enrollments/{enrollment.pk}/?term={self.next.code}", {}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("term", response.data)
+        self.assertEqual(client.get("/api/enrollments/?term=no-existe").status_code, 400)
+
+
+def _students(count: int) -> list[Student]:
+    return [Student.objects.create(first_name="Ana", last_name=f"Prueba{i}", email=f"ana{i}@test.uy",  # pylint: disable=no-member
+                                   id_number=f"2000{i}") for i in range(count)]
+
+
+class WaitlistTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        self.client = APIClient()
+        self.course = Course.objects.create(code="C1", title="Curso", capacity=1)  # pylint: disable=no-member
+        self.first, *self.waiting = _students(4)
+        self.enrollment = enroll(self.first.pk, self.course.pk)
+
+    def _join(self, student):
+        return self.client.post("/api/waitlist/", {"student": student.pk, "course": self.course.pk}, format="json")
+
+    def _positions(self) -> list[tuple[int, int]]:
+        rows = self.client.get(f"/api/waitlist/?course={self.course.pk}").data["results"]
+        return [(row["student"], row["position"]) for row in rows]
+
+    def test_positions_are_fifo(self):
+        for position, student in enumerate(self.waiting, start=1):
+            response = self._join(student)
+            self.assertEqual(response.status_code, 201)
+            self.assertFalse(response.data["enrolled"])
+            self.assertEqual(response.data["waitlist"]["position"], position)
+        self.assertEqual(self._positions(), [(s.pk, i) for i, s in enumerate(self.waiting, start=1)])
+        self.assertEqual(self._join(self.waiting[0]).status_code, 400)
+
+    def test_drop_promotes_the_head(self):
+        for student in self.waiting:
+            self._join(student)
+        self.assertEqual(self.client.delete(f"/api/enrollments/{self.enrollment.pk}/").status_code, 204)
+        self.assertTrue(Enrollment.objects.filter(student=self.waiting[0], course=self.course).exists())  # pylint: disable=no-member
+        self.assertEqual(self._positions(), [(self.waiting[1].pk, 1), (self.waiting[2].pk, 2)])
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 1)
+
+    def test_lock_and_promote_skips_enrolled_students(self):
+        head, second, _ = self.waiting
+        self._join(head)
+        self._join(second)
+        #la cabeza de la cola se matriculo por otro lado mientras esperaba
+        Course.objects.filter(pk=self.course.pk).update(capacity=3)  # pylint: disable=no-member
+        enroll(head.pk, self.course.pk)
+        promoted = lock_and_promote(self.course.pk)
+        self.assertEqual([e.student_id for e in promoted], [second.pk])
+        self.assertFalse(WaitlistEntry.objects.filter(course=self.course).exists())  # pylint: disable=no-member
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 3)
+
+
+class BulkEnrollTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        self.client = APIClient()
+        self.students = _students(4)
+        self.course = Course.objects.create(code="C1", title="Curso", capacity=2)  # pylint: disable=no-member
+        self.other = Course.objects.create(code="C2", title="Otro", capacity=10)  # pylint: disable=no-member
+
+    def _bulk(self, pairs):
+        items = [{"student": s.pk, "course": c.pk} for s, c in pairs]
+        response = self.client.post("/api/enrollments/bulk/", items, format="json")
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def _assert_counters(self):
+        #seats_taken y la serie diaria coinciden con las filas de verdad
+        for course in (self.course, self.other):
+            course.refresh_from_db()
+            self.assertEqual(course.seats_taken, Enrollment.objects.filter(course=course).count())  # pylint: disable=no-member
+        stat = DailyEnrollmentStat.objects.filter(day=timezone.localdate()).first()  # pylint: disable=no-member
+        self.assertEqual(stat.enrollments if stat else 0, Enrollment.objects.count())  # pylint: disable=no-member
+
+    def test_duplicates_existing_pairs_and_full_courses(self):
+        first, second, third, fourth = self.students
+        enroll(first.pk, self.other.pk)
+        #second ya esta en C2 sin pedirlo: el cruce (second, C2) no se cuenta
+        enroll(second.pk, self.other.pk)
+        data = self._bulk([
+            (first, self.other),   # ya matriculado
+            (second, self.course),
+            (second, self.course),  # repetido en el mismo lote
+            (third, self.course),
+            (fourth, self.course),  # el curso se lleno a mitad del lote
+        ])
+        self.assertEqual([r["status"] for r in data["results"]], ["error", "created", "error", "created", "error"])
+        self.assertEqual(data["created"], 2)
+        self.assertEqual(data["results"][4]["detail"], "El curso esta completo.")
+        created = Enrollment.objects.filter(course=self.course).order_by("id")  # pylint: disable=no-member
+        self.assertEqual([data["results"][1]["id"], data["results"][3]["id"]], [e.pk for e in created])
+        self._assert_counters()
+
+    def test_pair_enrolled_by_another_request_is_not_counted(self):
+        first, second, *_ = self.students
+        insert = services._insert_enrollments  # pylint: disable=protected-access
+
+        def race(to_create, term_id):
+            #otra request matricula (first, C1) entre la validacion y el insert
+            Enrollment.objects.create(student=first, course=self.course)  # pylint: disable=no-member
+            Course.objects.filter(pk=self.course.pk).update(seats_taken=F("seats_taken") + 1)  # pylint: disable=no-member
+            return insert(to_create, term_id)
+
+        with mock.patch.object(services, "_insert_enrollments", race):
+            data = self._bulk([(first, self.course), (second, self.course), (second, self.other)])
+        self.assertEqual([r["status"] for r in data["results"]], ["error", "created", "created"])
+        self.assertEqual(data["created"], 2)
+        self._assert_counters()
+
+
+class StatsConsistencyTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        self.client = APIClient()
+        self.courses = [Course.objects.create(code=f"C{i}", title="Curso", capacity=2 + i) for i in range(3)]  # pylint: disable=no-member
+
+    def _assert_matches_counts(self, drops: int):
+        #los contadores mantenidos a mano contra COUNT(*) sobre las matriculas
+        term_id = terms.current_term_id()
+        counts = {c.pk: Enrollment.objects.filter(course=c, term_id=term_id).count() for c in self.courses}  # pylint: disable=no-member
+        for course in self.courses:
+            course.refresh_from_db()
+            self.assertEqual(course.seats_taken, counts[course.pk])
+        dashboard = stats.dashboard()
+        self.assertEqual(dashboard["totals"]["enrollments"], sum(counts.values()))
+        self.assertEqual(dashboard["totals"]["full_courses"],
+                         sum(1 for c in self.courses if counts[c.pk] >= c.capacity))
+        self.assertEqual({row["id"]: row["seats_taken"] for row in dashboard["ranking"]}, counts)
+        today = dashboard["daily"][-1]
+        self.assertEqual(today["day"], timezone.localdate())
+        self.assertEqual(today["enrollments"], Enrollment.objects.count())  # pylint: disable=no-member
+        self.assertEqual(today["drops"], drops)
+
+    def test_counters_follow_enroll_bulk_drop_and_activate(self):
+        students = _students(6)
+        first, second, *rest = students
+        for student in (first, second):
+            response = self.client.post("/api/enrollments/", {"student": student.pk, "course": self.courses[0].pk}, format="json")
+            self.assertEqual(response.status_code, 201)
+        items = [{"student": s.pk, "course": c.pk} for s in rest for c in self.courses[1:]]
+        self.assertEqual(self.client.post("/api/enrollments/bulk/", items, format="json").data["created"], 7)
+        self._assert_matches_counts(drops=0)
+
+        self.client.post("/api/waitlist/", {"student": rest[0].pk, "course": self.courses[0].pk}, format="json")
+        dropped = Enrollment.objects.get(student=first, course=self.courses[0])  # pylint: disable=no-member
+        #la baja promueve al de la lista de espera
+        self.assertEqual(self.client.delete(f"/api/enrollments/{dropped.pk}/").status_code, 204)
+        self.assertTrue(Enrollment.objects.filter(student=rest[0], course=self.courses[0]).exists())  # pylint: disable=no-member
+        self._assert_matches_counts(drops=1)
+
+        #el periodo nuevo ya tiene matriculas; al activarlo rebuild recalcula todo
+        upcoming = Term.objects.create(code="2099-1")  # pylint: disable=no-member
+        Enrollment.objects.create(student=second, course=self.courses[2], term=upcoming)  # pylint: disable=no-member
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post(f"/api/terms/{upcoming.pk}/activate/").status_code, 200)
+        self.assertEqual(terms.current_term_id(), upcoming.pk)
+        self._assert_matches_counts(drops=1)
+
+
+@override_settings(EXPORT_CHUNK=2)
+class ExportTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        self.client = APIClient()
+        self.course = Course.objects.create(code="C1", title="Curso", capacity=10)  # pylint: disable=no-member
+        self.students = _students(5)
+        for student in self.students:
+            enroll(student.pk, self.course.pk)
+        #una del periodo siguiente, que no sale sin ?term=
+        self.upcoming = Term.objects.create(code="2099-1")  # pylint: disable=no-member
+        Enrollment.objects.create(student=self.students[0], course=self.course, term=self.upcoming)  # pylint: disable=no-member
+        #iter_rows contando las filas que ya se leyeron de la base
+        self.pulled = []
+        iter_rows = exports.iter_rows
+
+        def rows(*args, **kwargs):
+            for row in iter_rows(*args, **kwargs):
+                self.pulled.append(row)
+                yield row
+
+        patcher = mock.patch.object(exports, "iter_rows", rows)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self, url: str) -> tuple[StreamingHttpResponse, str]:
+        self.pulled.clear()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, StreamingHttpResponse)
+        #nada se lee hasta que se consume, y sale de a EXPORT_CHUNK filas: el
+        #primer bloque no lee toda la tabla
+        self.assertEqual(self.pulled, [])
+        chunks = iter(response.streaming_content)
+        first = next(chunks)
+        self.assertLessEqual(len(self.pulled), settings.EXPORT_CHUNK)
+        return response, (first + b"".join(chunks)).decode("utf-8")
+
+    def test_csv(self):
+        response, body = self._get("/api/enrollments/export/")
+        self.assertEqual(response["Content-Type"], exports.FORMATS["csv"])
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(rows[0], [name for name, _ in exports.ENROLLMENTS_FULL])
+        self.assertEqual(len(rows) - 1, 5)
+        self.assertEqual({row[5] for row in rows[1:]}, {Term.objects.get(is_current=True).code})  # pylint: disable=no-member
+        _, body = self._get(f"/api/enrollments/export/?term={self.upcoming.code}")
+        self.assertEqual(len(body.splitlines()), 2)
+
+    def test_ndjson(self):
+        response, body = self._get(f"/api/courses/{self.course.pk}/students/?export=ndjson")
+        self.assertEqual(response["Content-Type"], exports.FORMATS["ndjson"])
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(list(rows[0]), [name for name, _ in exports.COURSE_STUDENTS])
+        self.assertEqual(sorted(row["student_id"] for row in rows), sorted(s.pk for s in self.students))
+        _, body = self._get(f"/api/courses/{self.course.pk}/students/?export=ndjson&term={self.upcoming.code}")
+        self.assertEqual([json.loads(line)["student_id"] for line in body.splitlines()], [self.students[0].pk])
+
+    def test_unknown_format_is_400(self):
+        self.assertEqual(self.client.get("/api/enrollments/export/?export=xml").status_code, 400)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.jose = Student.objects.create(first_name="José", last_name="Núñez", email="Jose.Nunez@Test.uy",  # pylint: disable=no-member
+                                           id_number="4.123.456-7")
+        self.other = Student.objects.create(first_name="Ana", last_name="Lopez", email="ana@test.uy",  # pylint: disable=no-member
+                                            id_number="52345678")
+
+    def _search(self, term: str, url: str = "/api/students/") -> list[int]:
+        response = self.client.get(url, {"search": term})
+        self.assertEqual(response.status_code, 200)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_document_follows_name_and_email_changes(self):
+        self.assertEqual(self.jose.search_document, "jose nunez jose.nunez@test.uy 4.123.456-7")
+        self.jose.last_name = "Pérez"
+        self.jose.email = "jperez@test.uy"
+        self.jose.save()
+        self.jose.refresh_from_db()
+        self.assertEqual(self.jose.search_document, "jose perez jperez@test.uy 4.123.456-7")
+        #tambien por la api (PATCH)
+        response = self.client.patch(f"/api/students/{self.jose.pk}/", {"first_name": "Josefa"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.jose.refresh_from_db()
+        self.assertTrue(self.jose.search_document.startswith("josefa perez "))
+        course = Course.objects.create(code="MAT-1", title="Álgebra")  # pylint: disable=no-member
+        self.assertEqual(course.search_document, "mat-1 algebra")
+
+    def test_id_number_prefix(self):
+        self.assertEqual(self._search("4.123"), [self.jose.pk])
+        self.assertEqual(self._search("5234"), [self.other.pk])
+
+    @unittest.skipIf(connection.vendor == "postgresql", "el LIKE es el camino de sqlite")
+    def test_sqlite_contains_fallback(self):
+        self.assertEqual(self._search("JOS núñ"), [self.jose.pk])
+        self.assertEqual(self._search("test.uy"), [self.other.pk, self.jose.pk])
+        #sin indice de trigramas no hay tolerancia a errores de tipeo
+        self.assertEqual(self._search("nunes"), [])
+        self.assertEqual(self._search("!!"), [])
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "texto completo y trigramas son de postgres")
+    def test_postgres_prefix_and_typo_search(self):
+        self.assertEqual(self._search("jos nun"), [self.jose.pk])
+        self.assertEqual(self._search("nunes"), [self.jose.pk])
+        #por relevancia: el que coincide en nombre y apellido primero
+        tocayo = Student.objects.create(first_name="José", last_name="Lopez", email="jl@test.uy",  # pylint: disable=no-member
+                                        id_number="61234567")
+        self.assertEqual(self._search("jose lopez")[0], tocayo.pk)
+        Course.objects.create(code="MAT-1", title="Álgebra lineal")  # pylint: disable=no-member
+        self.assertEqual(len(self._search("algebra lin", url="/api/courses/")), 1)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        caches[settings.RESPONSE_CACHE["ALIAS"]].clear()
+        self.client = APIClient()
+        self.course = Course.objects.create(code="C1", title="Curso")  # pylint: disable=no-member
+        self.student, = _students(1)
+
+    def _etag(self, url: str) -> str:
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_if_none_match_is_304_without_queries(self):
+        first = self.client.get("/api/courses/")
+        self.assertEqual(first["X-Cache"], "MISS")
+        second = self.client.get("/api/courses/")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, first.content)
+        with self.assertNumQueries(0):
+            response = self.client.get("/api/courses/", HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], first["ETag"])
+        #otra url (otros parametros) es otra clave
+        self.assertNotEqual(self._etag("/api/courses/?ordering=title"), first["ETag"])
+
+    def test_writes_change_the_etag(self):
+        urls = ["/api/students/", "/api/courses/", f"/api/enrollments/by-course/{self.course.pk}/"]
+        writes = {
+            "student": lambda: Student.objects.filter(pk=self.student.pk).first().save(),  # pylint: disable=no-member
+            "course": lambda: Course.objects.filter(pk=self.course.pk).first().save(),  # pylint: disable=no-member
+            "enrollment": lambda: enroll(self.student.pk, self.course.pk),
+        }
+        #que urls tienen que cambiar con cada escritura (by-course muestra datos
+        #del alumno; las matriculas cambian seats_taken, asi que tambien el
+        #listado de cursos)
+        changes = {
+            "student": {urls[0], urls[2]},
+            "course": {urls[1]},
+            "enrollment": {urls[1], urls[2]},
+        }
+        for model, write in writes.items():
+            before = {url: self._etag(url) for url in urls}
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            for url in urls:
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=before[url])
+                if url in changes[model]:
+                    self.assertEqual(response.status_code, 200, (model, url))
+                    self.assertNotEqual(response["ETag"], before[url])
+                else:
+                    self.assertEqual(response.status_code, 304, (model, url))
+
+
+class _NotOwner(AllowAny):
+    def has_object_permission(self, request, view, obj):
+        return False
+
+
+@override_settings(RESPONSE_CACHE={**settings.RESPONSE_CACHE, "ENABLED": False})
+class LeanReadTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        self.client = APIClient()
+        self.course = Course.objects.create(code="C1", title="Curso")  # pylint: disable=no-member
+        for student in _students(3):
+            enroll(student.pk, self.course.pk)
+
+    def test_output_matches_the_serializer(self):
+        for viewset, url in ((views.StudentViewSet, "/api/students/"), (views.CourseViewSet, "/api/courses/"),
+                             (views.EnrollmentViewSet, "/api/enrollments/")):
+            pk = viewset.queryset.model.objects.order_by("-pk").values_list("pk", flat=True).first()
+            for path in (url, f"{url}{pk}/"):
+                with override_settings(LEAN_READS=True):
+                    lean = self.client.get(path)
+                with override_settings(LEAN_READS=False):
+                    full = self.client.get(path)
+                self.assertEqual(lean.status_code, 200, path)
+                #mismo json, incluidas fechas y decimales
+                self.assertEqual(lean.content, full.content, path)
+
+    @override_settings(LEAN_READS=True)
+    def test_retrieve_checks_object_permissions(self):
+        enrollment = Enrollment.objects.first()  # pylint: disable=no-member
+        self.client.force_authenticate(User.objects.create_user("otro"))
+        with mock.patch.object(views.EnrollmentViewSet, "permission_classes", [_NotOwner]):
+            self.assertEqual(self.client.get(f"/api/enrollments/{enrollment.pk}/").status_code, 403)
+            #el listado no tiene objeto: no pasa por has_object_permission
+            self.assertEqual(self.client.get("/api/enrollments/").status_code, 200)
+        self.assertEqual(self.client.get(f"/api/enrollments/{enrollment.pk}/").status_code, 200)
+
+
+class DatabaseSettingsTests(unittest.TestCase):
+    def _load(self, **extra) -> dict:
+        #corre settings.py con solo estas variables (sin leer el .env)
+        base = {"DB_NAME": "x", "DB_USER": "x", "DB_PASSWORD": "x", "DB_HOST": "x", "DB_PORT": "5432",
+                "SECRET_KEY": "x"}
+        with mock.patch.dict(os.environ, {**base, **extra}, clear=True), \
+                mock.patch.object(environ.Env, "read_env"):
+            return runpy.run_path(str(settings.BASE_DIR / "psis_api" / "settings.py"))["DATABASES"]
+
+    def test_conn_max_age_without_pool(self):
+        self.assertEqual(self._load()["default"]["CONN_MAX_AGE"], 60)
+        default = self._load(DB_CONN_MAX_AGE="0")["default"]
+        self.assertEqual(default["CONN_MAX_AGE"], 0)
+        self.assertNotIn("pool", default.get("OPTIONS", {}))
+
+    def test_pool(self):
+        databases = self._load(DB_POOL="True", DB_POOL_MAX_SIZE="4", DB_REPLICA_URLS="postgres://u:p@replica:5432/db")
+        self.assertEqual(databases["default"]["CONN_MAX_AGE"], 0)
+        self.assertEqual(databases["default"]["OPTIONS"]["pool"]["max_size"], 4)
+        #las replicas y el archivo usan la misma configuracion de conexion
+        self.assertEqual(databases["replica1"]["OPTIONS"]["pool"]["max_size"], 4)
+        self.assertEqual(databases["archive"]["OPTIONS"]["pool"]["max_size"], 4)
+        self.assertEqual(self._load(DB_POOL="True", DB_CONN_MAX_AGE="0")["default"]["CONN_MAX_AGE"], 0)
+
+    def test_pool_and_conn_max_age_together_is_an_error(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self._load(DB_POOL="True", DB_CONN_MAX_AGE="60")
+
+
+#en un interprete nuevo (el de los tests ya importo todo): que modulos pesados
+#estan cargados despues de las urls, de pedir el esquema y de un pdf
+_LAZY_PROBE = """
+import json, sys
+import django
+django.setup()
+from django.test import Client
+from django.urls import get_resolver
+import psis_api.urls
+get_resolver().url_patterns
+
+def loaded():
+    return [m for m in HEAVY if m in sys.modules]
+
+result = {"urls": loaded()}
+result["schema_status"] = Client().get("/api/schema/").status_code
+result["schema"] = loaded()
+from enrollments.reports import render_pdf
+render_pdf("<p>x</p>", "xhtml2pdf")
+result["pdf"] = loaded()
+print(json.dumps(result))
+"""
+
+
+class LazyImportTests(unittest.TestCase):
+    def test_heavy_modules_load_with_their_view(self):
+        proc = subprocess.run([sys.executable, "-c", f"HEAVY = {HEAVY!r}\n{_LAZY_PROBE}"], cwd=settings.BASE_DIR,
+                              env=os.environ.copy(), capture_output=True, text=True, check=False)
+        self.assertEqual(proc.returncode, 0, proc.stderr[-2000:])
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        self.assertEqual(result["urls"], [])
+        self.assertEqual(result["schema_status"], 200)
+        self.assertEqual(set(result["schema"]), {"drf_spectacular.generators", "drf_spectacular.views"})
+        self.assertIn("xhtml2pdf", result["pdf"])
+        self.assertNotIn("weasyprint", result["pdf"])
+
+
+#sin cache de respuestas: se cuentan las consultas de armar la respuesta
+@override_settings(QUERY_BUDGET_STRICT=True, RESPONSE_CACHE={**settings.RESPONSE_CACHE, "ENABLED": False})
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        terms.invalidate()
+        courses = [Course.objects.create(code=f"C{i}", title=f"Curso {i}", capacity=10) for i in range(3)]  # pylint: disable=no-member
+        for student in _students(5):
+            for course in courses:
+                enroll(student.pk, course.pk)
+        self.student, self.course = student, courses[0]
+        #con token: el presupuesto incluye la consulta del usuario
+        token = RefreshToken.for_user(User.objects.create_user("alumno")).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_list_endpoints_stay_within_budget(self):
+        #QueryBudgetExceeded corta el test si una vista se pasa de su @query_budget
+        urls = [
+            "/api/students/", f"/api/students/{self.student.pk}/", f"/api/students/{self.student.pk}/courses/",
+            "/api/courses/", f"/api/courses/{self.course.pk}/", f"/api/courses/{self.course.pk}/students/",
+            f"/api/enrollments/by-course/{self.course.pk}/", f"/api/enrollments/by-student/{self.student.pk}/",
+            "/api/stats/", "/auth/me/",
+        ]
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIsNotNone(response.wsgi_request.query_budget, url)
+            self.assertLessEqual(int(response["X-Query-Count"]), response.wsgi_request.query_budget, url)
+
+    def test_strict_budget_fails_the_request(self):
+        with mock.patch.object(views.StudentViewSet.list, "query_budget", 1), self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/students/")
+
+
+def _list_view():
+    pass
+_list_view.actions = {"get": "list"}
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("alumno", password="clave-segura")
+        self.client = APIClient()
+        response = self.client.post("/auth/login/", {"username": "alumno", "password": "clave-segura"}, format="json")
+        self.refresh = response.data["refresh"]
+        self.assertEqual(AccessToken(response.data["access"])["groups"], [])
+
+    def test_refresh_reads_the_current_profile(self):
+        self.user.groups.add(Group.objects.create(name="docentes"))
+        response = self.client.post("/auth/token/refresh/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AccessToken(response.data["access"])["groups"], ["docentes"])
+
+    def test_deleted_user_cannot_refresh(self):
+        self.user.delete()
+        response = self.client.post("/auth/token/refresh/", {"refresh": self.refresh}, format="json")
+        self.assertEqual(response.status_code, 401)
+
+
+class ReplicaPinTests(TestCase):
+    def setUp(self):
+        for name in ("replica_aliases", "healthy_replicas"):
+            patcher = mock.patch.object(routers, name, return_value=["replica1"])
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        #el alias elegido queda en el contextvar: que no afecte a otros tests
+        self.addCleanup(routers._read_alias.set, None)  # pylint: disable=protected-access
+        self.middleware = routers.ReplicaMiddleware(lambda request: HttpResponse(status=201))
+        self.factory = RequestFactory()
+
+    def _auth(self, username: str) -> dict:
+        token = RefreshToken.for_user(User.objects.create_user(username)).access_token
+        return {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def _read_alias_for(self, headers: dict) -> str | None:
+        request = self.factory.get("/api/enrollments/", **headers)
+        routers._read_alias.set(None)  # pylint: disable=protected-access
+        self.middleware.process_view(request, _list_view, (), {})
+        return routers.read_alias()
+
+    def test_write_pins_the_user_without_the_cookie(self):
+        writer, other = self._auth("alumno"), self._auth("otro")
+        response = self.middleware(self.factory.post("/api/enrollments/", **writer))
+        self.assertIn(routers.PIN_COOKIE, response.cookies)
+        #el mismo usuario desde un cliente sin la cookie lee del primario
+        self.assertIsNone(self._read_alias_for(writer))
+        self.assertEqual(self._read_alias_for(other), "replica1")
+        self.assertEqual(self._read_alias_for({}), "replica1")
+
+
+class AsyncAccessTests(TransactionTestCase):
+    #las vistas async leen en threads con su propia conexion: sin la
+    #transaccion de TestCase, para que vean el usuario creado en el test
+    serialized_rollback = True
+
+    def setUp(self):
+        token = RefreshToken.for_user(User.objects.create_user("alumno")).access_token
+        self.bearer = {"HTTP_AUTHORIZATION": f"Bearer {token}"}
+
+    def test_invalid_token_is_401_like_the_sync_view(self):
+        bad = {"HTTP_AUTHORIZATION": "Bearer no-es-un-token"}
+        self.assertEqual(self.client.get("/api/students/", **bad).status_code, 401)
+        self.assertEqual(self.client.get("/api/async/students/", **bad).status_code, 401)
+
+    def test_viewset_permissions_apply(self):
+        with mock.patch.object(views.StudentViewSet, "permission_classes", [IsAuthenticated]):
+            response = self.client.get("/api/async/students/")
+            self.assertEqual(response.status_code, 401)
+            self.assertEqual(response["WWW-Authenticate"], 'Bearer realm="api"')
+            self.assertEqual(self.client.get("/api/async/students/", **self.bearer).status_code, 200)
+            self.assertEqual(self.client.get("/api/async/students/1/report-pdf/").status_code, 401)
+        self.assertEqual(self.client.get("/api/async/students/").status_code, 200)
+
+    def test_report_cache_hit_does_not_load_the_rows(self):
+        _students(3)
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+                REPORT_RENDER_WORKERS=1, REPORT_CACHE={"BACKEND": "enrollments.report_cache.DiskReportCache",
+                                                       "OPTIONS": {"location": tmp}}):
+            report_cache._backend = None  # pylint: disable=protected-access
+            self.addCleanup(setattr, report_cache, "_backend", None)
+            render = async_to_sync(async_views._render_report)  # pylint: disable=protected-access
+            with mock.patch.object(async_views, "_gather_context", wraps=async_views._gather_context) as gather:  # pylint: disable=protected-access
+                first = render(build_report("students_all", {"engine": "html"}))
+                second = render(build_report("students_all", {"engine": "html"}))
+            self.assertEqual(first, second)
+            self.assertEqual(gather.call_count, 1)
+
+
+class SeatCapacityTests(TransactionTestCase):
+    #sin la transaccion envolvente de TestCase: cada alta confirma como en
+    #produccion. serialized_rollback recupera el periodo de la migracion
+    serialized_rollback = True
+
+    def setUp(self):
+        terms.invalidate()
+        self.course = Course.objects.create(code="C1", title="Curso", capacity=2)  # pylint: disable=no-member
+
+    def _enroll(self, student, client=None):
+        client = client or APIClient()
+        return client.post("/api/enrollments/", {"student": student.pk, "course": self.course.pk}, format="json")
+
+    def test_full_course_is_409(self):
+        first, second, third = _students(3)
+        self.assertEqual(self._enroll(first).status_code, 201)
+        self.assertEqual(self._enroll(second).status_code, 201)
+        self.assertEqual(self._enroll(third).status_code, 409)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 2)  # pylint: disable=no-member
+        #la baja libera el asiento
+        APIClient().delete(f"/api/enrollments/{Enrollment.objects.get(student=first).pk}/")  # pylint: disable=no-member
+        self.assertEqual(self._enroll(third).status_code, 201)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 2)
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "sqlite serializa las escrituras de toda la base")
+    def test_concurrent_enrollments_never_overbook(self):
+        students = _students(12)
+
+        def enroll(student):
+            try:
+                return self._enroll(student).status_code
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            codes = list(pool.map(enroll, students))
+        self.assertEqual(sorted(codes), [201] * 2 + [409] * 10)
+        self.course.refresh_from_db()
+        self.assertEqual(self.course.seats_taken, 2)
+        self.assertEqual(Enrollment.objects.filter(course=self.course).count(), 2)  # pylint: disable=no-member
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        #el mismo chequeo que corre CI sobre un dataset chico (CommandError si
+        #una consulta deja su indice); las tablas con menos de min_rows filas
+        #(cursos, lista de espera, reportes) se saltean
+        out = io.StringIO()
+        call_command("check_query_plans", generate=1500, min_rows=1000, stdout=out)
+        self.assertNotIn("!!", out.getvalue())
+        self.assertIn("ok alumnos de un curso", out.getvalue())
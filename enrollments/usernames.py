@@ -0,0 +1,62 @@
+#NOMBRES DE USUARIO
+#los usuarios de los alumnos se llaman nombre.apellido (sin tildes), con un
+#numero al final si ya existe
+import re
+import unicodedata
+
+from django.contrib.auth.models import User
+
+#la base se corta para que con el numero del final (hasta 6 cifras) entre en
+#el max_length de User.username
+MAX_LENGTH = User._meta.get_field("username").max_length  # pylint: disable=protected-access
+SUFFIX_DIGITS = 6
+
+
+def fold(text: str) -> str:
+    #minusculas y sin tildes: "José Núñez" -> "jose nunez". Lo usan los
+    #usernames y el buscador (search.py), asi los dos normalizan igual
+    #unicodedata.normalize("NFKD", text) significa que separa los carecteres raros,
+    # los acentos o caracteres especiales
+    #.encode("ascii", "ignore") primero separa tildes y caracteres especiales,
+    # esto devuelve bytes ASCII
+    #.decode("ascii") es para volver esos bytes a str python
+    text = unicodedata.normalize("NFKD", (text or "").lower())
+    return text.encode("ascii", "ignore").decode("ascii")
+
+#def palabra para definir funciones
+#los parametros se declaran asi y el retorno con una flecha
+def base_username(first_name: str, last_name: str) -> str:
+    #agarra solo el primer nombre o primer apellido
+    fn = ((first_name or "").split() or [""])[0]
+    ln = ((last_name or "").split() or [""])[0]
+
+    #une el primer nombre con el primer apellido con un punto
+    base = fold(f"{fn}.{ln}")
+    #lo del return es un regex para limpiar todos los caracteres
+    # que no sean letras numeros puntos y guiones
+    return (re.sub(r"[^a-z0-9._-]", "", base) or "user")[:MAX_LENGTH - SUFFIX_DIGITS]
+
+def allocate_usernames(bases: list[str]) -> list[str]:
+    #para las importaciones: una sola consulta por prefijo (base distinta)
+    #en vez de una por candidato. Devuelve un username libre para cada base,
+    #en el mismo orden
+    taken = {}
+    for base in set(bases):
+        taken[base] = set(
+            User.objects.filter(username__startswith=base).values_list("username", flat=True)
+        )
+    next_suffix = {}
+    result = []
+    for base in bases:
+        if base not in taken[base]:
+            candidate = base
+        else:
+            #los sufijos se prueban en orden desde el ultimo que se uso en este lote
+            i = next_suffix.get(base, 1)
+            while f"{base}{i}" in taken[base]:
+                i += 1
+            candidate = f"{base}{i}"
+            next_suffix[base] = i + 1
+        taken[base].add(candidate)
+        result.append(candidate)
+    return result
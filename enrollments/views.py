@@ -1,174 +1,185 @@
 from datetime import datetime
-import unicodedata, re
-from django.db.models import Count
-from django.contrib.auth.models import User, Group
-from django.http import HttpResponse, Http404
-from django.template.loader import get_template
+import os
+import tempfile
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.http import FileResponse, HttpResponse, Http404, StreamingHttpResponse
 
-from rest_framework import viewsets, filters, status
+from rest_framework import viewsets, filters, status, mixins
+from rest_framework.exceptions import APIException, ValidationError
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAdminUser
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema
 
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
-from .auth_serializers import LoginSerializer
-
-from xhtml2pdf import pisa
-
-from .models import Student, Course, Enrollment
-from .serializers import StudentSerializer, CourseSerializer, EnrollmentSerializer
-
-
-#def palabra para definir funciones
-#el nombre, por convencion al pensarla como una funcion privada empieza con _ el nombre
-#los parametros se declaran asi y el retorno con una flecha
-def _base_username(first_name: str, last_name: str) -> str:
-    #agarra solo el primer nombre o primer apellido
-    fn = (first_name or "").split()[0]
-    ln = (last_name or "").split()[0]
-
-    #une el primer nombre con el primer apellido con un punto
-    base = f"{fn}.{ln}".lower()
-    #unicodedata.normalize("NFKD", base) significa que separa los carecteres raros,
-    # los acentos o caracteres especiales
-    #.encode("ascii", "ignore") primero separa tildes y caracteres especiales,
-    # esto devuelve bytes ASCII
-    #.decode("ascii") es para volver esos bytes a str python
-    #lo del return es un regex para limpiar todos los caracteres
-    # que no sean letras numeros puntos y guiones
-    base = unicodedata.normalize("NFKD", base).encode("ascii", "ignore").decode("ascii")
-    return re.sub(r"[^a-z0-9._-]", "", base) or "user"
-
-def _unique_username(base: str) -> str:
-    if not User.objects.filter(username=base).exists():
-        return base
-    i = 1
-    while True:
-        candidate = f"{base}{i}"
-        if not User.objects.filter(username=base).exists():
-            return candidate
-        i += 1
+from .auth_serializers import PROFILE_CLAIMS, LoginSerializer, RefreshSerializer
+
+from . import batch_reports, exports, profiles, response_cache, stats, terms
+from .db import pool_stats
+from .importer import import_students, read_rows
+from .instrumentation import query_budget, timed
+from .jobs import enqueue, queue_stats
+from .lean import LeanReadMixin
+from .models import Student, Course, Enrollment, ReportJob, Term, WaitlistEntry
+from .reports import ReportError, build_report, can_stream, render_report, stream_report
+from .response_cache import cached_response
+from .search import DocumentSearchFilter
+from .serializers import (
+    StudentSerializer, CourseSerializer, EnrollmentSerializer, ReportJobSerializer, TermSerializer,
+    WaitlistEntrySerializer,
+)
+from .services import (
+    AlreadyEnrolledError, CourseFullError, OnWaitlistError,
+    bulk_enroll, drop, enroll, join_waitlist, lock_and_promote, promote_waitlist, take_seat,
+)
+
+
+#409 para cuando el curso no tiene asientos libres
+class CourseFull(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "El curso esta completo."
+    default_code = "course_full"
+
 @extend_schema(tags=["Students"])
-class StudentViewSet(viewsets.ModelViewSet):
+class StudentViewSet(LeanReadMixin, viewsets.ModelViewSet):
     queryset = Student.objects.all() # pylint: disable=no-member
     serializer_class = StudentSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["first_name", "last_name", "email", "id_number"]
+    filter_backends = [filters.OrderingFilter, DocumentSearchFilter]
+    search_prefix_field = "id_number"
     ordering_fields = ["last_name", "first_name"]
+    #orden por defecto y desempate de la paginacion por cursor
+    ordering = ["last_name", "first_name"]
+
+    #GET con ETag y cache por version de los modelos (response_cache.py)
+    @cached_response("student")
+    @query_budget(3)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response("student")
+    @query_budget(2)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     @action(detail=True, methods=["get"])
+    @cached_response("enrollment", "course")
+    @query_budget(2)
     def courses(self, request, pk=None):
-        enrolls = Enrollment.objects.filter(student_id = pk).select_related("course") # pylint: disable=no-member
-        data = [{"course_id": e.course.id, "code": e.course.code, 
-                 "title": e.course.title, "enrolled_at": e.enrolled_at} for e in enrolls]
-        return Response(data)
+        #?export=csv|ndjson para bajar todo sin armar la lista en memoria
+        enrollments = _term_scope(request, Enrollment.objects.filter(student_id=pk))  # pylint: disable=no-member
+        export = _export(request, enrollments.order_by("course__code"), exports.STUDENT_COURSES, f"alumno_{pk}_cursos")
+        if export is not None:
+            return export
+        data = enrollments.values(
+            "course_id", "enrolled_at", code=F("course__code"), title=F("course__title"))
+        return Response(list(data))
     @action(detail=True, methods=["get"], url_path="report-pdf")
+    @query_budget(4)
     def report_pdf(self, request, pk=None):
-        # Busca el alumno por el id dado en la url
-        try:
-
-            student = Student.objects.get(pk=pk)  # pylint: disable=no-member
-        except Student.DoesNotExist:  # pylint: disable=no-member
-            raise Http404("Alumno no encontrado")
-
-        
-        enrolls = (
-            Enrollment.objects  # pylint: disable=no-member
-            #el filter usa el objeto student
-            #osea el estudiante que buscamos por id arriba
-            .filter(student=student)
-            .select_related("course")
-            .order_by("course__code")
-        )
-
-        #context es como los datos para que pueda hacer el pdf
-        ctx = {
-            "student": student,
-            "enrolls": enrolls,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(
-            request,
-            "enrollments/report_student.html",
-            ctx,
-            f"alumno_{student.last_name}_{student.first_name}_cursos.pdf",
-        )
+        #el reporte se arma en reports.py, aca solo se pasa el id de la url
+        return _report_response(request, "student", {"student_id": pk})
     @action(detail=False, methods=["get"], url_path="report-all")
+    @query_budget(3)
     def report_all_students(self, request):
-        students = Student.objects.order_by("last_name", "first_name") # pylint: disable=no-member
-        ctx = {
-            "students": students,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(request, "enrollments/report_student_all.html", ctx, "all_students.pdf")
+        return _report_response(request, "students_all")
+
+    #importacion masiva: un archivo csv/json en el campo "file" (multipart)
+    #o directamente una lista de alumnos en el body json. Crea el usuario de
+    #cada alumno con la cedula como contraseña inicial
+    @action(detail=False, methods=["post"], url_path="import",
+            parser_classes=[MultiPartParser, FormParser, JSONParser])
+    def import_students(self, request):
+        upload = request.FILES.get("file")
+        if upload is not None:
+            fmt = request.data.get("format") or ("json" if upload.name.lower().endswith((".json", ".ndjson")) else "csv")
+            if fmt not in ("csv", "json"):
+                return Response({"detail": "format debe ser csv o json."}, status=status.HTTP_400_BAD_REQUEST)
+            rows = read_rows(upload.file, fmt)
+        else:
+            rows = request.data.get("items") if isinstance(request.data, dict) else request.data
+            if not isinstance(rows, list) or not rows:
+                return Response({"detail": "Se espera un archivo o una lista de alumnos."},
+                                status=status.HTTP_400_BAD_REQUEST)
+        report = import_students(rows)
+        if "invalid" in report:
+            #json o csv mal formado: 400 solo si no se llego a guardar nada; si
+            #ya se guardaron lotes, 207 con lo creado y donde se corto
+            if not report["created"]:
+                return Response({"detail": report["invalid"]["detail"], **report},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(report, status=status.HTTP_207_MULTI_STATUS)
+        code = status.HTTP_201_CREATED if report["created"] else status.HTTP_200_OK
+        return Response(report, status=code)
 
 
 @extend_schema(tags=["Courses"])    
-class CourseViewSet(viewsets.ModelViewSet):
+class CourseViewSet(LeanReadMixin, viewsets.ModelViewSet):
     queryset = Course.objects.all() # pylint: disable=no-member
     serializer_class = CourseSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ["code", "title"]
+    filter_backends = [filters.OrderingFilter, DocumentSearchFilter]
     ordering_fields = ["code", "title"]
+    ordering = ["code"]
+
+    #seats_taken cambia con cada matricula: los signals de Enrollment tambien
+    #incrementan la version de course
+    @cached_response("course")
+    @query_budget(3)
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @cached_response("course")
+    @query_budget(2)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        #si se agranda la capacidad entran los de la lista de espera
+        with transaction.atomic():
+            course = serializer.save()
+            if lock_and_promote(course.pk):
+                course.refresh_from_db(fields=["seats_taken"])
 
     @action(detail=True, methods=["get"])
+    @cached_response("enrollment", "student")
+    @query_budget(2)
     def students(self, request, pk=None):
-        enrolls = Enrollment.objects.filter(course_id=pk).select_related("student") # pylint: disable=no-member
-        data = [{"student_id": e.student.id, "first_name": e.student.first_name, 
-                 "last_name": e.student.last_name, "email": e.student.email,
-                 "id_number": e.student.id_number, "enrolled_at": e.enrolled_at} for e in enrolls]
-        return Response(data)
+        enrollments = _term_scope(request, Enrollment.objects.filter(course_id=pk))  # pylint: disable=no-member
+        export = _export(request, enrollments.order_by("student__last_name", "student__first_name"),
+                         exports.COURSE_STUDENTS, f"curso_{pk}_alumnos")
+        if export is not None:
+            return export
+        data = enrollments.values(
+            "student_id", "enrolled_at", first_name=F("student__first_name"), last_name=F("student__last_name"),
+            email=F("student__email"), id_number=F("student__id_number"))
+        return Response(list(data))
     
     @action(detail=True, methods=["get"], url_path="report-pdf")
+    @query_budget(4)
     def report_pdf(self, request, pk=None):
-        #lo mismo busca por id de cursony si encuentra lo guarda en course
-        try:
-            course = Course.objects.get(pk=pk)  # pylint: disable=no-member
-        except Course.DoesNotExist:# pylint: disable=no-member
-            raise Http404("Curso no encontrado")
-
-        # Inscripciones del curso
-        enrolls = (
-            #filtra por ese curso que buscamos arriba y trae tambien los estudiantes relacionados
-            Enrollment.objects # pylint: disable=no-member
-            .filter(course=course)
-            .select_related("student")
-            .order_by("student__last_name", "student__first_name")
-        )
-        #el contexto que necesita para construir el pdf
-        ctx = {
-            "course": course,
-            "enrolls": enrolls,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(
-            request,
-            "enrollments/report_course.html",
-            ctx,
-            f"curso_{course.code}_alumnos.pdf",
-        )
+        return _report_response(request, "course", {"course_id": pk})
     
     @action(detail=False, methods=["get"], url_path="report-pdf-all", permission_classes=[AllowAny])
+    @query_budget(3)
     def report_pdf_all(self, request):
-        courses = Course.objects.all().order_by("code")  # pylint: disable=no-member
-        ctx = {
-            "courses": courses,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(
-            request,
-            "enrollments/report_courses_all.html",
-            ctx,
-            "cursos_disponibles.pdf",
-        )
+        return _report_response(request, "courses_all")
     
 @extend_schema(tags=["Enrollments"])
-class EnrollmentViewSet(viewsets.ModelViewSet):
-    queryset= Enrollment.objects.select_related("student", "course").all() # pylint: disable=no-member
+class EnrollmentViewSet(LeanReadMixin, viewsets.ModelViewSet):
+    #sin select_related: el serializer solo muestra los ids (?embed= hace el join)
+    queryset= Enrollment.objects.all() # pylint: disable=no-member
     serializer_class = EnrollmentSerializer
+
+    #solo el periodo actual, salvo ?term=<codigo> o ?term=all (terms.py)
+    def get_queryset(self):
+        return _term_scope(self.request, super().get_queryset())
+
     #aca solo sobreescribimos la funcion create
     #porque el DRF ya genera de porsi, un crud basico
     #entonces para no romper la firma original le pasamos
@@ -191,127 +202,358 @@ class EnrollmentViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Alumno o curso no encontrado."},
                             status = status.HTTP_404_NOT_FOUND)
         #Validacion para asegurarse que el alumno aun no exista
-        if Enrollment.objects.filter(student=student, course=course).exists(): # pylint: disable=no-member
+        if Enrollment.objects.filter(student=student, course=course, term_id=terms.current_term_id()).exists(): # pylint: disable=no-member
+            return Response({"detail": "El alumno ya esta inscripto en este curso"},
+                            status = status.HTTP_400_BAD_REQUEST)
+        #enroll toma el asiento y crea la matricula en una sola transaccion,
+        #si el curso se lleno entre medio devuelve 409
+        try:
+            enrollment = enroll(student.pk, course.pk)
+        except CourseFullError:
+            return Response({"detail": "El curso esta completo."}, status=status.HTTP_409_CONFLICT)
+        except AlreadyEnrolledError:
             return Response({"detail": "El alumno ya esta inscripto en este curso"},
                             status = status.HTTP_400_BAD_REQUEST)
-        #aca usa el metodo ya generado por el viewSet de create
-        #para crear una matriculaciones silvestre y comun
-        enrollment = Enrollment.objects.create(student = student, course = course) # pylint: disable=no-member
             
         return Response(EnrollmentSerializer(enrollment).data, status=status.HTTP_201_CREATED)
+
+    def perform_update(self, serializer):
+        #si la matricula cambia de curso hay que tomar un asiento en el nuevo
+        #(el del viejo se libera aca mismo, en la misma transaccion). Los
+        #asientos son del periodo actual: en otro periodo solo se cambia la fila
+        old_course_id = serializer.instance.course_id
+        new_course = serializer.validated_data.get("course")
+        if (new_course is None or new_course.pk == old_course_id
+                or serializer.instance.term_id != terms.current_term_id()):
+            serializer.save()
+            return
+        with transaction.atomic():
+            if not take_seat(new_course.pk):
+                raise CourseFull()
+            serializer.save()
+            Course.objects.filter(pk=old_course_id, seats_taken__gt=0).update(seats_taken=F("seats_taken") - 1) # pylint: disable=no-member
+            promote_waitlist(old_course_id)
+
+    def perform_destroy(self, instance):
+        #la baja promueve al primero de la lista de espera en la misma transaccion
+        drop(instance)
+
+    #matriculacion masiva: recibe una lista de {"student": id, "course": id}
+    #(o {"items": [...]}) y devuelve el resultado de cada item
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        items = request.data.get("items") if isinstance(request.data, dict) else request.data
+        if not isinstance(items, list) or not items:
+            return Response({"detail": "Se espera una lista de matriculas."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > settings.ENROLLMENT_BULK_MAX:
+            return Response({"detail": f"Maximo {settings.ENROLLMENT_BULK_MAX} matriculas por request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(bulk_enroll(items))
     #detail = False, significa que no trabaja buscando un id del objeto principal en este caso Enrollment, busca por un grupo filtrado
     #la r en el url path significa que no lee el backslash como caracter especial
     #(?P<course_id>\d+) esta es una expresion regular, regex, que le dice que capturara el numero que venga en esa posicion en la URL
     #los parentesis crean un grupo de captura, y el ?P nombra al grupo, y el \+d dice que sean numeros
     @action(detail=False, methods=["get"], url_path=r"by-course/(?P<course_id>\d+)")
+    @cached_response("enrollment", "student")
+    @query_budget(2)
     def by_course(self, request, course_id=None):
         qs = (
-            Enrollment.objects # pylint: disable=no-member
+            self.get_queryset()
             .filter(course_id=course_id)
-            .select_related("student", "course")
             .order_by("student__last_name", "student__first_name")
         )
-        return Response(EnrollmentSerializer(qs, many=True).data)
+        export = _export(request, qs, exports.ENROLLMENTS, f"matriculas_curso_{course_id}")
+        if export is not None:
+            return export
+        return self.lean_response(qs, paginate=False)
     @action(detail=False, methods=["get"], url_path=r"by-student/(?P<student_id>\d+)")
+    @cached_response("enrollment", "course")
+    @query_budget(2)
     def by_student(self, request, student_id=None):
         qs = (
-            Enrollment.objects # pylint: disable=no-member
-            .filter(stundent_id=student_id)
-            .select_related("student", "course")
+            self.get_queryset()
+            .filter(student_id=student_id)
             .order_by("course__code")
         )
-        return Response(EnrollmentSerializer(qs, many=True).data)
+        export = _export(request, qs, exports.ENROLLMENTS, f"matriculas_alumno_{student_id}")
+        if export is not None:
+            return export
+        return self.lean_response(qs, paginate=False)
+    #tabla completa de matriculas para el data warehouse, ?export=ndjson o csv (default)
+    @action(detail=False, methods=["get"], url_path="export")
+    def export(self, request):
+        return _export(request, _term_scope(request, exports.all_enrollments()), exports.ENROLLMENTS_FULL,
+                       "matriculas", default="csv")
      # --- Reporte de matriculaciones por alumno ---
     @action(detail=False, methods=["get"], url_path=r"report-student/(?P<student_id>\d+)")
+    @query_budget(4)
     def report_student(self, request, student_id=None):
-        enrolls = (
-            Enrollment.objects  # pylint: disable=no-member
-            .filter(student_id=student_id)
-            .select_related("student", "course")
-            .order_by("course__code")
-        )
-        if not enrolls.exists():
-            return Response({"detail": "El alumno no tiene matriculaciones"}, status=404)
-
-        student = enrolls.first().student
-        ctx = {
-            "student": student,
-            "enrolls": enrolls,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(request, "enrollments/report_student_enrollments.html", ctx,
-                           f"matriculas_{student.last_name}_{student.first_name}.pdf")
+        return _report_response(request, "student_enrollments", {"student_id": student_id})
 
     # --- Reporte de matriculaciones por curso ---
     @action(detail=False, methods=["get"], url_path=r"report-course/(?P<course_id>\d+)")
+    @query_budget(4)
     def report_course(self, request, course_id=None):
-        enrolls = (
-            Enrollment.objects # pylint: disable=no-member
-            .filter(course_id=course_id)
-            .select_related("student", "course")
-            .order_by("student__last_name", "student__first_name")
-        )
-        if not enrolls.exists():
-            return Response({"detail": "El curso no tiene alumnos matriculados"}, status=404)
-
-        course = enrolls.first().course
-        ctx = {
-            "course": course,
-            "enrolls": enrolls,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(request, "enrollments/report_course_enrollments.html", ctx,
-                           f"alumnos_{course.code}.pdf")
+        return _report_response(request, "course_enrollments", {"course_id": course_id})
 
     # --- Reporte general de matriculaciones ---
     @action(detail=False, methods=["get"], url_path="report-all-enrollments")
     def report_all_enrollments(self, request):
-        ranking = (
-            Course.objects  # pylint: disable=no-member
-            .annotate(total=Count("enrollment"))
-            .order_by("-total", "code")
-            .prefetch_related("enrollment_set__student")
-        )
-        ctx = {
-            "courses": ranking,
-            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M"),
-        }
-        return _pdf_render(request, "enrollments/report_enrollments_all.html", ctx,
-                           "matriculaciones_por_curso.pdf")
-    
-def _pdf_render(request, template_name: str, context: dict, filename: str)-> HttpResponse:
-    template = get_template(template_name)
-    html = template.render(context)
+        return _report_response(request, "enrollments_all")
 
-    download_flag = (request.GET.get("download", "1") or "1").lower()
-    disposition = "inline" if download_flag in ("0", "false", "no") else "attachment"
-    
+    # --- Reportes en lote ---
+    #un zip con el reporte de matriculas de cada curso o alumno:
+    #{"kind": "course"|"student", "ids": [...] o "all", "term": opcional, "engine": opcional}.
+    #El avance se consulta con el id del header X-Report-Batch
+    @action(detail=False, methods=["post"], url_path="report-batch")
+    def report_batch(self, request):
+        data = request.data if isinstance(request.data, dict) else {}
+        try:
+            batch = batch_reports.Batch(data.get("kind"), data.get("ids"),
+                                        term=data.get("term"), engine=data.get("engine"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        response = StreamingHttpResponse(batch.iter_zip(), content_type="application/zip")
+        response["Content-Disposition"] = f'attachment; filename="{batch.filename}"'
+        response["X-Report-Batch"] = batch.id
+        response["X-Report-Total"] = str(batch.state["total"])
+        return response
+
+    @action(detail=False, methods=["get"], url_path=r"report-batch/(?P<batch_id>[0-9a-f]{32})")
+    def report_batch_progress(self, request, batch_id=None):
+        state = batch_reports.progress(batch_id)
+        if state is None:
+            raise Http404("Lote no encontrado")
+        return Response(state)
+
+
+def _export(request, queryset, columns, filename: str, default: str | None = None):
+    #None si no se pidio ?export=, asi la accion sigue con su json de siempre
+    try:
+        fmt = exports.export_format(request) or default
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if fmt is None:
+        return None
+    return exports.export_response(queryset, columns, fmt, filename)
+
+def _term_scope(request, queryset, field: str = "term_id"):
+    #?term= invalido es un 400; los archivados solo se pueden leer
+    try:
+        return terms.scope(queryset, request.GET.get("term"), field,
+                           write=request.method not in SAFE_METHODS)
+    except ValueError as exc:
+        raise ValidationError({"term": [str(exc)]})
+
+def _query_flag(request, name: str, default: str) -> bool:
+    value = (request.GET.get(name, default) or default).lower()
+    return value not in ("0", "false", "no")
+
+def _report_response(request, report_type: str, params: dict | None = None) -> HttpResponse:
+    #?engine=xhtml2pdf|weasyprint|html|csv elige el motor para esta request
+    params = dict(params or {}, engine=request.GET.get("engine"), term=request.GET.get("term"))
+    #build_report levanta Http404 si el alumno/curso no existe, DRF lo convierte en 404
+    try:
+        report = build_report(report_type, params)
+    except ValueError as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    #?stream=1 en los reportes generales: memoria acotada, sale por un archivo temporal
+    if can_stream(report) and _query_flag(request, "stream", "0"):
+        return _pdf_stream(request, report)
+    return _pdf_render(request, report)
+
+def _final_filename(filename: str) -> str:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-    final_filename = f"{filename.rstrip('.pdf')}_{timestamp}.pdf"
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'{disposition}; filename="{final_filename}"'
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_{timestamp}{ext}"
 
-    result = pisa.CreatePDF(src=html, dest=response, encoding="utf-8")
-    if result.err:
+def _pdf_render(request, report: dict)-> HttpResponse:
+    disposition = "attachment" if _query_flag(request, "download", "1") else "inline"
+    try:
+        #render_report primero busca el pdf en el cache de reportes
+        with timed("pdf"):
+            pdf = render_report(report)
+    except ReportError:
         return HttpResponse("Error al generar PDF", status=500)
+    response = HttpResponse(pdf, content_type=report["content_type"])
+    response["Content-Disposition"] = f'{disposition}; filename="{_final_filename(report["filename"])}"'
     return response
 
+def _pdf_stream(request, report: dict) -> HttpResponse:
+    tmp = tempfile.TemporaryFile()
+    try:
+        with timed("pdf"):
+            stream_report(report, tmp)
+    except ReportError:
+        tmp.close()
+        return HttpResponse("Error al generar PDF", status=500)
+    tmp.seek(0)
+    #FileResponse manda el archivo de a bloques y lo cierra (y se borra) al terminar
+    return FileResponse(tmp, as_attachment=_query_flag(request, "download", "1"),
+                        filename=_final_filename(report["filename"]),
+                        content_type="application/pdf")
+
+@extend_schema(tags=["Waitlist"])
+class WaitlistViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                      mixins.ListModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    #lista de espera de cursos completos: POST para anotarse (si hay lugar
+    #matricula directo), GET /{id}/ para ver la posicion, DELETE para salir
+    serializer_class = WaitlistEntrySerializer
+
+    def get_queryset(self):
+        ahead = (
+            WaitlistEntry.objects # pylint: disable=no-member
+            .filter(course=OuterRef("course"), id__lte=OuterRef("id"))
+            .order_by().values("course").annotate(total=Count("id")).values("total")
+        )
+        qs = WaitlistEntry.objects.annotate(position=Subquery(ahead)).order_by("course_id", "id") # pylint: disable=no-member
+        for param in ("course", "student"):
+            if self.request.query_params.get(param):
+                qs = qs.filter(**{f"{param}_id": self.request.query_params[param]})
+        return qs
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        student = serializer.validated_data["student"]
+        course = serializer.validated_data["course"]
+        try:
+            result = join_waitlist(student.pk, course.pk)
+        except AlreadyEnrolledError:
+            return Response({"detail": "El alumno ya esta inscripto en este curso"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        except OnWaitlistError:
+            return Response({"detail": "El alumno ya esta en la lista de espera"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(result, Enrollment):
+            return Response({"enrolled": True, "enrollment": EnrollmentSerializer(result).data},
+                            status=status.HTTP_201_CREATED)
+        entry = self.get_queryset().get(pk=result.pk)
+        return Response({"enrolled": False, "waitlist": self.get_serializer(entry).data},
+                        status=status.HTTP_201_CREATED)
+
+@extend_schema(tags=["Terms"])
+class TermViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.UpdateModelMixin,
+                  mixins.ListModelMixin, viewsets.GenericViewSet):
+    #periodos lectivos. El actual se cambia con POST /{id}/activate/ y se
+    #archiva con manage.py archive_term (mueve la particion en postgres).
+    #activate borra la lista de espera del periodo que termina y devuelve
+    #cuantas entradas borro en waitlist_cleared
+    #starts_on acepta NULL y no sirve para el cursor (pagination.py): el codigo
+    #(2025-1, 2025-2...) ordena igual y nunca es NULL
+    queryset = Term.objects.order_by("-code", "id") # pylint: disable=no-member
+    serializer_class = TermSerializer
+
+    @action(detail=True, methods=["post"])
+    def activate(self, request, pk=None):
+        try:
+            term, cleared = terms.activate(self.get_object())
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**self.get_serializer(term).data, "waitlist_cleared": cleared})
+
+@extend_schema(tags=["Reports"])
+class ReportJobViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin,
+                       mixins.ListModelMixin, viewsets.GenericViewSet):
+    #reportes asincronos: POST encola, GET /{id}/ para ver el estado
+    #y GET /{id}/download/ cuando el status es "done"
+    queryset = ReportJob.objects.order_by("-created_at") # pylint: disable=no-member
+    serializer_class = ReportJobSerializer
+
+    def get_permissions(self):
+        #el listado muestra el id (y con el la descarga) de todos los reportes:
+        #solo staff. Con el id de un reporte se lo sigue pudiendo ver y bajar
+        if self.action == "list":
+            return [IsAdminUser()]
+        return super().get_permissions()
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            job = enqueue(serializer.validated_data["report_type"],
+                          serializer.validated_data.get("params"))
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != ReportJob.DONE:
+            return Response({"detail": "El reporte todavia no esta listo.", "status": job.status},
+                            status=status.HTTP_409_CONFLICT)
+        try:
+            pdf = open(job.file_path, "rb")
+        except FileNotFoundError:
+            raise Http404("El archivo del reporte ya no existe")
+        #el content type sale de la extension del archivo (pdf, html o csv)
+        return FileResponse(pdf, as_attachment=_query_flag(request, "download", "1"),
+                            filename=job.filename)
+
+    @action(detail=False, methods=["get"])
+    def stats(self, request):
+        return Response(queue_stats())
+
+@extend_schema(tags=["Stats"])
+class ResponseCacheStatsView(APIView):
+    #aciertos del cache de respuestas: hit (desde el cache), not_modified (304)
+    #y miss (se consulto la base)
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response(response_cache.stats())
+
+@extend_schema(tags=["Stats"])
+class DatabaseStatsView(APIView):
+    #estado del pool de conexiones de este proceso y atraso de las replicas (ver db.py)
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request):
+        return Response(pool_stats())
+
+def _int_param(request, name: str, default: int, maximum: int) -> int:
+    try:
+        value = int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+    return max(1, min(value, maximum))
+
+@extend_schema(tags=["Stats"])
+class EnrollmentStatsView(APIView):
+    #tablero: totales, ranking de cursos, los mas llenos y la serie diaria de
+    #los ultimos ?days= dias. Lee los conteos mantenidos (stats.py), sin
+    #recorrer las matriculas
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @cached_response("course", "enrollment")
+    @query_budget(5)
+    def get(self, request):
+        return Response(stats.dashboard(limit=_int_param(request, "limit", 10, 100),
+                                        days=_int_param(request, "days", 30, 366)))
+
 class LoginView(TokenObtainPairView):
     serializer_class = LoginSerializer
 
+class RefreshView(TokenRefreshView):
+    serializer_class = RefreshSerializer
+
 class MeView(APIView):
+    #sale de los claims del token (ver auth_serializers.py), sin consultar la
+    #base. Con ?fresh=1 lee el perfil actual (por ejemplo despues de cambiar
+    #de grupo, hasta que se renueve el token)
+    authentication_classes = [JWTStatelessUserAuthentication]
     permission_classes = [IsAuthenticated]
 
+    #mismo esquema de seguridad (Bearer) que el resto de la api en la documentacion
+    @extend_schema(responses=OpenApiTypes.OBJECT, auth=[{"jwtAuth": []}])
+    @query_budget(3)
     def get(self, request):
-        user = request.user
-        groups = list(user.groups.values_list("name", flat=True))
-        student = Student.objects.filter(user=user).first() # pylint: disable=no-member
-        return Response({
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "groups": groups,
-            "student_id": student.id if student else None,
-        })
+        token = request.auth
+        #los tokens emitidos antes de los claims de perfil no traen student_id
+        if _query_flag(request, "fresh", "0") or "student_id" not in token:
+            profile = profiles.get_profile(request.user.id, fresh=True)
+            if profile is None:
+                return Response({"detail": "Usuario no encontrado."}, status=status.HTTP_401_UNAUTHORIZED)
+            return Response(profile)
+        data = {"id": request.user.id}
+        data.update({claim: token.get(claim) for claim in PROFILE_CLAIMS})
+        return Response(data)
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psis_api.settings')
 
 application = get_asgi_application()
+
+#carga los motores de pdf antes de atender requests (ver REPORT_PRELOAD)
+if settings.REPORT_PRELOAD:
+    from enrollments.reports import warm_up  # pylint: disable=wrong-import-position
+
+    warm_up()
@@ -3,6 +3,7 @@ from pathlib import Path
 import os
 import environ
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -26,9 +27,60 @@ DATABASES = {
         "PASSWORD": env("DB_PASSWORD"),
         "HOST": env("DB_HOST"),
         "PORT": env("DB_PORT"),
+        #antes de reusar una conexion se verifica que siga viva
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+#CONEXIONES
+#con DB_POOL=True cada proceso tiene un pool de psycopg 3 (psycopg_pool) y las
+#requests toman y devuelven conexiones ya abiertas. Sin pool, DB_CONN_MAX_AGE
+#deja la conexion abierta esos segundos entre requests (0 = una por request).
+#El pool y CONN_MAX_AGE no se pueden usar juntos: con DB_POOL=True,
+#DB_CONN_MAX_AGE tiene que faltar o ser 0
+if env.bool("DB_POOL", default=False):
+    if env.int("DB_CONN_MAX_AGE", default=0):
+        raise ImproperlyConfigured("DB_POOL=True no se puede usar con DB_CONN_MAX_AGE: "
+                                   "el pool ya mantiene las conexiones abiertas.")
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+            "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+            #segundos que una request espera una conexion libre antes de fallar
+            "timeout": env.float("DB_POOL_TIMEOUT", default=10.0),
+            #se cierran las conexiones ociosas y se renuevan las muy viejas
+            "max_idle": env.float("DB_POOL_MAX_IDLE", default=300.0),
+            "max_lifetime": env.float("DB_POOL_MAX_LIFETIME", default=3600.0),
+        },
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = env.int("DB_CONN_MAX_AGE", default=60)
+
+#REPLICAS DE LECTURA: DB_REPLICA_URLS es una lista de urls (postgres://...)
+#separadas por coma. Cada una queda como alias replica1, replica2... con la
+#misma configuracion de conexion que el primario. Los listados y reportes leen
+#de ahi (enrollments/routers.py); sin replicas todo va al primario
+for _i, _url in enumerate(env.list("DB_REPLICA_URLS", default=[]), start=1):
+    DATABASES[f"replica{_i}"] = {
+        **environ.Env.db_url_config(_url),
+        "CONN_MAX_AGE": DATABASES["default"]["CONN_MAX_AGE"],
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": DATABASES["default"].get("OPTIONS", {}),
+        #en los tests la replica es el mismo primario
+        "TEST": {"MIRROR": "default"},
+    }
+DATABASE_ROUTERS = ["enrollments.routers.ReplicaRouter"]
+#si una replica se atrasa mas que esto (segundos) se lee del primario
+REPLICA_MAX_LAG = env.float("REPLICA_MAX_LAG", default=5.0)
+#cada cuanto se mide el atraso de las replicas (por proceso)
+REPLICA_LAG_CHECK_INTERVAL = env.float("REPLICA_LAG_CHECK_INTERVAL", default=2.0)
+#despues de una escritura el cliente lee del primario estos segundos (cookie y
+#marca por usuario en caches["default"], que tiene que ser compartido: redis)
+REPLICA_PIN_SECONDS = env.int("REPLICA_PIN_SECONDS", default=10)
+#acciones GET de los viewsets que pueden ir a una replica (ademas de report_*)
+REPLICA_READ_ACTIONS = ["list", "retrieve", "courses", "students", "by_course", "by_student", "export"]
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
 
@@ -45,6 +97,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "corsheaders",
     "rest_framework",
     "drf_spectacular",
@@ -53,12 +106,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    #primero: mide la request completa (enrollments/instrumentation.py)
+    'enrollments.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     "corsheaders.middleware.CorsMiddleware", 
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'enrollments.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -126,7 +182,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 #use el de la libreria drf_espectacular que es mas completo y acorde con Swagger(documentacion)
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    #por cursor (?cursor=), con ?page=N vuelve a la paginacion por numero
+    "DEFAULT_PAGINATION_CLASS": "enrollments.pagination.KeysetPagination",
     "PAGE_SIZE": 20,
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework_simplejwt.authentication.JWTAuthentication",
@@ -147,6 +204,139 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
 }
 
+#listados y detalle de alumnos/cursos/matriculas con .values() y un plan de
+#campos en vez del ModelSerializer (enrollments/lean.py)
+LEAN_READS = env.bool("LEAN_READS", default=True)
+
+#maximo de items por request en POST /api/enrollments/bulk/
+ENROLLMENT_BULK_MAX = env.int("ENROLLMENT_BULK_MAX", default=10000)
+
+#importacion de alumnos (enrollments/importer.py): filas por lote y procesos
+#que hashean las contraseñas iniciales (1 = sin pool). Los usuarios creados
+#quedan en el grupo STUDENT_GROUP
+STUDENT_IMPORT_BATCH = env.int("STUDENT_IMPORT_BATCH", default=1000)
+STUDENT_IMPORT_WORKERS = env.int("STUDENT_IMPORT_WORKERS", default=4)
+STUDENT_GROUP = env("STUDENT_GROUP", default="Alumno")
+
+#filas por bloque de las exportaciones csv/ndjson (?export=, enrollments/exports.py):
+#tamaño del fetch del cursor y de cada pedazo que se manda al cliente
+EXPORT_CHUNK = env.int("EXPORT_CHUNK", default=2000)
+
+#metricas por request (enrollments/instrumentation.py): Server-Timing, log
+#json por request y aviso de consultas repetidas (N+1). Con
+#QUERY_BUDGET_STRICT=True una vista que se pasa de su @query_budget falla
+#(para los tests)
+INSTRUMENTATION_ENABLED = env.bool("INSTRUMENTATION_ENABLED", default=True)
+QUERY_REPEAT_THRESHOLD = env.int("QUERY_REPEAT_THRESHOLD", default=5)
+QUERY_BUDGET_STRICT = env.bool("QUERY_BUDGET_STRICT", default=False)
+
+#periodos lectivos (enrollments/terms.py): cuanto se guarda como maximo en
+#memoria la tabla de periodos (los cambios se avisan antes por el cache de
+#django si CACHE_URL es compartido), y el schema de postgres donde manage.py archive_term deja
+#las particiones de matriculas de periodos archivados
+TERM_CACHE_SECONDS = env.int("TERM_CACHE_SECONDS", default=10)
+ENROLLMENT_ARCHIVE_SCHEMA = env("ENROLLMENT_ARCHIVE_SCHEMA", default="archive")
+#alias de solo lectura para ?term=<periodo archivado>: la misma base con ese
+#schema primero en el search_path (ver partitions.py). No se migra ni se
+#escribe; solo se conecta cuando alguien lee un periodo archivado
+DATABASES["archive"] = {
+    **DATABASES["default"],
+    "OPTIONS": {**DATABASES["default"].get("OPTIONS", {}),
+                "options": f"-c search_path={ENROLLMENT_ARCHIVE_SCHEMA},public"},
+    "TEST": {"MIRROR": "default"},
+}
+
+#logs de la app por consola; LOG_LEVEL=WARNING deja solo los avisos
+#(N+1, presupuestos de consultas, replicas)
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"enrollments": {"handlers": ["console"], "level": env("LOG_LEVEL", default="INFO")}},
+}
+
+#vistas async (enrollments/async_views.py): threads para las consultas que
+#un reporte hace a la vez y para renderizar pdf cuando REPORT_RENDER_WORKERS=1
+ASYNC_DB_WORKERS = env.int("ASYNC_DB_WORKERS", default=8)
+ASYNC_RENDER_WORKERS = env.int("ASYNC_RENDER_WORKERS", default=2)
+
+#Cola de reportes pdf (enrollments/jobs.py). Los pdf generados se guardan en
+#REPORTS_DIR y cada tipo de reporte tiene un maximo de jobs corriendo a la vez
+REPORTS_DIR = env("REPORTS_DIR", default=str(BASE_DIR / "var" / "reports"))
+REPORT_JOB_DEFAULT_LIMIT = env.int("REPORT_JOB_DEFAULT_LIMIT", default=4)
+REPORT_JOB_LIMITS = {
+    "students_all": 1,
+    "courses_all": 2,
+    "enrollments_all": 1,
+}
+#segundos que puede estar un job en "running" antes de volver a la cola
+REPORT_JOB_TIMEOUT = env.int("REPORT_JOB_TIMEOUT", default=600)
+#horas que se guardan los reportes terminados (y sus archivos en REPORTS_DIR)
+#antes de que los workers los borren (jobs.purge_expired)
+REPORT_JOB_RETENTION_HOURS = env.int("REPORT_JOB_RETENTION_HOURS", default=24)
+
+#motor de render de reportes (enrollments/pdf_engines.py): xhtml2pdf, weasyprint,
+#html o csv. REPORT_ENGINES permite fijar un motor distinto por tipo de reporte,
+#por ejemplo {"enrollments_all": "weasyprint"}
+REPORT_ENGINE = env("REPORT_ENGINE", default="xhtml2pdf")
+REPORT_ENGINES = {}
+
+#procesos que renderizan pdf en paralelo (reporte general por fragmentos)
+REPORT_RENDER_WORKERS = env.int("REPORT_RENDER_WORKERS", default=2)
+#como arrancan esos procesos (y los de REPORT_BATCH_WORKERS): forkserver,
+#spawn o fork. fork es lo mas rapido pero no es seguro desde un proceso con
+#threads (gunicorn --threads, asgi)
+REPORT_POOL_START_METHOD = env("REPORT_POOL_START_METHOD", default="forkserver")
+
+#xhtml2pdf y pypdf se importan con el primer reporte. Con REPORT_PRELOAD=True
+#wsgi.py/asgi.py los cargan al arrancar (reports.warm_up): con gunicorn
+#--preload una sola vez en el master y los workers los heredan en el fork.
+#Los procesos de los pools de render tambien los cargan al arrancar
+REPORT_PRELOAD = env.bool("REPORT_PRELOAD", default=False)
+
+#filas por bloque en el modo streaming (?stream=1) de los reportes generales
+REPORT_STREAM_CHUNK = env.int("REPORT_STREAM_CHUNK", default=500)
+
+#reportes en lote en un zip (enrollments/batch_reports.py): procesos propios
+#para renderizar (aparte de REPORT_RENDER_WORKERS), maximo de ids por lote y
+#cuanto queda el avance de cada lote en el cache
+REPORT_BATCH_WORKERS = env.int("REPORT_BATCH_WORKERS", default=2)
+REPORT_BATCH_MAX = env.int("REPORT_BATCH_MAX", default=2000)
+REPORT_BATCH_PROGRESS_TIMEOUT = env.int("REPORT_BATCH_PROGRESS_TIMEOUT", default=3600)
+
+#caches de django. CACHE_URL elige el backend: locmemcache:// (default, uno
+#por proceso, sirve para desarrollo y tests), dbcache://cache_table (compartido
+#entre workers, hay que correr createcachetable) o memcached/redis en produccion
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+#cache de respuestas GET con ETag (enrollments/response_cache.py). Se invalida
+#con contadores de version por modelo, TIMEOUT solo acota cuanto vive cada entrada
+RESPONSE_CACHE = {
+    "ENABLED": env.bool("RESPONSE_CACHE_ENABLED", default=True),
+    "ALIAS": env("RESPONSE_CACHE_ALIAS", default="default"),
+    "TIMEOUT": env.int("RESPONSE_CACHE_TIMEOUT", default=600),
+}
+
+#perfil del usuario (grupos y alumno vinculado) para el login y /auth/me/?fresh=1
+#(enrollments/profiles.py). Los signals lo invalidan, TIMEOUT es el maximo que vive
+PROFILE_CACHE = {
+    "ALIAS": env("PROFILE_CACHE_ALIAS", default="default"),
+    "TIMEOUT": env.int("PROFILE_CACHE_TIMEOUT", default=300),
+}
+
+#Cache de pdf de reportes (enrollments/report_cache.py). Con REPORT_CACHE_ENABLED=False
+#se renderiza siempre. Para usar un cache de django compartido en vez de disco:
+#{"BACKEND": "enrollments.report_cache.DjangoReportCache", "OPTIONS": {"alias": "default"}}
+REPORT_CACHE = {
+    "BACKEND": "enrollments.report_cache.DiskReportCache",
+    "OPTIONS": {
+        "location": env("REPORT_CACHE_DIR", default=str(BASE_DIR / "var" / "report_cache")),
+        "max_bytes": env.int("REPORT_CACHE_MAX_MB", default=256) * 1024 * 1024,
+    },
+} if env.bool("REPORT_CACHE_ENABLED", default=True) else None
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
@@ -170,8 +360,12 @@ CORS_ALLOW_HEADERS = [
     "user-agent",
     "x-csrftoken",
     "x-requested-with",
+    "if-none-match",
 ]
 
+#el front puede leer el ETag para mandarlo despues en If-None-Match
+CORS_EXPOSE_HEADERS = ["ETag", "X-Cache", "Server-Timing", "X-Query-Count", "X-Report-Batch", "X-Report-Total"]
+
 # 🔹 Métodos HTTP permitidos
 CORS_ALLOW_METHODS = [
     "DELETE",
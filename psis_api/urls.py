@@ -3,25 +3,67 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
-
-from enrollments.views import StudentViewSet, CourseViewSet, EnrollmentViewSet, LoginView, MeView
-from rest_framework_simplejwt.views import TokenRefreshView
+from enrollments.views import (
+    StudentViewSet, CourseViewSet, EnrollmentViewSet, WaitlistViewSet, ReportJobViewSet, TermViewSet, LoginView, RefreshView, MeView,
+    ResponseCacheStatsView, DatabaseStatsView, EnrollmentStatsView,
+)
+from enrollments import async_views
 
 router = DefaultRouter()
 router.register(r"students", StudentViewSet)
 router.register(r"courses", CourseViewSet)
 router.register(r"enrollments", EnrollmentViewSet)
+router.register(r"waitlist", WaitlistViewSet, basename="waitlist")
+router.register(r"report-jobs", ReportJobViewSet)
+router.register(r"terms", TermViewSet)
+
+
+def _schema_view(name: str, **initkwargs):
+    #drf-spectacular (generador del esquema, inspeccion de serializers) se
+    #importa con la primera request a la documentacion, no al cargar las urls
+    view = None
+
+    def lazy(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            from drf_spectacular import views  # pylint: disable=import-outside-toplevel
+            view = getattr(views, name).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+    lazy.__name__ = name
+    return lazy
+
+#variantes async (ASGI) de las lecturas mas pedidas, mismas rutas bajo /api/async/
+async_urls = [
+    path("students/", async_views.student_list),
+    path("students/report-all/", async_views.students_report_all),
+    path("students/<int:pk>/", async_views.student_detail),
+    path("students/<int:pk>/courses/", async_views.student_courses),
+    path("students/<int:pk>/report-pdf/", async_views.student_report),
+    path("courses/", async_views.course_list),
+    path("courses/report-pdf-all/", async_views.courses_report_all),
+    path("courses/<int:pk>/", async_views.course_detail),
+    path("courses/<int:pk>/students/", async_views.course_students),
+    path("courses/<int:pk>/report-pdf/", async_views.course_report),
+    path("enrollments/", async_views.enrollment_list),
+    path("enrollments/report-student/<int:student_id>/", async_views.enrollments_report_student),
+    path("enrollments/report-course/<int:course_id>/", async_views.enrollments_report_course),
+    path("enrollments/report-all-enrollments/", async_views.enrollments_report_all),
+    path("auth/me/", async_views.me),
+]
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/cache/stats/", ResponseCacheStatsView.as_view(), name="response-cache-stats"),
+    path("api/db/stats/", DatabaseStatsView.as_view(), name="db-stats"),
+    path("api/stats/", EnrollmentStatsView.as_view(), name="enrollment-stats"),
+    path("api/async/", include(async_urls)),
     path("api/", include(router.urls)),
 
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    path("api/schema/", _schema_view("SpectacularAPIView"), name="schema"),
 
-    path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
-    path("api/redoc/", SpectacularRedocView.as_view(url_name="schema"), name="redoc"),
+    path("api/docs/", _schema_view("SpectacularSwaggerView", url_name="schema"), name="swagger-ui"),
+    path("api/redoc/", _schema_view("SpectacularRedocView", url_name="schema"), name="redoc"),
     path("auth/login/", LoginView.as_view(), name="auth-login"),
-    path("auth/token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
+    path("auth/token/refresh/", RefreshView.as_view(), name="token-refresh"),
     path("auth/me/", MeView.as_view(), name="auth-me"),
 ]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'psis_api.settings')
 
 application = get_wsgi_application()
+
+#carga los motores de pdf antes de atender requests (ver REPORT_PRELOAD)
+if settings.REPORT_PRELOAD:
+    from enrollments.reports import warm_up  # pylint: disable=wrong-import-position
+
+    warm_up()